@@ -28,14 +28,137 @@ COUNCIL_MODEL_TIMEOUT = 90
 # Max seconds to wait for Stage 1/2 - proceed with partial results if hit (avoids 2+ min stall)
 COUNCIL_STAGE_TIMEOUT = 95
 
+# Pipelined Stage 2: start peer ranking as soon as COUNCIL_STAGE1_QUORUM Stage 1 answers are in,
+# instead of waiting for every model. Answers arriving after ranking starts are kept but marked unranked.
+COUNCIL_PIPELINE_ENABLED = os.getenv("COUNCIL_PIPELINE_ENABLED", "false").lower() in ("1", "true", "yes")
+COUNCIL_STAGE1_QUORUM = int(os.getenv("COUNCIL_STAGE1_QUORUM", "3"))
+
+# Hedged requests: when a council model runs past its own latency percentile, fire a backup
+# request (same model, or a substitute) and take whichever returns first.
+# COUNCIL_HEDGE_SUBSTITUTES format: "slow/model=backup/model,other/model=backup/model"
+COUNCIL_HEDGING_ENABLED = os.getenv("COUNCIL_HEDGING_ENABLED", "false").lower() in ("1", "true", "yes")
+COUNCIL_HEDGE_PERCENTILE = float(os.getenv("COUNCIL_HEDGE_PERCENTILE", "0.95"))
+COUNCIL_HEDGE_MIN_SAMPLES = int(os.getenv("COUNCIL_HEDGE_MIN_SAMPLES", "20"))  # history needed before hedging a model
+COUNCIL_HEDGE_SUBSTITUTES = dict(
+    (k.strip(), v.strip())
+    for k, v in (pair.split("=", 1) for pair in os.getenv("COUNCIL_HEDGE_SUBSTITUTES", "").split(",") if "=" in pair)
+)
+
+# Council result cache - replays a deliberation when the same (normalized) query is re-submitted
+# to the same council roster and chairman (UI refreshes, client retries)
+COUNCIL_CACHE_ENABLED = os.getenv("COUNCIL_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+COUNCIL_CACHE_TTL = int(os.getenv("COUNCIL_CACHE_TTL", str(24 * 3600)))  # seconds
+COUNCIL_CACHE_MAX_ENTRIES = int(os.getenv("COUNCIL_CACHE_MAX_ENTRIES", "256"))  # in-memory LRU tier
+
+# Token budget for the packaged council context (prompt + manual context + attachments + links),
+# filled by priority. The budget of the council is its smallest model's budget.
+# CONTEXT_TOKEN_BUDGETS format: "model/id=tokens,other/model=tokens"
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "12000"))
+CONTEXT_TOKEN_BUDGETS = dict(
+    (k.strip(), int(v))
+    for k, v in (pair.split("=", 1) for pair in os.getenv("CONTEXT_TOKEN_BUDGETS", "").split(",") if "=" in pair)
+)
+
+# Document parsing process pool (PDF/Word/Excel/PowerPoint parsing runs in worker processes)
+PARSER_POOL_ENABLED = os.getenv("PARSER_POOL_ENABLED", "true").lower() in ("1", "true", "yes")
+PARSER_WORKERS = int(os.getenv("PARSER_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARSER_TIMEOUT_SECONDS = float(os.getenv("PARSER_TIMEOUT_SECONDS", "120"))  # per file; the worker is killed after
+PARSER_MEMORY_LIMIT_MB = int(os.getenv("PARSER_MEMORY_LIMIT_MB", "1024"))  # address-space cap per worker (0 = none)
+PARSER_MAX_JOBS_PER_WORKER = int(os.getenv("PARSER_MAX_JOBS_PER_WORKER", "50"))  # then the worker is replaced
+PARSER_MAX_QUEUE = int(os.getenv("PARSER_MAX_QUEUE", "32"))  # files parsing or waiting; more get 503
+PDF_PAGES_PER_JOB = int(os.getenv("PDF_PAGES_PER_JOB", "20"))  # longer PDFs are split across parser workers
+
+# Decompressed attachment content kept in memory (content-addressed blobs, backend/database.py)
+BLOB_CACHE_MB = int(os.getenv("BLOB_CACHE_MB", "64"))
+
+# File uploads (backend/uploads.py): streamed to a temp file, checked before parsing
+UPLOAD_MAX_BYTES = int(float(os.getenv("UPLOAD_MAX_MB", "50")) * 1024 * 1024)  # larger uploads get 413
+UPLOAD_ALLOWED_EXTENSIONS = {
+    ext.strip().lstrip(".").lower()
+    for ext in os.getenv(
+        "UPLOAD_ALLOWED_EXTENSIONS",
+        "pdf,doc,docx,xls,xlsx,ppt,pptx,txt,md,csv,tsv,json,xml,html,htm,yaml,yml,log,rst",
+    ).split(",")
+    if ext.strip()
+}  # others get 415; "*" accepts any (parsed as text)
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR", "")  # default: the system temp directory
+
+# Background ingestion of uploaded files and links (backend/ingestion.py)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "4"))  # attachments ingested concurrently
+INGEST_MAX_PENDING = int(os.getenv("INGEST_MAX_PENDING", "100"))  # queued + running; more get 503
+INGEST_JOB_TIMEOUT_SECONDS = float(os.getenv("INGEST_JOB_TIMEOUT_SECONDS", "300"))  # parse/fetch + chunk + store
+INGEST_PACKAGE_WAIT_SECONDS = float(os.getenv("INGEST_PACKAGE_WAIT_SECONDS", "60"))  # packaging waits this long for pending attachments
+
 # Prompt Engineering model (cheap and fast)
 PROMPT_ENGINEERING_MODEL = "google/gemini-2.5-flash"
 
 # Context Engineering model (cheap and fast)
 CONTEXT_ENGINEERING_MODEL = "google/gemini-2.5-flash"
 
-# OpenRouter API endpoint
-OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+# OpenRouter API endpoint (override to point at a compatible server, e.g. the benchmarks/ mock)
+OPENROUTER_API_URL = os.getenv("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+
+# Shared OpenRouter HTTP client - one pooled HTTP/2 keep-alive client for all LLM calls
+# (council members, rankers, chairman, titles, RAG scoring) instead of a handshake per call
+OPENROUTER_HTTP2 = os.getenv("OPENROUTER_HTTP2", "true").lower() in ("1", "true", "yes")
+OPENROUTER_MAX_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_CONNECTIONS", "50"))
+OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENROUTER_MAX_KEEPALIVE_CONNECTIONS", "20"))
+OPENROUTER_KEEPALIVE_EXPIRY = float(os.getenv("OPENROUTER_KEEPALIVE_EXPIRY", "60"))
+
+# Per-call LLM telemetry: number of recent calls kept in the metrics ring buffer (/api/metrics/summary)
+METRICS_RING_SIZE = int(os.getenv("METRICS_RING_SIZE", "2000"))
+
+# Deliberation tracing: one trace per council run, spans exported as JSON lines
+# (default file: data/traces.jsonl next to the SQLite database)
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() in ("1", "true", "yes")
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+
+# Opt-in per-call response memoization in query_model (cache_ttl=...) - max cached responses
+OPENROUTER_MEMO_MAX_ENTRIES = int(os.getenv("OPENROUTER_MEMO_MAX_ENTRIES", "512"))
+
+# Database connection pool (PostgreSQL via DATABASE_URL; SQLite keeps SQLAlchemy's defaults).
+# Sized per worker process: pool + overflow should stay under the server's max_connections / workers.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # seconds to wait for a free connection
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; below Azure's idle-connection cutoff
+
+# Async storage backend for the API (aiosqlite / asyncpg). When disabled, or the driver is not
+# installed, storage calls run the sync backend in worker threads instead.
+DB_ASYNC_ENABLED = os.getenv("DB_ASYNC_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# SQLite performance profile: WAL journal (readers never block the writer), synchronous=NORMAL
+# (fsync at checkpoints, not every commit), memory-mapped reads, a larger page cache and a
+# busy timeout instead of immediate "database is locked" errors
+SQLITE_PERFORMANCE_MODE = os.getenv("SQLITE_PERFORMANCE_MODE", "true").lower() in ("1", "true", "yes")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))  # bytes
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))  # per connection
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Single-writer queue for SQLite: storage writes go to one writer thread that commits
+# whatever has queued up as one transaction (group commit); reads stay concurrent
+SQLITE_WRITE_QUEUE_ENABLED = os.getenv("SQLITE_WRITE_QUEUE_ENABLED", "true").lower() in ("1", "true", "yes")
+SQLITE_WRITE_BATCH_MAX = int(os.getenv("SQLITE_WRITE_BATCH_MAX", "64"))  # writes per group commit
+
+# RAG retrieval: BM25 parameters and how many per-conversation inverted indexes stay in memory
+RAG_BM25_K1 = float(os.getenv("RAG_BM25_K1", "1.2"))
+RAG_BM25_B = float(os.getenv("RAG_BM25_B", "0.75"))
+RAG_INDEX_CACHE_SIZE = int(os.getenv("RAG_INDEX_CACHE_SIZE", "32"))
+
+# RAG retrieval mode: "bm25" (keywords), "dense" (local embeddings) or "hybrid" (both fused)
+RAG_RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "bm25").lower()
+# sentence-transformers model for dense retrieval; empty = hashing embeddings (no download)
+RAG_EMBEDDING_MODEL = os.getenv("RAG_EMBEDDING_MODEL", "")
+RAG_EMBEDDING_DIM = int(os.getenv("RAG_EMBEDDING_DIM", "1024"))  # hashing embeddings only
+
+# LLM re-ranking of the top retrieved chunks (batched JSON-array scoring under a latency budget)
+RAG_LLM_RERANK_ENABLED = os.getenv("RAG_LLM_RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RAG_RERANK_CANDIDATES = int(os.getenv("RAG_RERANK_CANDIDATES", "20"))  # chunks sent for re-ranking
+RAG_RERANK_BATCH_SIZE = int(os.getenv("RAG_RERANK_BATCH_SIZE", "10"))  # chunks per LLM call
+RAG_RERANK_CONCURRENCY = int(os.getenv("RAG_RERANK_CONCURRENCY", "4"))  # re-rank calls in flight, process-wide
+RAG_RERANK_BUDGET_SECONDS = float(os.getenv("RAG_RERANK_BUDGET_SECONDS", "8"))
+RAG_RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "10000"))  # cached (chunk, query) scores
 
 # Data directory for conversation storage
 DATA_DIR = "data/conversations"
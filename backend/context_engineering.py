@@ -1,9 +1,11 @@
 """Context Engineering stage - helps user attach documents and build context."""
 
+import sys
 from typing import List, Dict, Any, Optional
 from .openrouter import query_model
-from .config import CONTEXT_ENGINEERING_MODEL
-from .rag_system import retrieve_relevant_chunks, format_retrieved_chunks
+from .context_packer import ContextBudget, dedupe_chunks, estimate_tokens, token_budget
+from .config import CONTEXT_ENGINEERING_MODEL, RAG_LLM_RERANK_ENABLED
+from .rag_system import retrieve_relevant_chunks, format_retrieved_chunks, retrieved_chunks_heading
 
 
 async def get_context_engineering_response(
@@ -67,7 +69,7 @@ Be conversational and helpful. Ask about relevant documents, guidelines, constra
     messages.append({"role": "user", "content": user_message})
     
     # Query the context engineering model
-    response = await query_model(CONTEXT_ENGINEERING_MODEL, messages, timeout=60.0)
+    response = await query_model(CONTEXT_ENGINEERING_MODEL, messages, timeout=60.0, stage="context_engineering")
     
     if response is None:
         return None
@@ -89,13 +91,70 @@ def get_refinement_opening(prior_context_summary: str = "") -> str:
     return base
 
 
+# Number of chunks RAG retrieves for the packaged context
+_RAG_TOP_K = 15
+
+# The packaged context: fixed scaffolding around the prompt, the context sections and
+# the priority-order instructions
+_PACKAGED_CONTEXT_TEMPLATE = """# COUNCIL DELIBERATION REQUEST
+
+## PROMPT TO ADDRESS
+
+{prompt}{sections}
+
+---
+
+## INSTRUCTIONS FOR COUNCIL DELIBERATION
+
+Please address the prompt above using the context provided. Consider the information in the following priority order:
+
+{instructions}
+
+Use all available context to provide a comprehensive and well-informed response."""
+
+_DOCUMENTS_HEADING = "\n\n---\n\n## ATTACHED DOCUMENTS\n\n"
+_FILES_HEADING = "## UPLOADED FILES\n\n"
+_LINKS_HEADING = "\n\n---\n\n## EXTERNAL LINKS\n\n"
+_NO_CONTEXT_NOTE = "\n\n*Note: No additional context was provided beyond the prompt. Please address the prompt directly.*"
+
+
+def _priority_instructions(manual_context: bool, rag_chunks: bool, attachments: bool, links: bool) -> str:
+    """Numbered list of the context sources present, in the order the council should weigh them."""
+    items = ["**Prompt** (above) - This is the primary question or task to address"]
+    if manual_context:
+        items.append("**Manually provided context** - Direct instructions and context from the user")
+    if rag_chunks:
+        items.append("**Retrieved relevant chunks (RAG)** - Most relevant portions extracted from attachments using intelligent retrieval")
+    elif attachments:
+        items.append("**Attached documents and files** - Reference materials and supporting documents")
+    if links:
+        items.append("**External links** - Additional context from web sources")
+    text = "\n".join(f"{number}. {item}" for number, item in enumerate(items, 1))
+    if len(items) == 1:
+        text += _NO_CONTEXT_NOTE
+    return text
+
+
+# Worst-case size of the packaged context's fixed text (the template, the longest
+# instructions and the section headings), reserved before the sections share the budget
+_INSTRUCTIONS_RESERVE = _PACKAGED_CONTEXT_TEMPLATE.format(
+    prompt="",
+    sections=max(retrieved_chunks_heading(_RAG_TOP_K), _DOCUMENTS_HEADING + "\n\n" + _FILES_HEADING, key=len) + _LINKS_HEADING,
+    instructions=max(_priority_instructions(True, True, True, True), _priority_instructions(False, False, False, False), key=len),
+)
+
+
 async def package_context(
     conversation_history: List[Dict[str, str]],
     documents: List[Dict[str, Any]],
     files: List[Dict[str, Any]],
     links: List[Dict[str, Any]],
     finalized_prompt: str,
-    use_rag: bool = True
+    use_rag: bool = True,
+    chunks: Optional[List[Dict[str, Any]]] = None,
+    index_key: Optional[str] = None,
+    token_budget_tokens: Optional[int] = None,
+    usage: Optional[Dict[str, Any]] = None
 ) -> Optional[str]:
     """
     Package the context information for use with the council deliberation.
@@ -103,12 +162,16 @@ async def package_context(
     Uses RAG (Retrieval-Augmented Generation) to intelligently retrieve only the most
     relevant chunks from attachments, rather than including everything.
     
-    Order of priority (from highest to lowest):
-    1. Prompt (primary question)
+    The packaged context is kept within a token budget (the council models' smallest,
+    see context_packer). Sections fill it in order of priority (from highest to lowest):
+    1. Prompt (primary question) - always included in full
     2. Manually typed context from preparation chat (user messages)
-    3. Retrieved relevant chunks from attachments (via RAG) - if use_rag=True
+    3. Retrieved relevant chunks from attachments (via RAG) - if use_rag=True,
+       deduplicated where adjacent chunks overlap
     4. All attachments (documents and files) - if use_rag=False
     5. External links
+    A section that doesn't fit is cut at a sentence boundary; lower-priority ones that
+    no longer fit at all are dropped.
     
     Args:
         conversation_history: The full context engineering conversation
@@ -117,10 +180,48 @@ async def package_context(
         links: List of URL content
         finalized_prompt: The finalized prompt from preparation
         use_rag: Whether to use RAG for intelligent chunk retrieval (default: True)
+        chunks: Persisted chunk index of the attachments (None = chunk them here)
+        index_key: Conversation id - keeps its BM25 index in memory between calls
+        token_budget_tokens: Token budget (default: token_budget() of COUNCIL_MODELS)
+        usage: If given, filled with the budget usage report (see ContextBudget.report)
         
     Returns:
         Packaged context text ready for council deliberation, or None if failed
     """
+    budget = ContextBudget(token_budget_tokens or token_budget())
+    
+    # Use RAG to retrieve relevant chunks if enabled and we have attachments
+    relevant_chunks: List[Dict[str, Any]] = []
+    duplicate_chunks = 0
+    if use_rag and (documents or files or links):
+        try:
+            # Extract the core query from the finalized prompt (first few sentences)
+            query = finalized_prompt.split('\n')[0][:500]  # Use first sentence/line as query
+            
+            # Retrieve relevant chunks (BM25 ranking by default)
+            # RAG_LLM_RERANK_ENABLED blends batched LLM scores into the top candidates
+            relevant_chunks = await retrieve_relevant_chunks(
+                query=query,
+                documents=documents,
+                files=files,
+                links=links,
+                top_k=_RAG_TOP_K,
+                relevance_threshold=0.3,  # Only include chunks with >30% relevance
+                use_llm_scoring=RAG_LLM_RERANK_ENABLED,
+                chunks=chunks,
+                index_key=index_key
+            )
+            relevant_chunks, duplicate_chunks = dedupe_chunks(relevant_chunks)
+        except Exception as e:
+            print(f"RAG retrieval failed, falling back to full content: {e}")
+            # Fall back to including full content if RAG fails
+            relevant_chunks = []
+    has_rag_chunks = bool(relevant_chunks)
+    
+    # The prompt and the deliberation scaffolding always go in; the rest shares what's left
+    budget.take("prompt", finalized_prompt, required=True)
+    budget.take("instructions", _INSTRUCTIONS_RESERVE, required=True)
+    
     # Extract manually typed context from user messages in conversation history
     # This is the highest priority context after the prompt
     manual_context_section = ""
@@ -132,135 +233,87 @@ async def package_context(
         ]
         
         if user_messages:
-            manual_context_text = "\n\n".join(user_messages)
-            manual_context_section = f"""
+            heading = """
 ---
 
 ## MANUALLY PROVIDED CONTEXT (Preparation Chat)
 
 The following context was manually provided during the preparation conversation:
 
-{manual_context_text}
 """
+            manual_context_text = budget.take_section("manual_context", heading, "\n\n".join(user_messages))
+            if manual_context_text:
+                manual_context_section = f"{heading}{manual_context_text}\n"
     
-    # Build text documents section
+    # Attachments: RAG chunks in rank order, else the full documents and files
+    rag_section = ""
     documents_section = ""
-    if documents:
-        documents_section = "\n\n---\n\n## ATTACHED DOCUMENTS\n\n"
-        for doc in documents:
-            documents_section += f"### {doc.get('name', 'Untitled')}\n\n"
-            documents_section += f"{doc.get('content', '')}\n\n"
-    
-    # Build files section
     files_section = ""
-    if files:
+    if has_rag_chunks:
+        selected = []
+        for rank, chunk in enumerate(relevant_chunks, 1):
+            heading = f"### Chunk {rank} from {chunk.get('document_name', 'Unknown')} ({chunk.get('document_type', 'unknown').upper()}) - Relevance: 0.00\n\n"
+            text = budget.take_section("attachments", heading, chunk.get('text', ''), label=f"chunk {rank}")
+            if text:
+                selected.append({**chunk, 'text': text})
+        rag_section = format_retrieved_chunks(selected)
+        has_rag_chunks = bool(selected)
+    else:
+        # Build text documents section
+        for doc in documents:
+            heading = f"### {doc.get('name', 'Untitled')}\n\n"
+            content = budget.take_section("attachments", heading, doc.get('content', ''), label=doc.get('name', 'Untitled'))
+            if content:
+                documents_section += f"{heading}{content}\n\n"
         if documents_section:
-            files_section = "\n\n"
-        else:
-            files_section = "\n\n---\n\n"
-        files_section += "## UPLOADED FILES\n\n"
+            documents_section = _DOCUMENTS_HEADING + documents_section
+        
+        # Build files section
         for file_data in files:
             file_type = file_data.get('type', 'unknown')
             file_name = file_data.get('name', 'Untitled')
-            file_content = file_data.get('content', '')
             
-            files_section += f"### {file_name} ({file_type.upper()})\n\n"
+            heading = f"### {file_name} ({file_type.upper()})\n\n"
             
             # Add metadata if available
             if 'page_count' in file_data:
-                files_section += f"*Pages: {file_data['page_count']}*\n\n"
+                heading += f"*Pages: {file_data['page_count']}*\n\n"
             elif 'slide_count' in file_data:
-                files_section += f"*Slides: {file_data['slide_count']}*\n\n"
+                heading += f"*Slides: {file_data['slide_count']}*\n\n"
             
-            files_section += f"{file_content}\n\n"
+            file_content = budget.take_section("attachments", heading, file_data.get('content', ''), label=file_name)
+            if not file_content:
+                continue
+            files_section += f"{heading}{file_content}\n\n"
             
             # Add error notice if there was a parsing error
             if 'error' in file_data:
                 files_section += f"*Note: There was an error parsing this file: {file_data['error']}*\n\n"
+        if files_section:
+            files_section = ("\n\n" if documents_section else "\n\n---\n\n") + _FILES_HEADING + files_section
     
-    # Build links section
+    # Build links section (lowest priority - whatever budget is left)
     links_section = ""
-    if links:
-        if documents_section or files_section:
-            links_section = "\n\n---\n\n"
-        else:
-            links_section = "\n\n---\n\n"
-        links_section += "## EXTERNAL LINKS\n\n"
-        for link_data in links:
-            url = link_data.get('original_url', link_data.get('name', 'Unknown URL'))
-            link_content = link_data.get('content', '')
-            
-            links_section += f"### {url}\n\n"
-            links_section += f"{link_content}\n\n"
-            
-            # Add error notice if there was a fetching error
-            if 'error' in link_data:
-                links_section += f"*Note: There was an error fetching this URL: {link_data['error']}*\n\n"
-    
-    # Combine everything in priority order:
-    # 1. Prompt (highest priority)
-    # 2. Manual context from preparation chat
-    # 3. Attachments (documents + files)
-    # 4. External links (lowest priority)
-    
-    # Use RAG to retrieve relevant chunks if enabled and we have attachments
-    rag_section = ""
-    has_rag_chunks = False
-    
-    if use_rag and (documents or files or links):
-        try:
-            # Extract the core query from the finalized prompt (first few sentences)
-            query = finalized_prompt.split('\n')[0][:500]  # Use first sentence/line as query
-            
-            # Retrieve relevant chunks (using fast keyword-based scoring by default)
-            # Set use_llm_scoring=True for more accurate but slower retrieval
-            relevant_chunks = await retrieve_relevant_chunks(
-                query=query,
-                documents=documents,
-                files=files,
-                links=links,
-                top_k=15,  # Get top 15 most relevant chunks
-                relevance_threshold=0.3,  # Only include chunks with >30% relevance
-                use_llm_scoring=False  # Use fast keyword matching (set to True for LLM-based scoring)
-            )
-            
-            if relevant_chunks:
-                rag_section = format_retrieved_chunks(relevant_chunks)
-                has_rag_chunks = True
-                
-                # Note: We'll use RAG chunks instead of full documents/files sections
-                # But still include links section as-is since they're typically smaller
-        except Exception as e:
-            print(f"RAG retrieval failed, falling back to full content: {e}")
-            # Fall back to including full content if RAG fails
+    for link_data in links:
+        url = link_data.get('original_url', link_data.get('name', 'Unknown URL'))
+        heading = f"### {url}\n\n"
+        link_content = budget.take_section("links", heading, link_data.get('content', ''), label=url)
+        if not link_content:
+            continue
+        links_section += f"{heading}{link_content}\n\n"
+        
+        # Add error notice if there was a fetching error
+        if 'error' in link_data:
+            links_section += f"*Note: There was an error fetching this URL: {link_data['error']}*\n\n"
+    if links_section:
+        links_section = _LINKS_HEADING + links_section
     
     # Build instructions based on what's available
     has_manual_context = bool(manual_context_section)
     has_attachments = bool(documents_section or files_section) or has_rag_chunks
     has_links = bool(links_section)
     
-    instructions_list = ["1. **Prompt** (above) - This is the primary question or task to address"]
-    priority_num = 2
-    
-    if has_manual_context:
-        instructions_list.append(f"{priority_num}. **Manually provided context** - Direct instructions and context from the user")
-        priority_num += 1
-    
-    if has_rag_chunks:
-        instructions_list.append(f"{priority_num}. **Retrieved relevant chunks (RAG)** - Most relevant portions extracted from attachments using intelligent retrieval")
-        priority_num += 1
-    elif has_attachments:
-        instructions_list.append(f"{priority_num}. **Attached documents and files** - Reference materials and supporting documents")
-        priority_num += 1
-    
-    if has_links:
-        instructions_list.append(f"{priority_num}. **External links** - Additional context from web sources")
-    
-    instructions_text = "\n".join(instructions_list)
-    
-    # If no additional context, add a note
-    if not has_manual_context and not has_attachments and not has_links:
-        instructions_text += "\n\n*Note: No additional context was provided beyond the prompt. Please address the prompt directly.*"
+    instructions_text = _priority_instructions(has_manual_context, has_rag_chunks, has_attachments, has_links)
     
     # Choose which sections to include based on RAG
     if has_rag_chunks:
@@ -270,21 +323,18 @@ The following context was manually provided during the preparation conversation:
         # Use full documents and files sections
         attachments_section = documents_section + files_section
     
-    packaged_context = f"""# COUNCIL DELIBERATION REQUEST
-
-## PROMPT TO ADDRESS
-
-{finalized_prompt}{manual_context_section}{attachments_section}{links_section}
-
----
-
-## INSTRUCTIONS FOR COUNCIL DELIBERATION
-
-Please address the prompt above using the context provided. Consider the information in the following priority order:
+    packaged_context = _PACKAGED_CONTEXT_TEMPLATE.format(
+        prompt=finalized_prompt,
+        sections=f"{manual_context_section}{attachments_section}{links_section}",
+        instructions=instructions_text,
+    )
 
-{instructions_text}
-
-Use all available context to provide a comprehensive and well-informed response."""
+    report = budget.report()
+    report["used_tokens"] = estimate_tokens(packaged_context)
+    report["duplicate_chunks"] = duplicate_chunks
+    if usage is not None:
+        usage.update(report)
+    if report["truncated"] or report["dropped"]:
+        print(f"[CONTEXT] Packed {report['used_tokens']}/{report['budget_tokens']} tokens; truncated {report['truncated']}, dropped {report['dropped']}", file=sys.stderr, flush=True)
 
     return packaged_context
-
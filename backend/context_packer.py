@@ -0,0 +1,214 @@
+"""Token-budget-aware packing of the council context.
+
+package_context used to concatenate everything it had - the prompt, manual context,
+up to 15 RAG chunks and the full text of every link - with no notion of the council
+models' context windows. Long packaged contexts are what make slow models time out in
+Stage 1/2. This module fills a token budget instead: sections are added in priority
+order (prompt > manual context > attachments/RAG > links), overlapping RAG chunks are
+deduplicated, and whatever no longer fits is truncated at a sentence boundary or dropped.
+
+Token counts are a fast local estimate (tiktoken's cl100k_base when installed, else a
+character/word heuristic) - close enough for budgeting, not exact for every model.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import COUNCIL_MODELS, CONTEXT_TOKEN_BUDGET, CONTEXT_TOKEN_BUDGETS
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:  # not installed, or the encoding can't be loaded offline
+    _encoding = None
+
+_PIECE_RE = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*\s|\n\s*\n")
+
+# A truncated piece shorter than this is dropped instead (a stub adds noise, not context)
+MIN_PIECE_TOKENS = 50
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of text.
+
+    Without tiktoken: ~4 characters per token for prose, but at least one token per word
+    or punctuation mark so code, numbers and tables aren't underestimated.
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return max(len(text) // 4, len(_PIECE_RE.findall(text)))
+
+
+def token_budget(models: Optional[List[str]] = None) -> int:
+    """
+    Context token budget for a council: the smallest budget of its models.
+
+    Args:
+        models: Target models (default: COUNCIL_MODELS)
+
+    Returns:
+        Token budget (CONTEXT_TOKEN_BUDGETS per-model override, else CONTEXT_TOKEN_BUDGET)
+    """
+    models = models or COUNCIL_MODELS
+    return min(CONTEXT_TOKEN_BUDGETS.get(model, CONTEXT_TOKEN_BUDGET) for model in models)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens, at the last sentence (or paragraph) end that fits.
+
+    Falls back to the last word boundary when the first sentence alone is too long.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    # Start from a proportional cut and shrink until the estimate fits
+    cut = int(len(text) * max_tokens / estimate_tokens(text))
+    while True:
+        window = text[:cut]
+        ends = [m.end() for m in _SENTENCE_END_RE.finditer(window)]
+        if ends:
+            candidate = window[:ends[-1]].rstrip()
+        else:
+            space = window.rfind(" ")
+            candidate = window[:space] if space > 0 else window
+        if estimate_tokens(candidate) <= max_tokens or not candidate:
+            return candidate
+        cut = len(candidate) - 1
+
+
+def dedupe_chunks(chunks: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Remove overlap between retrieved chunks, keeping rank order.
+
+    Adjacent chunks of one attachment share up to 200 characters, and the same text can
+    be attached twice. A chunk whose text was already seen, or whose character range is
+    covered by a higher-ranked chunk of the same document, is dropped; one that partially
+    overlaps loses the overlapping part (up to the next word).
+
+    Returns:
+        (chunks to use, number of chunks dropped)
+    """
+    kept: List[Dict[str, Any]] = []
+    seen_texts = set()
+    ranges: Dict[Any, List[Tuple[int, int]]] = {}
+    dropped = 0
+    for chunk in chunks:
+        text = chunk.get('text', '')
+        if text in seen_texts:
+            dropped += 1
+            continue
+        start, end = chunk.get('start_char'), chunk.get('end_char')
+        if start is None or end is None:
+            seen_texts.add(text)
+            kept.append(chunk)
+            continue
+        doc_ranges = ranges.setdefault(chunk.get('document_name'), [])
+        # Clip the range against every kept range of the same document
+        for kept_start, kept_end in doc_ranges:
+            if kept_start <= start and end <= kept_end:
+                start = end
+                break
+            if kept_start <= start < kept_end:
+                start = kept_end
+            elif kept_start < end <= kept_end:
+                end = kept_start
+        if end - start <= 0:
+            dropped += 1
+            continue
+        trimmed = dict(chunk)
+        head = start - chunk['start_char']
+        tail = chunk['end_char'] - end
+        if head > 0:
+            next_space = text.find(" ", head)
+            text = text[next_space + 1:] if next_space >= 0 else ""
+        if tail > 0:
+            last_space = text.rfind(" ", 0, max(0, len(text) - tail))
+            text = text[:last_space] if last_space >= 0 else ""
+        if not text.strip():
+            dropped += 1
+            continue
+        trimmed.update(text=text, start_char=start, end_char=end)
+        seen_texts.add(chunk.get('text', ''))
+        doc_ranges.append((start, end))
+        kept.append(trimmed)
+    return kept, dropped
+
+
+class ContextBudget:
+    """Running token account while the packed context is assembled."""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.used = 0
+        self.sections: Dict[str, int] = {}
+        self.truncated: List[str] = []
+        self.dropped: List[str] = []
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.used)
+
+    def take(self, section: str, text: str, label: Optional[str] = None, required: bool = False) -> str:
+        """
+        Charge text to the budget, truncating it to what remains.
+
+        Args:
+            section: Report bucket ("prompt", "manual_context", "attachments", "links", ...)
+            text: Text to add
+            label: Name for the truncated/dropped lists (default: section)
+            required: Add in full even past the budget (the prompt, fixed scaffolding)
+
+        Returns:
+            The text that fits ("" when dropped)
+        """
+        label = label or section
+        if not required:
+            tokens = estimate_tokens(text)
+            if tokens > self.remaining:
+                text = truncate_to_tokens(text, self.remaining) if self.remaining >= MIN_PIECE_TOKENS else ""
+                if text and estimate_tokens(text) >= MIN_PIECE_TOKENS:
+                    self.truncated.append(label)
+                else:
+                    text = ""
+                    self.dropped.append(label)
+        tokens = estimate_tokens(text)
+        self.used += tokens
+        self.sections[section] = self.sections.get(section, 0) + tokens
+        return text
+
+    def take_section(self, section: str, heading: str, body: str, label: Optional[str] = None) -> str:
+        """
+        Charge a heading plus as much of body as fits; neither is charged if the body is dropped.
+
+        Returns:
+            The part of body that fits ("" when dropped) - the caller emits the heading
+        """
+        label = label or section
+        heading_tokens = estimate_tokens(heading)
+        if self.remaining - heading_tokens < MIN_PIECE_TOKENS:
+            self.dropped.append(label)
+            return ""
+        self.used += heading_tokens
+        body = self.take(section, body, label)
+        if body:
+            self.sections[section] += heading_tokens
+        else:
+            self.used -= heading_tokens
+        return body
+
+    def report(self) -> Dict[str, Any]:
+        """Budget usage for the API response and logs."""
+        return {
+            "budget_tokens": self.total,
+            "used_tokens": self.used,
+            "sections": dict(self.sections),
+            "truncated": list(self.truncated),
+            "dropped": list(self.dropped),
+            "tokenizer": "cl100k_base" if _encoding is not None else "estimate",
+        }
@@ -1,16 +1,46 @@
 """3-stage LLM Council orchestration."""
 
-from typing import List, Dict, Any, Tuple
-from .openrouter import query_models_parallel, query_model
-from .config import COUNCIL_MODELS, CHAIRMAN_MODEL, COUNCIL_MODEL_TIMEOUT, COUNCIL_STAGE_TIMEOUT
+import asyncio
+import sys
+from typing import List, Dict, Any, Tuple, Optional
+from .openrouter import query_models_parallel, query_model, query_model_streaming, DeltaCallback
+from .singleflight import SingleFlight, coalesce
+from .hedging import hedge_policy, hedged_query
+from . import metrics
+from .tracing import traced
+from .config import (
+    COUNCIL_MODELS,
+    CHAIRMAN_MODEL,
+    COUNCIL_MODEL_TIMEOUT,
+    COUNCIL_STAGE_TIMEOUT,
+    COUNCIL_PIPELINE_ENABLED,
+    COUNCIL_STAGE1_QUORUM,
+)
+
+# Identical concurrent stage runs (two tabs, retrying clients) share one execution.
+# Streaming callbacks are not part of the key: joining callers get the final result.
+_stage_flights = SingleFlight("council")
+
+
+def _record_hedge_outcomes(responses: Dict[str, Optional[Dict[str, Any]]]):
+    """Report which path (primary or backup) served each council seat so the hedge policy tunes itself."""
+    for model, response in responses.items():
+        if response is not None and response.get("hedge"):
+            hedge_policy.record_outcome(model, response["hedge"])
 
 
-async def stage1_collect_responses(user_query: str) -> List[Dict[str, Any]]:
+@coalesce(_stage_flights, "stage1", ignore=("on_delta",))
+@traced("council.stage1")
+async def stage1_collect_responses(
+    user_query: str,
+    on_delta: Optional[DeltaCallback] = None
+) -> List[Dict[str, Any]]:
     """
     Stage 1: Collect individual responses from all council models.
 
     Args:
         user_query: The user's question
+        on_delta: Optional callback(model, text) to receive streamed tokens
 
     Returns:
         List of dicts with 'model' and 'response' keys
@@ -18,27 +48,38 @@ async def stage1_collect_responses(user_query: str) -> List[Dict[str, Any]]:
     messages = [{"role": "user", "content": user_query}]
 
     # Query all models in parallel (stage timeout avoids 2+ min stall when one model hangs)
-    responses = await query_models_parallel(
-        COUNCIL_MODELS, messages,
-        timeout=COUNCIL_MODEL_TIMEOUT,
-        stage_timeout=COUNCIL_STAGE_TIMEOUT
-    )
+    with metrics.stage("stage1"):
+        responses = await query_models_parallel(
+            COUNCIL_MODELS, messages,
+            timeout=COUNCIL_MODEL_TIMEOUT,
+            stage_timeout=COUNCIL_STAGE_TIMEOUT,
+            on_delta=on_delta,
+            hedge=True
+        )
+    _record_hedge_outcomes(responses)
 
     # Format results
     stage1_results = []
     for model, response in responses.items():
         if response is not None:  # Only include successful responses
-            stage1_results.append({
+            result = {
                 "model": model,
                 "response": response.get('content', '')
-            })
+            }
+            served_by = (response.get("hedge") or {}).get("served_by")
+            if served_by and served_by != model:
+                result["served_by"] = served_by  # a hedge substitute answered for this seat
+            stage1_results.append(result)
 
     return stage1_results
 
 
+@coalesce(_stage_flights, "stage2", ignore=("on_delta",))
+@traced("council.stage2")
 async def stage2_collect_rankings(
     user_query: str,
-    stage1_results: List[Dict[str, Any]]
+    stage1_results: List[Dict[str, Any]],
+    on_delta: Optional[DeltaCallback] = None
 ) -> Tuple[List[Dict[str, Any]], Dict[str, str]]:
     """
     Stage 2: Each model ranks the anonymized responses.
@@ -46,6 +87,7 @@ async def stage2_collect_rankings(
     Args:
         user_query: The original user query
         stage1_results: Results from Stage 1
+        on_delta: Optional callback(model, text) to receive streamed tokens
 
     Returns:
         Tuple of (rankings list, label_to_model mapping)
@@ -99,11 +141,15 @@ Now provide your evaluation and ranking:"""
     messages = [{"role": "user", "content": ranking_prompt}]
 
     # Get rankings from all council models in parallel
-    responses = await query_models_parallel(
-        COUNCIL_MODELS, messages,
-        timeout=COUNCIL_MODEL_TIMEOUT,
-        stage_timeout=COUNCIL_STAGE_TIMEOUT
-    )
+    with metrics.stage("stage2"):
+        responses = await query_models_parallel(
+            COUNCIL_MODELS, messages,
+            timeout=COUNCIL_MODEL_TIMEOUT,
+            stage_timeout=COUNCIL_STAGE_TIMEOUT,
+            on_delta=on_delta,
+            hedge=True
+        )
+    _record_hedge_outcomes(responses)
 
     # Format results
     stage2_results = []
@@ -120,10 +166,117 @@ Now provide your evaluation and ranking:"""
     return stage2_results, label_to_model
 
 
+@coalesce(_stage_flights, "stage1_stage2_pipelined", ignore=("on_stage1_delta", "on_stage2_delta"))
+@traced("council.stage1_stage2_pipelined")
+async def stage1_and_stage2_pipelined(
+    user_query: str,
+    quorum: Optional[int] = None,
+    on_stage1_delta: Optional[DeltaCallback] = None,
+    on_stage2_delta: Optional[DeltaCallback] = None
+) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]], Dict[str, str]]:
+    """
+    Pipelined Stages 1 and 2: start peer ranking as soon as a quorum of Stage 1 answers exist.
+
+    Stage 1 queries keep running while the rankers work. Answers that arrive after ranking
+    has started are included in the Stage 1 results with "unranked": True (they reach the
+    chairman but are not peer-ranked). Any model still pending when ranking finishes, or
+    when COUNCIL_STAGE_TIMEOUT expires, is dropped - so one slow model no longer holds up
+    the whole council.
+
+    Args:
+        user_query: The user's question
+        quorum: Stage 1 answers needed before ranking starts (default COUNCIL_STAGE1_QUORUM)
+        on_stage1_delta: Optional callback(model, text) for streamed Stage 1 tokens
+        on_stage2_delta: Optional callback(model, text) for streamed Stage 2 tokens
+
+    Returns:
+        Tuple of (stage1_results, stage2_results, label_to_model)
+    """
+    messages = [{"role": "user", "content": user_query}]
+    needed = max(1, min(quorum or COUNCIL_STAGE1_QUORUM, len(COUNCIL_MODELS)))
+
+    async def query_one(model: str):
+        with metrics.stage("stage1"):
+            response = await hedged_query(model, messages, COUNCIL_MODEL_TIMEOUT, on_delta=on_stage1_delta)
+        if response is not None:
+            _record_hedge_outcomes({model: response})
+        return model, response
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + COUNCIL_STAGE_TIMEOUT
+    pending = {asyncio.create_task(query_one(m)) for m in COUNCIL_MODELS}
+    ranked: List[Dict[str, Any]] = []
+    late: List[Dict[str, Any]] = []
+    stage2_task = None
+
+    def collect(done_tasks):
+        for t in done_tasks:
+            if t is stage2_task or t.cancelled() or t.exception() is not None:
+                continue
+            model, response = t.result()
+            if response is None:
+                continue
+            result = {"model": model, "response": response.get('content', '')}
+            served_by = (response.get("hedge") or {}).get("served_by")
+            if served_by and served_by != model:
+                result["served_by"] = served_by
+            if stage2_task is None:
+                ranked.append(result)
+            else:
+                result["unranked"] = True
+                late.append(result)
+
+    try:
+        # Phase 1: wait for the quorum (or until every model has finished / the stage timed out)
+        while pending and len(ranked) < needed:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+
+        if not ranked:
+            return [], [], {}
+
+        print(f"[COUNCIL] Pipeline: ranking {len(ranked)}/{len(COUNCIL_MODELS)} Stage 1 answers ({len(pending)} still pending)", file=sys.stderr, flush=True)
+        ranked_snapshot = list(ranked)
+        stage2_task = asyncio.create_task(
+            stage2_collect_rankings(user_query, ranked_snapshot, on_delta=on_stage2_delta)
+        )
+
+        # Phase 2: keep collecting late Stage 1 answers while the rankers work
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, _ = await asyncio.wait(pending | {stage2_task}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            pending -= done
+            collect(done)
+            if stage2_task.done():
+                break
+
+        # Stragglers that missed both the ranking pass and the stage deadline are dropped
+        for t in pending:
+            t.cancel()
+        stage2_results, label_to_model = await stage2_task
+    finally:
+        for t in pending:
+            t.cancel()
+        if stage2_task is not None and not stage2_task.done():
+            stage2_task.cancel()
+
+    if pending:
+        print(f"[COUNCIL] Pipeline: dropped {len(pending)} Stage 1 answers still pending after ranking", file=sys.stderr, flush=True)
+    return ranked_snapshot + late, stage2_results, label_to_model
+
+
+@coalesce(_stage_flights, "stage3", ignore=("on_delta",))
+@traced("council.stage3")
 async def stage3_synthesize_final(
     user_query: str,
     stage1_results: List[Dict[str, Any]],
-    stage2_results: List[Dict[str, Any]]
+    stage2_results: List[Dict[str, Any]],
+    on_delta: Optional[DeltaCallback] = None
 ) -> Dict[str, Any]:
     """
     Stage 3: Chairman synthesizes final response.
@@ -132,25 +285,25 @@ async def stage3_synthesize_final(
         user_query: The original user query
         stage1_results: Individual model responses from Stage 1
         stage2_results: Rankings from Stage 2
+        on_delta: Optional callback(model, text) to stream the chairman's tokens
 
     Returns:
         Dict with 'model' and 'response' keys
     """
-    import sys
-    
     # Safety check: if no stage1 results, return error
     if not stage1_results:
         print("[STAGE3] ERROR: No Stage 1 results available", file=sys.stderr, flush=True)
         return {
             "model": CHAIRMAN_MODEL,
-            "response": "Error: No responses available from Stage 1 to synthesize."
+            "response": "Error: No responses available from Stage 1 to synthesize.",
+            "error": True
         }
     
     print(f"[STAGE3] Starting synthesis with {len(stage1_results)} Stage 1 results and {len(stage2_results)} Stage 2 rankings", file=sys.stderr, flush=True)
     
     # Build comprehensive context for chairman
     stage1_text = "\n\n".join([
-        f"Model: {result['model']}\nResponse: {result['response']}"
+        f"Model: {result['model']}{' (arrived after peer review - not ranked)' if result.get('unranked') else ''}\nResponse: {result['response']}"
         for result in stage1_results
     ])
 
@@ -182,14 +335,18 @@ Provide a clear, well-reasoned final answer that represents the council's collec
     
     try:
         # Query the chairman model with longer timeout for synthesis (150s for best quality)
-        response = await query_model(CHAIRMAN_MODEL, messages, timeout=150.0)
+        if on_delta is not None:
+            response = await query_model_streaming(CHAIRMAN_MODEL, messages, on_delta, timeout=150.0, stage="stage3")
+        else:
+            response = await query_model(CHAIRMAN_MODEL, messages, timeout=150.0, stage="stage3")
 
         if response is None:
             print(f"[STAGE3] ERROR: Chairman model returned None", file=sys.stderr, flush=True)
             # Fallback if chairman fails
             return {
                 "model": CHAIRMAN_MODEL,
-                "response": "Error: Chairman model failed to respond. Please try again or check your OpenRouter API key and credits."
+                "response": "Error: Chairman model failed to respond. Please try again or check your OpenRouter API key and credits.",
+                "error": True
             }
         
         content = response.get('content', '')
@@ -197,7 +354,8 @@ Provide a clear, well-reasoned final answer that represents the council's collec
             print(f"[STAGE3] ERROR: Chairman model returned empty content", file=sys.stderr, flush=True)
             return {
                 "model": CHAIRMAN_MODEL,
-                "response": "Error: Chairman model returned empty response. Please try again."
+                "response": "Error: Chairman model returned empty response. Please try again.",
+                "error": True
             }
         
         print(f"[STAGE3] SUCCESS: Chairman model returned {len(content)} characters", file=sys.stderr, flush=True)
@@ -212,7 +370,8 @@ Provide a clear, well-reasoned final answer that represents the council's collec
         traceback.print_exc(file=sys.stderr)
         return {
             "model": CHAIRMAN_MODEL,
-            "response": f"Error in final synthesis: {type(e).__name__}: {str(e)}. Please try again."
+            "response": f"Error in final synthesis: {type(e).__name__}: {str(e)}. Please try again.",
+            "error": True
         }
 
 
@@ -250,6 +409,7 @@ def parse_ranking_from_text(ranking_text: str) -> List[str]:
     return matches
 
 
+@traced("calculate_aggregate_rankings")
 def calculate_aggregate_rankings(
     stage2_results: List[Dict[str, Any]],
     label_to_model: Dict[str, str]
@@ -297,6 +457,7 @@ def calculate_aggregate_rankings(
     return aggregate
 
 
+@traced("council.title")
 async def generate_conversation_title(user_query: str) -> str:
     """
     Generate a short title for a conversation based on the first user message.
@@ -316,8 +477,9 @@ Title:"""
 
     messages = [{"role": "user", "content": title_prompt}]
 
-    # Use gemini-2.5-flash for title generation (fast and cheap)
-    response = await query_model("google/gemini-2.5-flash", messages, timeout=30.0)
+    # Use gemini-2.5-flash for title generation (fast and cheap); memoized since
+    # retries and refreshes re-ask for the same prompt
+    response = await query_model("google/gemini-2.5-flash", messages, timeout=30.0, cache_ttl=3600, stage="title")
 
     if response is None:
         # Fallback to a generic title
@@ -345,18 +507,24 @@ async def run_full_council(user_query: str) -> Tuple[List, List, Dict, Dict]:
     Returns:
         Tuple of (stage1_results, stage2_results, stage3_result, metadata)
     """
-    # Stage 1: Collect individual responses
-    stage1_results = await stage1_collect_responses(user_query)
+    if COUNCIL_PIPELINE_ENABLED:
+        # Stages 1+2 pipelined: ranking starts once a quorum of answers is in
+        stage1_results, stage2_results, label_to_model = await stage1_and_stage2_pipelined(user_query)
+    else:
+        # Stage 1: Collect individual responses
+        stage1_results = await stage1_collect_responses(user_query)
 
     # If no models responded successfully, return error
     if not stage1_results:
         return [], [], {
             "model": "error",
-            "response": "All models failed to respond. Please try again."
+            "response": "All models failed to respond. Please try again.",
+            "error": True
         }, {}
 
-    # Stage 2: Collect rankings
-    stage2_results, label_to_model = await stage2_collect_rankings(user_query, stage1_results)
+    if not COUNCIL_PIPELINE_ENABLED:
+        # Stage 2: Collect rankings
+        stage2_results, label_to_model = await stage2_collect_rankings(user_query, stage1_results)
 
     # Calculate aggregate rankings
     aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
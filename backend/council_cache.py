@@ -0,0 +1,197 @@
+"""Council result cache - replays a full 3-stage deliberation for repeated queries.
+
+Re-submitting the same full_query (UI refresh, client retry) would otherwise re-run
+every council member, ranker and the chairman. Results are keyed by a normalized hash
+of the query + council roster + chairman, held in an in-memory LRU/TTL tier and backed
+by the council_cache table so hits survive restarts.
+"""
+
+import asyncio
+import hashlib
+import json
+import re
+import sys
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from .config import (
+    COUNCIL_MODELS,
+    CHAIRMAN_MODEL,
+    COUNCIL_CACHE_ENABLED,
+    COUNCIL_CACHE_TTL,
+    COUNCIL_CACHE_MAX_ENTRIES,
+)
+
+# key -> (expires_at monotonic seconds, payload)
+_memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "saved_seconds": 0.0,
+    "saved_upstream_calls": 0,
+}
+
+
+def normalize_query(query: str) -> str:
+    """Collapse whitespace and case so trivially different re-submissions share a key."""
+    return re.sub(r"\s+", " ", query or "").strip().lower()
+
+
+def cache_key(
+    query: str,
+    models: Optional[List[str]] = None,
+    chairman: Optional[str] = None
+) -> str:
+    """Build the cache key for a query against a council roster and chairman."""
+    material = json.dumps({
+        "query": normalize_query(query),
+        "models": sorted(models if models is not None else COUNCIL_MODELS),
+        "chairman": chairman or CHAIRMAN_MODEL,
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _remember(key: str, payload: Dict[str, Any], ttl: float):
+    _memory[key] = (time.monotonic() + ttl, payload)
+    _memory.move_to_end(key)
+    while len(_memory) > COUNCIL_CACHE_MAX_ENTRIES:
+        _memory.popitem(last=False)
+
+
+def _record_hit(payload: Dict[str, Any], tier: str):
+    _stats[f"{tier}_hits"] += 1
+    _stats["saved_seconds"] += float(payload.get("elapsed_seconds") or 0.0)
+    _stats["saved_upstream_calls"] += int(payload.get("upstream_calls") or 0)
+
+
+def _disk_get(key: str) -> Optional[tuple]:
+    """Blocking lookup in the council_cache table: (payload, remaining ttl) or None."""
+    from .database import CouncilCacheEntry, get_session
+    db = get_session()
+    try:
+        row = db.query(CouncilCacheEntry).filter(CouncilCacheEntry.key == key).first()
+        if row is not None and row.expires_at > datetime.utcnow():
+            row.hit_count = (row.hit_count or 0) + 1
+            db.commit()
+            return row.payload, (row.expires_at - datetime.utcnow()).total_seconds()
+        if row is not None:
+            db.delete(row)
+            db.commit()
+        return None
+    finally:
+        db.close()
+
+
+def _disk_put(key: str, payload: Dict[str, Any]):
+    """Blocking upsert into the council_cache table."""
+    from .database import CouncilCacheEntry, get_session
+    db = get_session()
+    try:
+        now = datetime.utcnow()
+        row = db.query(CouncilCacheEntry).filter(CouncilCacheEntry.key == key).first()
+        if row is None:
+            row = CouncilCacheEntry(key=key, hit_count=0)
+            db.add(row)
+        row.created_at = now
+        row.expires_at = now + timedelta(seconds=COUNCIL_CACHE_TTL)
+        row.payload = payload
+        db.commit()
+    finally:
+        db.close()
+
+
+async def get(key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a cached council result.
+
+    The in-memory tier is checked on the event loop; the database tier runs in a
+    worker thread so a lookup never blocks other requests.
+
+    Returns:
+        Payload dict with 'stage1', 'stage2', 'stage3', 'metadata', or None on miss
+    """
+    if not COUNCIL_CACHE_ENABLED:
+        return None
+
+    entry = _memory.get(key)
+    if entry is not None:
+        expires_at, payload = entry
+        if expires_at > time.monotonic():
+            _memory.move_to_end(key)
+            _record_hit(payload, "memory")
+            return payload
+        del _memory[key]
+
+    try:
+        found = await asyncio.to_thread(_disk_get, key)
+        if found is not None:
+            payload, ttl = found
+            _remember(key, payload, ttl)
+            _record_hit(payload, "disk")
+            return payload
+    except Exception as e:
+        print(f"[COUNCIL_CACHE] Disk lookup failed: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+
+    _stats["misses"] += 1
+    return None
+
+
+async def put(
+    key: str,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any],
+    metadata: Dict[str, Any],
+    elapsed_seconds: float = 0.0
+):
+    """
+    Store a completed council result. Failed deliberations (stage3 flagged "error",
+    or no stage1 answer at all) are never cached.
+
+    Args:
+        key: Key from cache_key()
+        stage1, stage2, stage3, metadata: The council outputs to replay
+        elapsed_seconds: Wall time the deliberation took (reported as savings on hits)
+    """
+    if not COUNCIL_CACHE_ENABLED:
+        return
+    if not stage3 or stage3.get("error") or stage3.get("model") == "error":
+        return
+    if not any((result.get("response") or "").strip() for result in stage1 or []):
+        return  # every council member failed
+
+    payload = {
+        "stage1": stage1,
+        "stage2": stage2,
+        "stage3": stage3,
+        "metadata": metadata,
+        "elapsed_seconds": round(elapsed_seconds, 3),
+        # Stage 1 + Stage 2 per council member, plus the chairman
+        "upstream_calls": 2 * len(COUNCIL_MODELS) + 1,
+    }
+    _remember(key, payload, COUNCIL_CACHE_TTL)
+    _stats["stores"] += 1
+
+    try:
+        await asyncio.to_thread(_disk_put, key, payload)
+    except Exception as e:
+        print(f"[COUNCIL_CACHE] Disk store failed: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+
+
+def get_stats() -> Dict[str, Any]:
+    """Hit/miss counters and estimated savings since process start."""
+    hits = _stats["memory_hits"] + _stats["disk_hits"]
+    lookups = hits + _stats["misses"]
+    return {
+        **_stats,
+        "saved_seconds": round(_stats["saved_seconds"], 3),
+        "hits": hits,
+        "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        "memory_entries": len(_memory),
+        "enabled": COUNCIL_CACHE_ENABLED,
+    }
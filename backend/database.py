@@ -1,12 +1,19 @@
 """Database models and setup for LLM Council."""
 
-from sqlalchemy import create_engine, Column, String, Text, DateTime, Integer, JSON
+from sqlalchemy import create_engine, event, Column, String, Text, DateTime, Integer, JSON, ForeignKey, Index, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+from collections import OrderedDict
+import hashlib
 import os
+import threading
+import zlib
 from pathlib import Path
 
+from .config import BLOB_CACHE_MB
+
 Base = declarative_base()
 
 
@@ -25,14 +32,100 @@ class Conversation(Base):
     prior_synthesis = Column(Text, nullable=True)  # Prior Stage 3 synthesis for continuation
     prior_preparation_summary = Column(Text, nullable=True)  # Summary of prior preparation conversation
     
-    # JSON fields for complex nested data
+    # JSON fields for per-section scalars (finalized_prompt, finalized_context).
+    # Lists live in the messages / attachments / council_runs tables so appends are single-row INSERTs.
     prompt_engineering = Column(JSON, default=dict)
     context_engineering = Column(JSON, default=dict)
     council_deliberation = Column(JSON, default=dict)
     
+    # Denormalized for the sidebar listing (kept up to date by storage_db writes)
+    message_count = Column(Integer, default=0, nullable=True)  # council_deliberation messages
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=True)
+    
     # For backward compatibility with old format
     messages = Column(JSON, default=list)
 
+    # Keyset pagination of the listing (newest first)
+    __table_args__ = (Index("ix_conversations_created_at_id", "created_at", "id"),)
+
+
+class Message(Base):
+    """One chat message in a conversation section (prompt_engineering, context_engineering, council_deliberation)."""
+    __tablename__ = "messages"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)  # insertion order = message order
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    section = Column(String, nullable=False)
+    role = Column(String, nullable=False)
+    content = Column(Text, nullable=True)
+    extra = Column(JSON, nullable=True)  # any other message keys
+    council_run_id = Column(Integer, ForeignKey("council_runs.id", ondelete="CASCADE"), nullable=True)  # assistant council answers
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Attachment(Base):
+    """A document, parsed file or fetched link attached during context engineering."""
+    __tablename__ = "attachments"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    kind = Column(String, nullable=False)  # "document", "file" or "link"
+    name = Column(String, nullable=True)
+    data = Column(JSON, nullable=False)  # the attachment dict as returned to the API, minus content
+    status = Column(String, nullable=False, default="ready", server_default="ready")  # "pending" while ingesting, "ready" or "failed"
+    content_hash = Column(String, nullable=True, index=True)  # Blob holding the content
+    raw_hash = Column(String, nullable=True, index=True)  # sha256 of the uploaded bytes (parse results are reused)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class Blob(Base):
+    """Attachment content, stored once per distinct text (zlib-compressed) and shared by every attachment with it."""
+    __tablename__ = "blobs"
+
+    sha256 = Column(String, primary_key=True)  # attachment_content_hash of the text
+    size = Column(Integer, nullable=False)  # uncompressed UTF-8 bytes
+    data = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class BlobChunk(Base):
+    """RAG chunk of a blob, computed once per distinct content (see rag_system.chunk_attachment)."""
+    __tablename__ = "blob_chunks"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    content_hash = Column(String, nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    start_char = Column(Integer, nullable=False)
+    end_char = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    document_type = Column(String, nullable=True)
+    extra = Column(JSON, nullable=True)  # page_count / slide_count / page_start / page_end
+
+
+class CouncilRun(Base):
+    """Stage 1-3 output of one council deliberation (the assistant message's heavy payload)."""
+    __tablename__ = "council_runs"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    conversation_id = Column(String, ForeignKey("conversations.id", ondelete="CASCADE"), nullable=False, index=True)
+    stage1 = Column(JSON, nullable=True)
+    stage2 = Column(JSON, nullable=True)
+    stage3 = Column(JSON, nullable=True)
+    run_metadata = Column("metadata", JSON, nullable=True)
+    trace_id = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
+class CouncilCacheEntry(Base):
+    """On-disk tier of the council result cache (see council_cache.py)."""
+    __tablename__ = "council_cache"
+
+    key = Column(String, primary_key=True)  # sha256 of normalized query + roster + chairman
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    payload = Column(JSON, nullable=False)  # stage1, stage2, stage3, metadata
+    hit_count = Column(Integer, default=0, nullable=False)
+
 
 def get_database_url() -> str:
     """Get database URL from environment or use default SQLite."""
@@ -63,6 +156,53 @@ def get_database_url() -> str:
         return db_url
 
 
+def get_async_database_url() -> str:
+    """Database URL with the asyncio driver (aiosqlite for SQLite; asyncpg, if installed, for PostgreSQL)."""
+    database_url = get_database_url()
+    scheme, sep, rest = database_url.partition("://")
+    driver = scheme.split("+")[0]
+    if driver == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if driver in ("postgresql", "postgres"):
+        # asyncpg takes ssl= rather than libpq's sslmode=
+        return f"postgresql+asyncpg{sep}{rest.replace('sslmode=', 'ssl=')}"
+    return database_url
+
+
+def _pool_options(database_url: str) -> Dict[str, Any]:
+    """Connection pool settings for server databases (see DB_POOL_* in config.py)."""
+    if database_url.startswith("sqlite"):
+        return {}
+    from .config import DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": True,  # drop connections the server closed while idle
+    }
+
+
+def _apply_sqlite_pragmas(engine):
+    """Set the SQLite performance profile (SQLITE_* in config.py) on every new connection."""
+    from .config import SQLITE_PERFORMANCE_MODE, SQLITE_MMAP_SIZE, SQLITE_CACHE_SIZE_KB, SQLITE_BUSY_TIMEOUT_MS
+    if not SQLITE_PERFORMANCE_MODE:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+            cursor.execute("PRAGMA journal_mode = WAL")  # persistent; cheap no-op once set
+            cursor.execute("PRAGMA synchronous = NORMAL")  # safe with WAL: a crash can lose only the last commits, never corrupt
+            cursor.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+            cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")  # negative = KiB
+            cursor.execute("PRAGMA temp_store = MEMORY")
+        finally:
+            cursor.close()
+
+
 def get_engine():
     """Get SQLAlchemy engine."""
     database_url = get_database_url()
@@ -74,66 +214,209 @@ def get_engine():
             connect_args={"check_same_thread": False},  # Needed for SQLite
             echo=False  # Set to True for SQL debugging
         )
+        _apply_sqlite_pragmas(engine)
     else:
         # PostgreSQL or other databases
-        engine = create_engine(database_url, echo=False)
+        engine = create_engine(database_url, echo=False, **_pool_options(database_url))
     
     return engine
 
 
-def _migrate_add_chain_columns(engine):
-    """Add chain_id, parent_id, round_number, prior_synthesis, prior_preparation_summary if missing (migration)."""
-    from sqlalchemy import text
-    db_url = str(engine.url)
-    try:
-        with engine.connect() as conn:
-            if db_url.startswith("sqlite"):
-                r = conn.execute(text("PRAGMA table_info(conversations)"))
-                cols = [row[1] for row in r.fetchall()]
+def add_message_row(db: Session, conversation_id: str, section: str, message: Dict[str, Any]) -> Message:
+    """Stage one message INSERT (council assistant answers also get a council_runs row)."""
+    run = None
+    if section == "council_deliberation" and message.get("role") == "assistant":
+        run = CouncilRun(
+            conversation_id=conversation_id,
+            stage1=message.get("stage1"),
+            stage2=message.get("stage2"),
+            stage3=message.get("stage3"),
+            run_metadata=message.get("metadata"),
+            trace_id=message.get("trace_id"),
+        )
+        db.add(run)
+        db.flush()
+        skip = {"role", "content", "stage1", "stage2", "stage3", "metadata", "trace_id"}
+    else:
+        skip = {"role", "content"}
+    extra = {k: v for k, v in message.items() if k not in skip}
+    row = Message(
+        conversation_id=conversation_id,
+        section=section,
+        role=message.get("role") or "user",
+        content=message.get("content"),
+        extra=extra or None,
+        council_run_id=run.id if run is not None else None,
+    )
+    db.add(row)
+    return row
+
+
+def attachment_content_hash(data: Dict[str, Any]) -> str:
+    return hashlib.sha256((data.get("content") or "").encode("utf-8", "surrogatepass")).hexdigest()
+
+
+# Decompressed blob texts, most recently used last (shared by reads of every conversation)
+_blob_cache: "OrderedDict[str, str]" = OrderedDict()
+_blob_cache_chars = 0
+_blob_cache_lock = threading.Lock()
+
+
+def _cache_blob(content_hash: str, content: str):
+    global _blob_cache_chars
+    limit = BLOB_CACHE_MB * 1024 * 1024
+    if len(content) > limit:
+        return
+    with _blob_cache_lock:
+        if content_hash in _blob_cache:
+            _blob_cache.move_to_end(content_hash)
+            return
+        _blob_cache[content_hash] = content
+        _blob_cache_chars += len(content)
+        while _blob_cache_chars > limit:
+            _, evicted = _blob_cache.popitem(last=False)
+            _blob_cache_chars -= len(evicted)
+
+
+def _insert_blob_statement(dialect: str):
+    """INSERT into blobs that skips a row whose hash is already stored (by a concurrent writer)."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        from sqlalchemy import insert
+        return insert(Blob)
+    return insert(Blob).on_conflict_do_nothing(index_elements=[Blob.sha256])
+
+
+def put_blob(db: Session, content: str) -> str:
+    """Store the content's blob unless it is already stored; returns its hash."""
+    content_hash = attachment_content_hash({"content": content})
+    if db.get(Blob, content_hash) is None:
+        raw = content.encode("utf-8", "surrogatepass")
+        # An upsert: two ingestions of identical content may both get here (PostgreSQL)
+        db.execute(
+            _insert_blob_statement(db.get_bind().dialect.name),
+            {"sha256": content_hash, "size": len(raw), "data": zlib.compress(raw), "created_at": datetime.utcnow()},
+        )
+    _cache_blob(content_hash, content)
+    return content_hash
+
+
+def load_blob_texts(db: Session, content_hashes: Iterable[str]) -> Dict[str, str]:
+    """Content of the given blobs, decompressed (recently used ones come from an in-process cache)."""
+    texts: Dict[str, str] = {}
+    missing = []
+    with _blob_cache_lock:
+        for content_hash in set(content_hashes):
+            if content_hash in _blob_cache:
+                _blob_cache.move_to_end(content_hash)
+                texts[content_hash] = _blob_cache[content_hash]
             else:
-                r = conn.execute(text(
-                    "SELECT column_name FROM information_schema.columns WHERE table_name = 'conversations'"
-                ))
-                cols = [row[0] for row in r.fetchall()]
-            for col, sql_type in [
-                ("chain_id", "TEXT"),
-                ("parent_id", "TEXT"),
-                ("round_number", "INTEGER"),
-                ("prior_synthesis", "TEXT"),
-                ("prior_preparation_summary", "TEXT"),
-            ]:
-                if col not in cols:
-                    conn.execute(text(f"ALTER TABLE conversations ADD COLUMN {col} {sql_type}"))
-                    conn.commit()
-    except Exception:
-        pass  # Table may not exist yet; create_all handles that
+                missing.append(content_hash)
+    if missing:
+        for row in db.query(Blob.sha256, Blob.data).filter(Blob.sha256.in_(missing)):
+            texts[row.sha256] = zlib.decompress(row.data).decode("utf-8", "surrogatepass")
+            _cache_blob(row.sha256, texts[row.sha256])
+    return texts
+
+
+def add_blob_chunks(
+    db: Session,
+    content_hash: str,
+    kind: str,
+    data: Dict[str, Any],
+    chunks: Optional[List[Dict[str, Any]]] = None
+) -> int:
+    """
+    Stage the RAG chunk rows of a blob unless it already has them.
+
+    Args:
+        content_hash: Blob the chunks are cut from
+        kind, data: Attachment kind and dict (with content), for chunking
+        chunks: Precomputed by the caller (default: chunked here)
+
+    Returns:
+        Number of chunks added (0 when they were already stored)
+    """
+    if db.query(BlobChunk.id).filter(BlobChunk.content_hash == content_hash).first() is not None:
+        return 0
+    if chunks is None:
+        from .rag_system import chunk_attachment
+        chunks = chunk_attachment(kind, data)
+    for chunk in chunks:
+        db.add(BlobChunk(
+            content_hash=content_hash,
+            chunk_index=chunk["chunk_index"],
+            start_char=chunk["start_char"],
+            end_char=chunk["end_char"],
+            text=chunk["text"],
+            document_type=chunk.get("document_type"),
+            extra={k: chunk[k] for k in ("page_count", "slide_count", "page_start", "page_end") if k in chunk} or None,
+        ))
+    db.flush()
+    return len(chunks)
+
+
+def add_attachment_row(
+    db: Session,
+    conversation_id: str,
+    kind: str,
+    data: Dict[str, Any],
+    raw_hash: Optional[str] = None
+) -> Attachment:
+    """Stage one attachment INSERT (kind: document, file or link); its content goes to a shared blob."""
+    # attachment_id/status are row columns, added to the dict when it is read back
+    status = data.get("status") or "ready"
+    content = data.get("content")
+    data = {k: v for k, v in data.items() if k not in ("attachment_id", "status", "content")}
+    row = Attachment(
+        conversation_id=conversation_id,
+        kind=kind,
+        name=data.get("name"),
+        data=data,
+        status=status,
+        content_hash=put_blob(db, content or ""),
+        raw_hash=raw_hash,
+    )
+    db.add(row)
+    return row
+
+
+# Global session factory
+_engine = None
+_SessionLocal = None
 
 
 def init_db():
-    """Initialize database tables."""
+    """
+    Create the engine and bring the schema up to date (once per process).
+
+    Migrations (backend/migrations.py) run on the first call only; later calls just
+    return the engine, so storage code never pays for schema introspection.
+    """
+    global _engine, _SessionLocal
+    if _engine is not None:
+        return _engine
+
     from .logger import get_logger
+    from .migrations import run_migrations
     engine = get_engine()
-    Base.metadata.create_all(engine)
-    _migrate_add_chain_columns(engine)
+    version = run_migrations(engine)
+    _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    _engine = engine
     # Log DB location once at first init (reduces log noise)
     db_url = str(engine.url)
     if "sqlite" in db_url:
-        get_logger("db").info("Database initialized: %s", db_url.replace("sqlite:///", ""))
+        get_logger("db").info("Database initialized: %s (schema version %d)", db_url.replace("sqlite:///", ""), version)
     return engine
 
 
-# Global session factory
-_engine = None
-_SessionLocal = None
-
-
 def get_db():
     """Dependency for FastAPI to get database session (generator)."""
-    global _engine, _SessionLocal
-    
-    if _engine is None:
-        _engine = init_db()
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    if _SessionLocal is None:
+        init_db()
     
     db = _SessionLocal()
     try:
@@ -144,11 +427,42 @@ def get_db():
 
 def get_session() -> Session:
     """Get a single database session (for non-FastAPI use)."""
-    global _engine, _SessionLocal
-    
-    if _engine is None:
-        _engine = init_db()
-        _SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+    if _SessionLocal is None:
+        init_db()
     
     return _SessionLocal()
 
+
+
+# Async engine (storage_async.py)
+_async_engine = None
+_AsyncSessionLocal = None
+
+
+def get_async_sessionmaker():
+    """
+    Session factory on the shared async engine; schema migrations run first (via init_db).
+
+    Raises:
+        ImportError: The async driver is not installed (asyncpg is not a dependency - PostgreSQL
+            falls back to worker threads unless it is added)
+    """
+    global _async_engine, _AsyncSessionLocal
+    if _AsyncSessionLocal is None:
+        from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+        init_db()
+        database_url = get_async_database_url()
+        _async_engine = create_async_engine(database_url, echo=False, **_pool_options(database_url))
+        if database_url.startswith("sqlite"):
+            _apply_sqlite_pragmas(_async_engine.sync_engine)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+    return _AsyncSessionLocal
+
+
+async def dispose_async_engine():
+    """Close the async engine's pooled connections (app shutdown)."""
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    _async_engine = None
+    _AsyncSessionLocal = None
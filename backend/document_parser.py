@@ -1,46 +1,96 @@
-"""Document parsing utilities for extracting text from various file formats."""
+"""Document parsing utilities for extracting text from various file formats.
 
+The PDF/Word/Excel/PowerPoint extractors are plain functions run in the parsing
+service's worker processes (parsing_service.py), so a large file doesn't block the
+event loop; parse_pdf/parse_docx/... are their awaitable entry points. Long PDFs are
+split into page ranges extracted in parallel.
+
+Parsers take the file as bytes or as a path. Uploads are spooled to a temporary file
+(uploads.py) and passed by path, so workers open the file themselves instead of the
+content being copied into every job.
+"""
+
+import asyncio
 import io
-from typing import Optional, Dict, Any
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Dict, Any, Callable, List, Union, IO
 import httpx
 
+from . import parsing_service
+from .config import PDF_PAGES_PER_JOB
+from .parsing_service import ParsingQueueFull, ParsingTimeout
 
-async def parse_pdf(file_content: bytes, filename: str) -> Dict[str, Any]:
-    """Extract text from PDF file."""
-    try:
-        import pypdf
-        
-        pdf_file = io.BytesIO(file_content)
-        pdf_reader = pypdf.PdfReader(pdf_file)
-        
-        text_parts = []
-        for page_num, page in enumerate(pdf_reader.pages, 1):
-            try:
-                text = page.extract_text()
-                if text.strip():
-                    text_parts.append(f"--- Page {page_num} ---\n{text}")
-            except Exception as e:
-                text_parts.append(f"--- Page {page_num} (Error extracting text: {str(e)}) ---")
-        
-        return {
-            "type": "pdf",
-            "name": filename,
-            "content": "\n\n".join(text_parts),
-            "page_count": len(pdf_reader.pages)
-        }
-    except ImportError:
-        return {"type": "pdf", "name": filename, "content": "[PDF parsing not available]", "error": "pypdf not installed"}
-    except Exception as e:
-        return {"type": "pdf", "name": filename, "content": f"[Error parsing PDF: {str(e)}]", "error": str(e)}
+# An uploaded file: its bytes, or the path of a (temporary) file holding them
+FileSource = Union[bytes, str]
+
+
+def _open_source(source: FileSource) -> Union[str, IO[bytes]]:
+    """What the parsing libraries accept: the path itself, or a stream over the bytes."""
+    return source if isinstance(source, str) else io.BytesIO(source)
+
+
+def _extract_pdf_pages(source: FileSource, first: int = 0, last: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Extract the text of PDF pages [first, last) - one parser worker job.
+
+    Returns:
+        Dict with the document's page_count and pages: [{"page": n, "text": ...}], where a
+        page that failed to extract has an "error" instead of text
+    """
+    import pypdf
+    
+    pdf_reader = pypdf.PdfReader(_open_source(source))
+    page_count = len(pdf_reader.pages)
+    last = page_count if last is None else min(last, page_count)
+    
+    pages = []
+    for index in range(first, last):
+        try:
+            pages.append({"page": index + 1, "text": pdf_reader.pages[index].extract_text() or ""})
+        except Exception as e:
+            pages.append({"page": index + 1, "text": "", "error": str(e)})
+    return {"page_count": page_count, "pages": pages}
+
+
+def _pdf_result(filename: str, page_count: int, pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Join extracted pages into the file result.
+
+    Page boundaries are kept as metadata rather than inline "--- Page N ---" markers:
+    pages[i] = {"page": n, "start_char": ..., "end_char": ...} locates page n in content
+    (pages with no text are left out; failed pages carry an "error" and an empty range).
+    """
+    parts: List[str] = []
+    page_ranges: List[Dict[str, Any]] = []
+    offset = 0
+    for page in pages:
+        if page.get("error"):
+            page_ranges.append({"page": page["page"], "start_char": offset, "end_char": offset, "error": page["error"]})
+            continue
+        text = page["text"].strip()
+        if not text:
+            continue
+        if parts:
+            offset += 2  # "\n\n" separator
+        parts.append(text)
+        page_ranges.append({"page": page["page"], "start_char": offset, "end_char": offset + len(text)})
+        offset += len(text)
+    
+    return {
+        "type": "pdf",
+        "name": filename,
+        "content": "\n\n".join(parts),
+        "page_count": page_count,
+        "pages": page_ranges
+    }
 
 
-async def parse_docx(file_content: bytes, filename: str) -> Dict[str, Any]:
+def _extract_docx(source: FileSource, filename: str) -> Dict[str, Any]:
     """Extract text from Word document."""
     try:
         from docx import Document
         
-        doc_file = io.BytesIO(file_content)
-        doc = Document(doc_file)
+        doc = Document(_open_source(source))
         
         text_parts = []
         for paragraph in doc.paragraphs:
@@ -68,13 +118,12 @@ async def parse_docx(file_content: bytes, filename: str) -> Dict[str, Any]:
         return {"type": "docx", "name": filename, "content": f"[Error parsing Word document: {str(e)}]", "error": str(e)}
 
 
-async def parse_xlsx(file_content: bytes, filename: str) -> Dict[str, Any]:
+def _extract_xlsx(source: FileSource, filename: str) -> Dict[str, Any]:
     """Extract text from Excel spreadsheet."""
     try:
         from openpyxl import load_workbook
         
-        excel_file = io.BytesIO(file_content)
-        workbook = load_workbook(excel_file, data_only=True)
+        workbook = load_workbook(_open_source(source), data_only=True)
         
         text_parts = []
         for sheet_name in workbook.sheetnames:
@@ -100,13 +149,12 @@ async def parse_xlsx(file_content: bytes, filename: str) -> Dict[str, Any]:
         return {"type": "xlsx", "name": filename, "content": f"[Error parsing Excel file: {str(e)}]", "error": str(e)}
 
 
-async def parse_pptx(file_content: bytes, filename: str) -> Dict[str, Any]:
+def _extract_pptx(source: FileSource, filename: str) -> Dict[str, Any]:
     """Extract text from PowerPoint presentation."""
     try:
         from pptx import Presentation
         
-        pptx_file = io.BytesIO(file_content)
-        prs = Presentation(pptx_file)
+        prs = Presentation(_open_source(source))
         
         text_parts = []
         for slide_num, slide in enumerate(prs.slides, 1):
@@ -131,15 +179,89 @@ async def parse_pptx(file_content: bytes, filename: str) -> Dict[str, Any]:
         return {"type": "pptx", "name": filename, "content": f"[Error parsing PowerPoint: {str(e)}]", "error": str(e)}
 
 
-async def parse_text_file(file_content: bytes, filename: str) -> Dict[str, Any]:
-    """Parse plain text file."""
+async def _parse_in_worker(extract: Callable, file_type: str, label: str, source: FileSource, filename: str) -> Dict[str, Any]:
+    """Run an extractor on the parsing service; a timeout or dead worker becomes an error result."""
+    try:
+        return await parsing_service.run(extract, source, filename)
+    except (ParsingTimeout, BrokenProcessPool) as e:
+        error = str(e) or "parser worker crashed"
+        return {"type": file_type, "name": filename, "content": f"[Error parsing {label}: {error}]", "error": error}
+
+
+async def parse_pdf(source: FileSource, filename: str) -> Dict[str, Any]:
+    """
+    Extract text from PDF file, page ranges in parallel parser workers.
+
+    The first PDF_PAGES_PER_JOB pages are one job (all of a short PDF); the rest of a
+    long one is split evenly across the workers and extracted concurrently.
+    """
+    try:
+        head = await parsing_service.run(_extract_pdf_pages, source, 0, PDF_PAGES_PER_JOB)
+        page_count = head["page_count"]
+        pages = head["pages"]
+        
+        remaining = page_count - PDF_PAGES_PER_JOB
+        if remaining > 0:
+            size = max(PDF_PAGES_PER_JOB, -(-remaining // parsing_service.get_service().workers))
+            ranges = [(first, first + size) for first in range(PDF_PAGES_PER_JOB, page_count, size)]
+            jobs = [
+                asyncio.ensure_future(parsing_service.run(_extract_pdf_pages, source, first, last))
+                for first, last in ranges
+            ]
+            try:
+                parts = await asyncio.gather(*jobs)
+            except BaseException:
+                # One range failed (queue full, timeout, crash): stop the others instead of
+                # letting them parse pages whose results would be thrown away
+                for job in jobs:
+                    job.cancel()
+                await asyncio.gather(*jobs, return_exceptions=True)
+                raise
+            for part in parts:
+                pages.extend(part["pages"])
+        
+        return _pdf_result(filename, page_count, pages)
+    except ParsingQueueFull:
+        raise
+    except ImportError:
+        return {"type": "pdf", "name": filename, "content": "[PDF parsing not available]", "error": "pypdf not installed"}
+    except BrokenProcessPool:
+        return {"type": "pdf", "name": filename, "content": "[Error parsing PDF: parser worker crashed]", "error": "parser worker crashed"}
+    except Exception as e:
+        return {"type": "pdf", "name": filename, "content": f"[Error parsing PDF: {str(e)}]", "error": str(e)}
+
+
+async def parse_docx(source: FileSource, filename: str) -> Dict[str, Any]:
+    """Extract text from Word document (in a parser worker)."""
+    return await _parse_in_worker(_extract_docx, "docx", "Word document", source, filename)
+
+
+async def parse_xlsx(source: FileSource, filename: str) -> Dict[str, Any]:
+    """Extract text from Excel spreadsheet (in a parser worker)."""
+    return await _parse_in_worker(_extract_xlsx, "xlsx", "Excel file", source, filename)
+
+
+async def parse_pptx(source: FileSource, filename: str) -> Dict[str, Any]:
+    """Extract text from PowerPoint presentation (in a parser worker)."""
+    return await _parse_in_worker(_extract_pptx, "pptx", "PowerPoint", source, filename)
+
+
+def _read_text(source: FileSource, encoding: str) -> str:
+    if isinstance(source, str):
+        with open(source, encoding=encoding) as f:
+            return f.read()
+    return source.decode(encoding)
+
+
+async def parse_text_file(source: FileSource, filename: str) -> Dict[str, Any]:
+    """Parse plain text file (a path is read in a worker thread)."""
     try:
         # Try UTF-8 first
         try:
-            content = file_content.decode('utf-8')
+            content = await asyncio.to_thread(_read_text, source, 'utf-8')
         except UnicodeDecodeError:
             # Fall back to latin-1
-            content = file_content.decode('latin-1')
+            content = await asyncio.to_thread(_read_text, source, 'latin-1')
         
         return {
             "type": "text",
@@ -150,32 +272,35 @@ async def parse_text_file(file_content: bytes, filename: str) -> Dict[str, Any]:
         return {"type": "text", "name": filename, "content": f"[Error reading text file: {str(e)}]", "error": str(e)}
 
 
-async def parse_file(file_content: bytes, filename: str) -> Dict[str, Any]:
+async def parse_file(source: FileSource, filename: str) -> Dict[str, Any]:
     """
     Parse a file based on its extension.
     
     Args:
-        file_content: Binary file content
+        source: Binary file content, or the path of a file holding it
         filename: Original filename
         
     Returns:
         Dict with type, name, content, and optional metadata
+
+    Raises:
+        ParsingQueueFull: Too many files are being parsed right now (retry later)
     """
     filename_lower = filename.lower()
     
     if filename_lower.endswith('.pdf'):
-        return await parse_pdf(file_content, filename)
+        return await parse_pdf(source, filename)
     elif filename_lower.endswith(('.doc', '.docx')):
-        return await parse_docx(file_content, filename)
+        return await parse_docx(source, filename)
     elif filename_lower.endswith(('.xls', '.xlsx')):
-        return await parse_xlsx(file_content, filename)
+        return await parse_xlsx(source, filename)
     elif filename_lower.endswith(('.ppt', '.pptx')):
-        return await parse_pptx(file_content, filename)
+        return await parse_pptx(source, filename)
     elif filename_lower.endswith(('.txt', '.md', '.csv')):
-        return await parse_text_file(file_content, filename)
+        return await parse_text_file(source, filename)
     else:
         # Try to parse as text as fallback
-        return await parse_text_file(file_content, filename)
+        return await parse_text_file(source, filename)
 
 
 async def fetch_url_content(url: str) -> Dict[str, Any]:
@@ -0,0 +1,192 @@
+"""Adaptive hedged requests for slow council members.
+
+Each council model's latency is tracked in a rolling window. When a call runs past
+that model's own p95 (scaled by a self-tuning factor), a backup request is fired -
+to the same model again or to a configured substitute - and whichever returns first
+wins. For streamed calls the race is decided by the first token, and the latency
+tracked is time-to-first-token. council.py reports which path won back to the policy
+so the hedge delay tunes itself: backups that keep winning make hedging start earlier,
+wasted backups make it start later.
+"""
+
+import asyncio
+import sys
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .config import (
+    COUNCIL_HEDGING_ENABLED,
+    COUNCIL_HEDGE_PERCENTILE,
+    COUNCIL_HEDGE_MIN_SAMPLES,
+    COUNCIL_HEDGE_SUBSTITUTES,
+)
+from .openrouter import query_model, query_model_streaming, DeltaCallback
+
+
+class LatencyTracker:
+    """Rolling window of recent latencies per (model, kind)."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Dict[Tuple[str, str], Deque[float]] = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, model: str, kind: str, seconds: float):
+        self._samples[(model, kind)].append(seconds)
+
+    def count(self, model: str, kind: str) -> int:
+        return len(self._samples.get((model, kind), ()))
+
+    def percentile(self, model: str, kind: str, p: float) -> Optional[float]:
+        samples = self._samples.get((model, kind))
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, max(0, int(round(p * (len(ordered) - 1)))))
+        return ordered[index]
+
+
+class HedgePolicy:
+    """Decides when to hedge a model and learns from which path won."""
+
+    MIN_SCALE = 0.5
+    MAX_SCALE = 2.0
+
+    def __init__(
+        self,
+        enabled: bool = COUNCIL_HEDGING_ENABLED,
+        percentile: float = COUNCIL_HEDGE_PERCENTILE,
+        min_samples: int = COUNCIL_HEDGE_MIN_SAMPLES,
+        substitutes: Optional[Dict[str, str]] = None
+    ):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.substitutes = dict(substitutes if substitutes is not None else COUNCIL_HEDGE_SUBSTITUTES)
+        self.latencies = LatencyTracker()
+        self._scale: Dict[str, float] = defaultdict(lambda: 1.0)
+        self.stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "hedged": 0, "backup_wins": 0, "primary_wins": 0})
+
+    def hedge_delay(self, model: str, kind: str) -> Optional[float]:
+        """Seconds to wait before firing a backup, or None if the model has too little history."""
+        if self.latencies.count(model, kind) < self.min_samples:
+            return None
+        p = self.latencies.percentile(model, kind, self.percentile)
+        return p * self._scale[model] if p is not None else None
+
+    def backup_for(self, model: str) -> str:
+        """Backup target: the configured substitute, else the same model again."""
+        return self.substitutes.get(model, model)
+
+    def record_outcome(self, model: str, hedge: Dict[str, Any]):
+        """Tune the hedge delay from which path won (called by the council orchestrator)."""
+        stats = self.stats[model]
+        stats["calls"] += 1
+        if not hedge.get("fired"):
+            return
+        stats["hedged"] += 1
+        if hedge.get("path") == "backup":
+            stats["backup_wins"] += 1
+            self._scale[model] = max(self.MIN_SCALE, self._scale[model] * 0.95)
+        else:
+            stats["primary_wins"] += 1
+            self._scale[model] = min(self.MAX_SCALE, self._scale[model] * 1.05)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Per-model hedge counters, current delay scale and tracked p95s."""
+        models = {}
+        for model, stats in self.stats.items():
+            models[model] = {
+                **stats,
+                "delay_scale": round(self._scale[model], 3),
+                "p95_total": self.latencies.percentile(model, "total", 0.95),
+                "p95_ttft": self.latencies.percentile(model, "ttft", 0.95),
+            }
+        return {"enabled": self.enabled, "percentile": self.percentile, "models": models}
+
+
+hedge_policy = HedgePolicy()
+
+
+async def hedged_query(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float,
+    on_delta: Optional[DeltaCallback] = None,
+    policy: Optional[HedgePolicy] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Query a model, firing a backup request if it runs past its own p95.
+
+    Returns the usual response dict (or None) with a 'hedge' entry:
+    {"fired": bool, "path": "primary" | "backup", "served_by": model id}.
+    Streamed tokens are always reported under the council seat's model id.
+    """
+    policy = policy or hedge_policy
+    streaming = on_delta is not None
+    kind = "ttft" if streaming else "total"
+    loop = asyncio.get_running_loop()
+    first_token = asyncio.Event()
+    winner: Dict[str, Optional[str]] = {"label": None}
+    attempts: Dict[asyncio.Task, Tuple[str, str]] = {}
+
+    def start(label: str, target: str) -> asyncio.Task:
+        started = loop.time()
+
+        if not streaming:
+            async def run():
+                # The backup bypasses single-flight: coalesced, it would join the primary's request
+                response = await query_model(target, messages, timeout=timeout, coalesce=(label == "primary"))
+                if response is not None:
+                    policy.latencies.record(target, kind, loop.time() - started)
+                return response
+        else:
+            def forward(_model: str, text: str):
+                if winner["label"] is None:
+                    # First token decides the race - drop the other attempt
+                    winner["label"] = label
+                    policy.latencies.record(target, kind, loop.time() - started)
+                    first_token.set()
+                    for other, (other_label, _) in attempts.items():
+                        if other_label != label:
+                            other.cancel()
+                if winner["label"] == label:
+                    on_delta(model, text)
+
+            async def run():
+                return await query_model_streaming(target, messages, forward, timeout=timeout)
+
+        task = asyncio.create_task(run())
+        attempts[task] = (label, target)
+        return task
+
+    primary = start("primary", model)
+    fired = False
+    delay = policy.hedge_delay(model, kind) if policy.enabled else None
+    try:
+        if delay is not None:
+            signal = asyncio.ensure_future(first_token.wait())
+            done, _ = await asyncio.wait({primary, signal}, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+            signal.cancel()
+            if not done:
+                backup_model = policy.backup_for(model)
+                print(f"[HEDGE] {model} past p{int(policy.percentile * 100)} ({delay:.1f}s) - firing backup to {backup_model}", file=sys.stderr, flush=True)
+                start("backup", backup_model)
+                fired = True
+
+        pending = set(attempts)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.cancelled() or task.exception() is not None:
+                    continue
+                response = task.result()
+                if response is None:
+                    continue
+                label, target = attempts[task]
+                response = dict(response)  # may be a memoized dict - don't tag the shared copy
+                response["hedge"] = {"fired": fired, "path": label, "served_by": target}
+                return response
+        return None
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()
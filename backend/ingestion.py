@@ -0,0 +1,236 @@
+"""Background ingestion of uploaded files and links.
+
+upload_file_endpoint and add_link_endpoint used to parse/fetch, chunk and store the
+attachment before answering, so a large PDF or slow site held the request open for the
+whole ingestion. Now the endpoint stores a "pending" attachment row and submits a job
+here; it answers with the attachment id at once. A fixed set of worker tasks drains a
+bounded queue: parse (on the parsing service) or fetch, chunk (in a thread), store the
+content and chunks with status "ready", and extend the conversation's cached RAG index.
+Content is content-addressed (database.Blob): an upload whose bytes were parsed before
+reuses that parse result, and content that is already chunked is not chunked again.
+
+Progress is kept in memory per attachment (queued -> parsing/fetching -> chunking ->
+ready/failed) for the status endpoint; the status column in the database is the source
+of truth across processes and restarts. package_context waits only for attachments of
+its conversation that are still pending (wait_for_pending).
+"""
+
+import asyncio
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from .config import INGEST_WORKERS, INGEST_MAX_PENDING, INGEST_JOB_TIMEOUT_SECONDS
+from .database import attachment_content_hash
+from . import rag_system
+
+# Progress of recent jobs kept for the status endpoint
+_PROGRESS_HISTORY = 1000
+
+
+class IngestionQueueFull(Exception):
+    """INGEST_MAX_PENDING attachments are already waiting to be ingested."""
+
+
+_queue: Optional[asyncio.Queue] = None
+_workers: List[asyncio.Task] = []
+_storage: Any = None
+_progress: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+_done_events: Dict[int, asyncio.Event] = {}
+_stats = {
+    "submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "parses_reused": 0, "chunks_reused": 0,
+    "ingest_seconds": 0.0, "max_ingest_seconds": 0.0,
+}
+
+
+def _set_progress(attachment_id: int, stage: str, **extra: Any):
+    entry = _progress.setdefault(attachment_id, {})
+    entry.update(stage=stage, updated_at=time.time(), **extra)
+    _progress.move_to_end(attachment_id)
+    while len(_progress) > _PROGRESS_HISTORY:
+        _progress.popitem(last=False)
+
+
+def get_progress(attachment_id: int) -> Optional[Dict[str, Any]]:
+    """In-process progress of an attachment's job (None if this process didn't run it)."""
+    entry = _progress.get(attachment_id)
+    return dict(entry) if entry else None
+
+
+def _ensure_workers():
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _workers[:] = [task for task in _workers if not task.done()]
+    while len(_workers) < max(1, INGEST_WORKERS):
+        _workers.append(asyncio.create_task(_worker(_queue)))
+
+
+async def submit(
+    storage: Any,
+    conversation_id: str,
+    kind: str,
+    placeholder: Dict[str, Any],
+    load: Callable[[], Awaitable[Dict[str, Any]]],
+    raw_hash: Optional[str] = None,
+    cleanup: Optional[Callable[[], None]] = None
+) -> int:
+    """
+    Store a pending attachment and queue its ingestion.
+
+    Args:
+        storage: Async storage module (create_pending_attachment/complete_attachment)
+        conversation_id: Conversation the attachment belongs to
+        kind: "file" or "link"
+        placeholder: Attachment dict stored while pending (name, type, ...)
+        load: Coroutine function producing the full attachment dict (parse or fetch)
+        raw_hash: sha256 of the uploaded bytes; a ready attachment with the same hash skips load()
+        cleanup: Called once the job is over (e.g. delete the spooled upload); not called if this raises
+
+    Returns:
+        The attachment id
+
+    Raises:
+        IngestionQueueFull: INGEST_MAX_PENDING jobs are already queued or running
+    """
+    global _storage
+    if len(_done_events) >= INGEST_MAX_PENDING:
+        _stats["rejected"] += 1
+        raise IngestionQueueFull(f"{len(_done_events)} attachments are being ingested")
+    _storage = storage
+    attachment_id = await storage.create_pending_attachment(conversation_id, kind, placeholder, raw_hash=raw_hash)
+    _done_events[attachment_id] = asyncio.Event()
+    _set_progress(attachment_id, "queued", conversation_id=conversation_id, name=placeholder.get("name"), queued_at=time.time())
+    _stats["submitted"] += 1
+    _ensure_workers()
+    _queue.put_nowait((attachment_id, conversation_id, kind, placeholder, load, raw_hash, cleanup))
+    return attachment_id
+
+
+async def _ingest(
+    attachment_id: int,
+    conversation_id: str,
+    kind: str,
+    placeholder: Dict[str, Any],
+    load: Callable[[], Awaitable[Dict[str, Any]]],
+    raw_hash: Optional[str]
+):
+    data = await _storage.find_parsed_content(raw_hash) if raw_hash else None
+    if data is not None:
+        _stats["parses_reused"] += 1
+        data["name"] = placeholder.get("name", data.get("name"))
+    else:
+        _set_progress(attachment_id, "parsing" if kind == "file" else "fetching")
+        data = await load()
+    _set_progress(attachment_id, "chunking")
+    content_hash = await asyncio.to_thread(attachment_content_hash, data)
+    if await _storage.has_content_chunks(content_hash):
+        _stats["chunks_reused"] += 1
+        chunks = None  # stored with the blob already
+    else:
+        chunks = await asyncio.to_thread(rag_system.chunk_attachment, kind, data)
+    if not await _storage.complete_attachment(attachment_id, data, status="ready", chunks=chunks):
+        _set_progress(attachment_id, "failed", error="attachment was deleted")
+        return
+    _set_progress(attachment_id, "indexing")
+    # Extend the cached RAG index now so packaging doesn't pay for it
+    indexed = await _storage.get_attachment_chunks(conversation_id)
+    await asyncio.to_thread(rag_system.update_index, indexed, conversation_id)
+    _set_progress(attachment_id, "ready")
+
+
+async def _worker(queue: asyncio.Queue):
+    while True:
+        attachment_id, conversation_id, kind, placeholder, load, raw_hash, cleanup = await queue.get()
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(
+                _ingest(attachment_id, conversation_id, kind, placeholder, load, raw_hash), INGEST_JOB_TIMEOUT_SECONDS
+            )
+            _stats["completed"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            error = "ingestion timed out" if isinstance(e, asyncio.TimeoutError) else (str(e) or type(e).__name__)
+            print(f"[INGEST] Attachment {attachment_id} failed: {error}", file=sys.stderr, flush=True)
+            _stats["failed"] += 1
+            _set_progress(attachment_id, "failed", error=error)
+            try:
+                await _storage.complete_attachment(attachment_id, {**placeholder, "content": "", "error": error}, status="failed")
+            except Exception as store_error:
+                print(f"[INGEST] Could not record failure of attachment {attachment_id}: {store_error}", file=sys.stderr, flush=True)
+        finally:
+            elapsed = time.perf_counter() - started
+            _stats["ingest_seconds"] += elapsed
+            _stats["max_ingest_seconds"] = max(_stats["max_ingest_seconds"], elapsed)
+            if cleanup is not None:
+                cleanup()
+            event = _done_events.pop(attachment_id, None)
+            if event is not None:
+                event.set()
+            queue.task_done()
+
+
+async def wait_for_pending(storage: Any, conversation_id: str, timeout: float) -> List[int]:
+    """
+    Wait until the conversation has no pending attachments, or timeout seconds pass.
+
+    Jobs of this process are awaited directly; others (another worker process) are polled.
+
+    Returns:
+        Ids of the attachments still pending ([] when everything is ingested)
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        pending = await storage.list_pending_attachments(conversation_id)
+        remaining = deadline - time.monotonic()
+        if not pending or remaining <= 0:
+            return pending
+        local = [_done_events[a] for a in pending if a in _done_events]
+        if local:
+            waiters = [asyncio.create_task(event.wait()) for event in local]
+            await asyncio.wait(waiters, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+        else:
+            await asyncio.sleep(min(0.5, remaining))
+
+
+async def recover(storage: Any) -> int:
+    """
+    Mark attachments left pending by a previous process as failed (startup).
+
+    Only rows older than twice the job timeout are touched, so jobs of other live
+    worker processes are left alone.
+    """
+    count = await storage.fail_pending_attachments(
+        "interrupted by a server restart - please re-add it", older_than_seconds=2 * INGEST_JOB_TIMEOUT_SECONDS
+    )
+    if count:
+        print(f"[INGEST] Marked {count} interrupted attachments as failed", file=sys.stderr, flush=True)
+    return count
+
+
+def get_stats() -> Dict[str, Any]:
+    stats = dict(_stats)
+    stats["pending"] = len(_done_events)
+    stats["queued"] = _queue.qsize() if _queue is not None else 0
+    stats["workers"] = len([task for task in _workers if not task.done()])
+    finished = stats["completed"] + stats["failed"]
+    stats["avg_ingest_seconds"] = round(stats["ingest_seconds"] / finished, 3) if finished else 0.0
+    stats["ingest_seconds"] = round(stats["ingest_seconds"], 3)
+    stats["max_ingest_seconds"] = round(stats["max_ingest_seconds"], 3)
+    return stats
+
+
+async def close():
+    """Stop the workers (app shutdown); queued jobs stay pending and are failed on restart."""
+    for task in _workers:
+        task.cancel()
+    await asyncio.gather(*_workers, return_exceptions=True)
+    _workers.clear()
+    while _queue is not None and not _queue.empty():
+        cleanup = _queue.get_nowait()[-1]
+        if cleanup is not None:
+            cleanup()
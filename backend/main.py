@@ -1,8 +1,8 @@
 """FastAPI backend for LLM Council."""
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi.responses import StreamingResponse, FileResponse, PlainTextResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 from typing import List, Dict, Any
@@ -11,24 +11,46 @@ import uuid
 import json
 import asyncio
 import os
+import time
 import subprocess
 import shutil
 import sys
 
-# Use database storage instead of JSON files
+# Use database storage instead of JSON files (async API - storage calls are awaited)
 try:
-    from . import storage_db as storage
+    from . import storage_async as storage
     from .database import init_db
 except ImportError:
-    # Fallback to JSON storage if database not available
-    from . import storage
+    # Fallback to JSON storage if database not available (file I/O runs in worker threads)
+    import types
+    from . import storage as _json_storage
+
+    def _threaded(fn):
+        async def wrapper(*args, **kwargs):
+            return await asyncio.to_thread(fn, *args, **kwargs)
+        return wrapper
+
+    storage = types.SimpleNamespace(**{
+        name: _threaded(fn) for name, fn in vars(_json_storage).items()
+        if callable(fn) and getattr(fn, "__module__", None) == _json_storage.__name__
+    })
     init_db = None
 
-from .council import run_full_council, generate_conversation_title, stage1_collect_responses, stage2_collect_rankings, stage3_synthesize_final, calculate_aggregate_rankings
+from .council import run_full_council, generate_conversation_title, stage1_collect_responses, stage2_collect_rankings, stage3_synthesize_final, calculate_aggregate_rankings, stage1_and_stage2_pipelined
+from .config import COUNCIL_MODELS, COUNCIL_PIPELINE_ENABLED, INGEST_PACKAGE_WAIT_SECONDS, INGEST_JOB_TIMEOUT_SECONDS, UPLOAD_MAX_BYTES
+from . import council_cache
+from .hedging import hedge_policy
+from . import metrics, tracing
+from .singleflight import all_stats as singleflight_stats
+from . import sqlite_writer
+from . import parsing_service
+from . import ingestion
+from . import uploads
 from .prompt_engineering import get_prompt_engineering_response, suggest_finalized_prompt, get_refinement_opening as get_prompt_refinement_opening
 from .context_engineering import get_context_engineering_response, package_context, get_refinement_opening as get_context_refinement_opening
 from .preparation import get_preparation_response
 from .document_parser import parse_file, fetch_url_content
+from .openrouter import init_client as init_openrouter_client, close_client as close_openrouter_client
 from .logger import log_api
 
 app = FastAPI(title="LLM Council API")
@@ -75,6 +97,20 @@ if static_dir is None:
 if static_dir and static_dir.exists() and (static_dir / "assets").exists():
     app.mount("/assets", StaticFiles(directory=str(static_dir / "assets")), name="assets")
 
+
+# Registered before CORS so its responses still get CORS headers
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """413 before the multipart body is received when the declared size is over the upload limit."""
+    if request.method == "POST" and request.url.path.endswith("/context-engineering/file"):
+        declared = request.headers.get("content-length", "")
+        # Allow for the multipart framing around the file
+        if declared.isdigit() and int(declared) > UPLOAD_MAX_BYTES + 64 * 1024:
+            limit_mb = UPLOAD_MAX_BYTES // (1024 * 1024)
+            return JSONResponse(status_code=413, content={"detail": f"File is larger than the {limit_mb} MB upload limit"})
+    return await call_next(request)
+
+
 # Enable CORS - allow all origins (for API access, not needed when serving from same origin)
 cors_origins = os.getenv("CORS_ORIGINS", "*").split(",")
 app.add_middleware(
@@ -216,6 +252,28 @@ async def startup_event():
             print(f"⚠️  Database initialization error: {e}", file=sys.stderr, flush=True)
             # Continue anyway - database will be initialized on first use
 
+    # Shared pooled OpenRouter client (HTTP/2 keep-alive) for all LLM calls
+    init_openrouter_client()
+
+    # Attachments whose ingestion died with the previous process will never complete
+    if hasattr(storage, "fail_pending_attachments"):
+        try:
+            await ingestion.recover(storage)
+        except Exception as e:
+            print(f"⚠️  Ingestion recovery error: {e}", file=sys.stderr, flush=True)
+    await asyncio.to_thread(uploads.remove_stale, 2 * INGEST_JOB_TIMEOUT_SECONDS)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections on shutdown."""
+    await ingestion.close()
+    await close_openrouter_client()
+    if hasattr(storage, "close"):
+        await storage.close()
+    await asyncio.to_thread(sqlite_writer.close)
+    parsing_service.close()
+
 
 class CreateConversationRequest(BaseModel):
     """Request to create a new conversation."""
@@ -260,9 +318,11 @@ class ConversationMetadata(BaseModel):
     created_at: str
     title: str
     message_count: int
+    updated_at: str | None = None
     chain_id: str | None = None
     parent_id: str | None = None
     round_number: int = 1
+    cursor: str | None = None
 
 
 class Conversation(BaseModel):
@@ -286,10 +346,53 @@ async def api_root():
     return {"status": "ok", "service": "LLM Council API"}
 
 
+@app.get("/api/council-cache/stats")
+async def council_cache_stats():
+    """Council result cache hit/miss counters and estimated time/upstream calls saved."""
+    return council_cache.get_stats()
+
+
+@app.get("/api/hedging/stats")
+async def hedging_stats():
+    """Per-model hedged-request counters, tracked p95 latencies and the self-tuned delay scale."""
+    return hedge_policy.get_stats()
+
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Per-model/stage LLM call metrics in Prometheus text format."""
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/metrics/summary")
+async def metrics_summary():
+    """JSON view of LLM call latency percentiles per council member and stage, plus recent calls."""
+    return {
+        **metrics.summary(),
+        "singleflight": singleflight_stats(),
+        "council_cache": council_cache.get_stats(),
+        "hedging": hedge_policy.get_stats(),
+        "sqlite_writer": sqlite_writer.get_stats(),
+        "parser": parsing_service.get_stats(),
+        "ingestion": ingestion.get_stats(),
+    }
+
+
 @app.get("/api/conversations", response_model=List[ConversationMetadata])
-async def list_conversations():
-    """List all conversations (metadata only)."""
-    return storage.list_conversations()
+async def list_conversations(
+    limit: int | None = Query(None, ge=1, le=500),
+    before: str | None = None,
+):
+    """
+    List conversations (metadata only), newest first.
+
+    Keyset pagination: ?limit=N returns one page; pass the last item's cursor
+    (created_at|id) as ?before= to get the next one. Without limit, all conversations are returned.
+    """
+    try:
+        return await storage.list_conversations(limit=limit, before=before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid 'before' cursor (expected created_at|id from a listed conversation)")
 
 
 def _extract_prior_synthesis(parent: Dict[str, Any]) -> str | None:
@@ -335,7 +438,7 @@ async def create_conversation(request: CreateConversationRequest):
 
         round_number = 1  # Default for new conversation
         if request.parent_id:
-            parent = storage.get_conversation(request.parent_id)
+            parent = await storage.get_conversation(request.parent_id)
             if parent is None:
                 raise HTTPException(status_code=404, detail="Parent conversation not found")
             chain_id = parent.get("chain_id") or parent["id"]
@@ -348,7 +451,7 @@ async def create_conversation(request: CreateConversationRequest):
             root_title = parent.get("title", "New Conversation")
             title = f"{root_title} (Round {round_number})"
 
-            conversation = storage.create_conversation(
+            conversation = await storage.create_conversation(
                 conversation_id,
                 chain_id=chain_id,
                 parent_id=request.parent_id,
@@ -362,15 +465,15 @@ async def create_conversation(request: CreateConversationRequest):
                 },
                 context_engineering={
                     "messages": [],
-                    "documents": list(context_eng.get("documents") or []),
-                    "files": list(context_eng.get("files") or []),
-                    "links": list(context_eng.get("links") or []),
                     "finalized_context": context_eng.get("finalized_context"),
                 },
                 council_deliberation={"messages": []},
+                # Copied as references to the parent's blobs; attachments still being
+                # ingested for the parent have no job here and are left out
+                attachments_from=request.parent_id,
             )
         else:
-            conversation = storage.create_conversation(conversation_id)
+            conversation = await storage.create_conversation(conversation_id)
 
         if conversation is None:
             raise HTTPException(
@@ -394,7 +497,7 @@ async def create_conversation(request: CreateConversationRequest):
 @app.get("/api/conversations/{conversation_id}", response_model=Conversation)
 async def get_conversation(conversation_id: str):
     """Get a specific conversation with all its messages."""
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return conversation
@@ -403,7 +506,7 @@ async def get_conversation(conversation_id: str):
 @app.delete("/api/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str):
     """Delete a conversation by ID."""
-    success = storage.delete_conversation(conversation_id)
+    success = await storage.delete_conversation(conversation_id)
     if not success:
         raise HTTPException(status_code=404, detail="Conversation not found")
     return {"status": "deleted", "id": conversation_id}
@@ -417,7 +520,7 @@ async def send_prompt_engineering_message(conversation_id: str, request: SendMes
     Send a message in the prompt engineering stage.
     """
     try:
-        conversation = storage.get_conversation(conversation_id)
+        conversation = await storage.get_conversation(conversation_id)
         if conversation is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
@@ -434,7 +537,7 @@ async def send_prompt_engineering_message(conversation_id: str, request: SendMes
         messages = prompt_eng.get("messages", [])
         
         # Add user message
-        storage.add_prompt_engineering_message(conversation_id, "user", request.content)
+        await storage.add_prompt_engineering_message(conversation_id, "user", request.content)
         
         # Get assistant response (pass the messages list without the user message, as it will be added in the function)
         response = await get_prompt_engineering_response(messages, request.content)
@@ -454,10 +557,10 @@ async def send_prompt_engineering_message(conversation_id: str, request: SendMes
                 )
         
         # Add assistant message
-        storage.add_prompt_engineering_message(conversation_id, "assistant", response)
+        await storage.add_prompt_engineering_message(conversation_id, "assistant", response)
         
         # Return updated conversation
-        updated_conversation = storage.get_conversation(conversation_id)
+        updated_conversation = await storage.get_conversation(conversation_id)
         return {"response": response, "conversation": updated_conversation}
     except HTTPException:
         raise
@@ -474,7 +577,7 @@ async def suggest_final_prompt(conversation_id: str):
     """
     Suggest a finalized prompt based on the conversation history.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -495,14 +598,14 @@ async def finalize_prompt_endpoint(conversation_id: str, request: FinalizePrompt
     """
     Finalize the prompt in the prompt engineering stage.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    storage.finalize_prompt(conversation_id, request.finalized_prompt)
+    await storage.finalize_prompt(conversation_id, request.finalized_prompt)
     log_api("finalize_prompt", conv_id=conversation_id, prompt_len=len(request.finalized_prompt))
     
-    updated_conversation = storage.get_conversation(conversation_id)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"conversation": updated_conversation}
 
 
@@ -513,7 +616,7 @@ async def send_preparation_message(conversation_id: str, request: SendMessageReq
     Writes to both prompt_engineering and context_engineering for compatibility.
     """
     try:
-        conversation = storage.get_conversation(conversation_id)
+        conversation = await storage.get_conversation(conversation_id)
         if conversation is None:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
@@ -528,8 +631,8 @@ async def send_preparation_message(conversation_id: str, request: SendMessageReq
         files = context_eng.get("files", [])
         links = context_eng.get("links", [])
         
-        storage.add_prompt_engineering_message(conversation_id, "user", request.content)
-        storage.add_context_engineering_message(conversation_id, "user", request.content)
+        await storage.add_prompt_engineering_message(conversation_id, "user", request.content)
+        await storage.add_context_engineering_message(conversation_id, "user", request.content)
 
         prior_synth = conversation.get("prior_synthesis")
         prior_prep = conversation.get("prior_preparation_summary")
@@ -547,10 +650,10 @@ async def send_preparation_message(conversation_id: str, request: SendMessageReq
             raise HTTPException(status_code=500, detail="Failed to get preparation response.")
         
         log_api("preparation_message", conv_id=conversation_id, response_len=len(response), attachments=len(documents) + len(files) + len(links))
-        storage.add_prompt_engineering_message(conversation_id, "assistant", response)
-        storage.add_context_engineering_message(conversation_id, "assistant", response)
+        await storage.add_prompt_engineering_message(conversation_id, "assistant", response)
+        await storage.add_context_engineering_message(conversation_id, "assistant", response)
         
-        updated = storage.get_conversation(conversation_id)
+        updated = await storage.get_conversation(conversation_id)
         return {"response": response, "conversation": updated}
     except HTTPException:
         raise
@@ -565,12 +668,12 @@ async def prompt_refinement_opening(conversation_id: str, request: RefinementOpe
     Generate and store an assistant refinement-opening message for Step 1.
     Asks the user what additional topics they want to discuss or refine.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     opening = get_prompt_refinement_opening(request.prior_synthesis)
-    storage.add_prompt_engineering_message(conversation_id, "assistant", opening)
-    updated_conversation = storage.get_conversation(conversation_id)
+    await storage.add_prompt_engineering_message(conversation_id, "assistant", opening)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"conversation": updated_conversation}
 
 
@@ -582,12 +685,12 @@ async def context_refinement_opening(conversation_id: str, request: RefinementOp
     Generate and store an assistant refinement-opening message for Step 2.
     Acknowledges prior context and asks for additional information.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     opening = get_context_refinement_opening(request.prior_context_summary)
-    storage.add_context_engineering_message(conversation_id, "assistant", opening)
-    updated_conversation = storage.get_conversation(conversation_id)
+    await storage.add_context_engineering_message(conversation_id, "assistant", opening)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"conversation": updated_conversation}
 
 
@@ -596,7 +699,7 @@ async def send_context_engineering_message(conversation_id: str, request: SendMe
     """
     Send a message in the context engineering stage.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -608,7 +711,7 @@ async def send_context_engineering_message(conversation_id: str, request: SendMe
     links = context_eng.get("links", [])
     
     # Add user message
-    storage.add_context_engineering_message(conversation_id, "user", request.content)
+    await storage.add_context_engineering_message(conversation_id, "user", request.content)
     
     # Get assistant response (pass the messages list without the user message, as it will be added in the function)
     response = await get_context_engineering_response(messages, request.content, documents, files, links)
@@ -617,10 +720,10 @@ async def send_context_engineering_message(conversation_id: str, request: SendMe
         raise HTTPException(status_code=500, detail="Failed to get context engineering response")
     
     # Add assistant message
-    storage.add_context_engineering_message(conversation_id, "assistant", response)
+    await storage.add_context_engineering_message(conversation_id, "assistant", response)
     
     # Return updated conversation
-    updated_conversation = storage.get_conversation(conversation_id)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"response": response, "conversation": updated_conversation}
 
 
@@ -629,13 +732,13 @@ async def add_document_endpoint(conversation_id: str, request: AddDocumentReques
     """
     Add a document to the context engineering stage.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    storage.add_document(conversation_id, request.name, request.content)
+    await storage.add_document(conversation_id, request.name, request.content)
     
-    updated_conversation = storage.get_conversation(conversation_id)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"conversation": updated_conversation}
 
 
@@ -645,42 +748,113 @@ async def upload_file_endpoint(
     file: UploadFile = File(...)
 ):
     """
-    Upload and parse a file (PDF, Word, Excel, PowerPoint, etc.) to the context engineering stage.
+    Upload a file (PDF, Word, Excel, PowerPoint, etc.) to the context engineering stage.
+
+    The file is parsed, chunked and indexed in the background: the response carries the
+    attachment_id in "pending" state; poll GET .../attachments/{attachment_id} for progress.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    # Read file content
-    file_content = await file.read()
-    
-    # Parse the file
-    file_data = await parse_file(file_content, file.filename)
-    
-    # Add to conversation
-    storage.add_file(conversation_id, file_data)
+    # Stream the upload to a temp file (hashed on the way); parsers read it by path
+    filename = file.filename
+    try:
+        upload = await uploads.spool(file)
+    except uploads.UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+    if not hasattr(storage, "create_pending_attachment"):
+        # JSON storage fallback: no attachment status - parse inline
+        try:
+            file_data = await parse_file(upload.path, filename)
+        except parsing_service.ParsingQueueFull:
+            raise HTTPException(status_code=503, detail="Too many files are being processed, please retry shortly", headers={"Retry-After": "5"})
+        finally:
+            uploads.discard(upload.path)
+        await storage.add_file(conversation_id, file_data)
+        updated_conversation = await storage.get_conversation(conversation_id)
+        return {"file_data": file_data, "conversation": updated_conversation}
+
+    file_data = {"type": Path(filename).suffix.lstrip(".").lower() or "text", "name": filename, "content": ""}
+    try:
+        attachment_id = await ingestion.submit(
+            storage, conversation_id, "file", file_data,
+            lambda: parse_file(upload.path, filename),
+            raw_hash=upload.sha256,
+            cleanup=lambda: uploads.discard(upload.path),
+        )
+    except BaseException as e:
+        uploads.discard(upload.path)
+        if isinstance(e, ingestion.IngestionQueueFull):
+            raise HTTPException(status_code=503, detail="Too many files are being processed, please retry shortly", headers={"Retry-After": "5"})
+        raise
     
-    updated_conversation = storage.get_conversation(conversation_id)
-    return {"file_data": file_data, "conversation": updated_conversation}
+    updated_conversation = await storage.get_conversation(conversation_id)
+    return {
+        "attachment_id": attachment_id,
+        "status": "pending",
+        "file_data": {**file_data, "attachment_id": attachment_id, "status": "pending"},
+        "conversation": updated_conversation,
+    }
 
 
 @app.post("/api/conversations/{conversation_id}/context-engineering/link")
 async def add_link_endpoint(conversation_id: str, request: AddLinkRequest):
     """
-    Fetch and add content from a URL to the context engineering stage.
+    Add content from a URL to the context engineering stage.
+
+    The URL is fetched, chunked and indexed in the background (see upload_file_endpoint).
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
+
+    url = request.url
+    if not hasattr(storage, "create_pending_attachment"):
+        # JSON storage fallback: no attachment status - fetch inline
+        link_data = await fetch_url_content(url)
+        await storage.add_link(conversation_id, link_data)
+        updated_conversation = await storage.get_conversation(conversation_id)
+        return {"link_data": link_data, "conversation": updated_conversation}
+
+    link_data = {"type": "url", "name": url, "content": "", "original_url": url}
+    try:
+        attachment_id = await ingestion.submit(
+            storage, conversation_id, "link", link_data,
+            lambda: fetch_url_content(url),
+        )
+    except ingestion.IngestionQueueFull:
+        raise HTTPException(status_code=503, detail="Too many links are being processed, please retry shortly", headers={"Retry-After": "5"})
     
-    # Fetch URL content
-    link_data = await fetch_url_content(request.url)
-    
-    # Add to conversation
-    storage.add_link(conversation_id, link_data)
-    
-    updated_conversation = storage.get_conversation(conversation_id)
-    return {"link_data": link_data, "conversation": updated_conversation}
+    updated_conversation = await storage.get_conversation(conversation_id)
+    return {
+        "attachment_id": attachment_id,
+        "status": "pending",
+        "link_data": {**link_data, "attachment_id": attachment_id, "status": "pending"},
+        "conversation": updated_conversation,
+    }
+
+
+@app.get("/api/conversations/{conversation_id}/attachments/{attachment_id}")
+async def get_attachment_status_endpoint(conversation_id: str, attachment_id: int):
+    """
+    Ingestion status of an uploaded file or link: "pending", "ready" or "failed",
+    plus the current stage (queued, parsing, fetching, chunking, indexing) while pending.
+    """
+    if not hasattr(storage, "get_attachment_status"):
+        raise HTTPException(status_code=404, detail="Attachment status is not available")
+    status = await storage.get_attachment_status(attachment_id)
+    if status is None or status["conversation_id"] != conversation_id:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    progress = ingestion.get_progress(attachment_id)
+    if progress and status["status"] == "pending":
+        status["stage"] = progress["stage"]
+        if progress.get("queued_at"):
+            status["elapsed_seconds"] = round(time.time() - progress["queued_at"], 1)
+    else:
+        status["stage"] = status["status"]
+    return status
 
 
 @app.post("/api/conversations/{conversation_id}/context-engineering/package")
@@ -688,7 +862,7 @@ async def package_context_endpoint(conversation_id: str):
     """
     Package the context for council deliberation.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
@@ -698,6 +872,12 @@ async def package_context_endpoint(conversation_id: str):
     
     if not finalized_prompt:
         raise HTTPException(status_code=400, detail="Prompt must be finalized before packaging context")
+
+    # Wait for attachments still being ingested (only those - ready ones are already indexed)
+    pending_attachments: List[int] = []
+    if hasattr(storage, "list_pending_attachments"):
+        pending_attachments = await ingestion.wait_for_pending(storage, conversation_id, INGEST_PACKAGE_WAIT_SECONDS)
+        conversation = await storage.get_conversation(conversation_id)
     
     # Get context engineering data; use prompt_engineering messages for manual context
     # when context_engineering messages are empty (unified preparation flow)
@@ -706,20 +886,31 @@ async def package_context_endpoint(conversation_id: str):
     prompt_messages = prompt_eng.get("messages", [])
     messages = ctx_messages if ctx_messages else prompt_messages
     documents = context_eng.get("documents", [])
-    files = context_eng.get("files", [])
-    links = context_eng.get("links", [])
+    # Attachments that are still pending after the wait are left out
+    files = [f for f in context_eng.get("files", []) if f.get("status") != "pending"]
+    links = [l for l in context_eng.get("links", []) if l.get("status") != "pending"]
     
-    # Package context
-    packaged_context = await package_context(messages, documents, files, links, finalized_prompt)
+    # Package context (RAG reads the chunk index persisted when attachments were added)
+    chunks = await storage.get_attachment_chunks(conversation_id)
+    context_usage: Dict[str, Any] = {}
+    packaged_context = await package_context(
+        messages, documents, files, links, finalized_prompt,
+        chunks=chunks, index_key=conversation_id, usage=context_usage,
+    )
     
     if packaged_context is None:
         raise HTTPException(status_code=500, detail="Failed to package context")
     
     # Finalize context
-    storage.finalize_context(conversation_id, packaged_context)
+    await storage.finalize_context(conversation_id, packaged_context)
     
-    updated_conversation = storage.get_conversation(conversation_id)
-    return {"packaged_context": packaged_context, "conversation": updated_conversation}
+    updated_conversation = await storage.get_conversation(conversation_id)
+    return {
+        "packaged_context": packaged_context,
+        "context_usage": context_usage,
+        "pending_attachments": pending_attachments,
+        "conversation": updated_conversation,
+    }
 
 
 @app.post("/api/conversations/{conversation_id}/context-engineering/finalize")
@@ -727,19 +918,180 @@ async def finalize_context_endpoint(conversation_id: str, request: FinalizeConte
     """
     Manually finalize the context in the context engineering stage.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    storage.finalize_context(conversation_id, request.finalized_context)
+    await storage.finalize_context(conversation_id, request.finalized_context)
     
-    updated_conversation = storage.get_conversation(conversation_id)
+    updated_conversation = await storage.get_conversation(conversation_id)
     return {"conversation": updated_conversation}
 
 
 # ========== COUNCIL DELIBERATION ENDPOINTS ==========
 
 
+def _queue_delta(queue: asyncio.Queue, event_type: str):
+    """Build an on_delta callback that queues token deltas as `event_type` SSE events."""
+    def on_delta(model: str, text: str):
+        queue.put_nowait((event_type, model, text))
+    return on_delta
+
+
+async def _forward_deltas(task: asyncio.Task, queue: asyncio.Queue):
+    """
+    Yield SSE delta events (e.g. stage1_delta {model, text}) as tokens arrive, until the
+    stage task finishes. Cancels the stage if the client disconnects mid-stream.
+    """
+    try:
+        while True:
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({task, getter}, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                break
+            event_type, model, text = getter.result()
+            yield f"data: {json.dumps({'type': event_type, 'data': {'model': model, 'text': text}})}\n\n"
+        while not queue.empty():
+            event_type, model, text = queue.get_nowait()
+            yield f"data: {json.dumps({'type': event_type, 'data': {'model': model, 'text': text}})}\n\n"
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _run_stage1(query: str, deltas: asyncio.Queue):
+    """
+    Run Stage 1 for a streaming endpoint, forwarding token deltas.
+
+    Yields SSE events; the final item is a tuple (stage1_results, pipelined_stage2) where
+    pipelined_stage2 is (stage2_results, label_to_model) when COUNCIL_PIPELINE_ENABLED
+    already ran the peer ranking alongside Stage 1, else None.
+    """
+    if COUNCIL_PIPELINE_ENABLED:
+        task = asyncio.create_task(stage1_and_stage2_pipelined(
+            query,
+            on_stage1_delta=_queue_delta(deltas, 'stage1_delta'),
+            on_stage2_delta=_queue_delta(deltas, 'stage2_delta'),
+        ))
+        async for event in _forward_deltas(task, deltas):
+            yield event
+        stage1_results, stage2_results, label_to_model = task.result()
+        yield stage1_results, (stage2_results, label_to_model)
+    else:
+        task = asyncio.create_task(stage1_collect_responses(query, on_delta=_queue_delta(deltas, 'stage1_delta')))
+        async for event in _forward_deltas(task, deltas):
+            yield event
+        yield task.result(), None
+
+
+def _sse(event: Dict[str, Any]) -> str:
+    """Format one Server-Sent Event."""
+    return f"data: {json.dumps(event)}\n\n"
+
+
+async def _council_stage_events(query: str, cache_key: str | None = None):
+    """
+    Run (or replay from the council cache) Stages 1-3 for a streaming endpoint.
+
+    Yields SSE event strings; the final item is the tuple
+    (stage1_results, stage2_results, stage3_result, metadata).
+    """
+    cached = await council_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        print(f"[COUNCIL] Cache hit - replaying stored deliberation", file=sys.stderr, flush=True)
+        yield _sse({'type': 'stage1_start', 'cached': True})
+        yield _sse({'type': 'stage1_complete', 'data': cached['stage1'], 'cached': True})
+        yield _sse({'type': 'stage2_start', 'cached': True})
+        yield _sse({'type': 'stage2_complete', 'data': cached['stage2'], 'metadata': cached['metadata'], 'cached': True})
+        yield _sse({'type': 'stage3_start', 'cached': True})
+        yield _sse({'type': 'stage3_complete', 'data': cached['stage3'], 'cached': True})
+        yield cached['stage1'], cached['stage2'], cached['stage3'], cached['metadata']
+        return
+
+    started = time.monotonic()
+
+    # Stage 1: Collect responses
+    yield _sse({'type': 'stage1_start'})
+    print(f"[COUNCIL] Starting Stage 1: Collecting responses from {len(COUNCIL_MODELS)} models", file=sys.stderr, flush=True)
+    deltas = asyncio.Queue()
+    async for item in _run_stage1(query, deltas):
+        if isinstance(item, str):
+            yield item
+        else:
+            stage1_results, pipelined_stage2 = item
+    print(f"[COUNCIL] Stage 1 complete: Received {len(stage1_results)} successful responses", file=sys.stderr, flush=True)
+    yield _sse({'type': 'stage1_complete', 'data': stage1_results})
+
+    # Check if Stage 1 failed (no responses)
+    if not stage1_results:
+        print(f"[COUNCIL] ERROR: No Stage 1 responses - all models failed", file=sys.stderr, flush=True)
+        # Return error message instead of continuing
+        stage3_result = {
+            "model": "error",
+            "response": "All models failed to respond. Please check your API key and try again.",
+            "error": True
+        }
+
+        # Skip Stage 2 and go directly to Stage 3 with error
+        yield _sse({'type': 'stage3_start'})
+        yield _sse({'type': 'stage3_complete', 'data': stage3_result})
+        yield [], [], stage3_result, {}
+        return
+
+    # Stage 2: Collect rankings
+    yield _sse({'type': 'stage2_start'})
+    print(f"[COUNCIL] Starting Stage 2: Collecting peer rankings", file=sys.stderr, flush=True)
+    if pipelined_stage2 is not None:
+        stage2_results, label_to_model = pipelined_stage2
+    else:
+        stage2_task = asyncio.create_task(stage2_collect_rankings(query, stage1_results, on_delta=_queue_delta(deltas, 'stage2_delta')))
+        async for event in _forward_deltas(stage2_task, deltas):
+            yield event
+        stage2_results, label_to_model = stage2_task.result()
+    print(f"[COUNCIL] Stage 2 complete: Received {len(stage2_results)} rankings", file=sys.stderr, flush=True)
+    aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
+    print(f"[COUNCIL] Aggregate rankings calculated: {len(aggregate_rankings)} models ranked", file=sys.stderr, flush=True)
+    metadata = {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}
+    yield _sse({'type': 'stage2_complete', 'data': stage2_results, 'metadata': metadata})
+
+    # Stage 3: Synthesize final answer
+    yield _sse({'type': 'stage3_start'})
+    print(f"[COUNCIL] Starting Stage 3 synthesis with chairman model", file=sys.stderr, flush=True)
+    try:
+        stage3_task = asyncio.create_task(stage3_synthesize_final(query, stage1_results, stage2_results, on_delta=_queue_delta(deltas, 'stage3_delta')))
+        async for event in _forward_deltas(stage3_task, deltas):
+            yield event
+        stage3_result = stage3_task.result()
+        if stage3_result is None:
+            print(f"[COUNCIL] ERROR: Stage 3 returned None", file=sys.stderr, flush=True)
+            stage3_result = {
+                "model": "error",
+                "response": "Error: Stage 3 synthesis failed - chairman model returned no response.",
+                "error": True
+            }
+        elif not stage3_result.get('response'):
+            print(f"[COUNCIL] ERROR: Stage 3 returned empty response", file=sys.stderr, flush=True)
+            stage3_result['response'] = "Error: Stage 3 synthesis failed - chairman model returned empty response."
+            stage3_result['error'] = True
+        else:
+            print(f"[COUNCIL] Stage 3 completed successfully. Response length: {len(stage3_result.get('response', ''))}", file=sys.stderr, flush=True)
+    except Exception as stage3_error:
+        print(f"[COUNCIL] ERROR in Stage 3: {type(stage3_error).__name__}: {str(stage3_error)}", file=sys.stderr, flush=True)
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+        stage3_result = {
+            "model": "error",
+            "response": f"Error in Stage 3 synthesis: {str(stage3_error)}",
+            "error": True
+        }
+    yield _sse({'type': 'stage3_complete', 'data': stage3_result})
+
+    if cache_key:
+        await council_cache.put(cache_key, stage1_results, stage2_results, stage3_result, metadata, elapsed_seconds=time.monotonic() - started)
+    yield stage1_results, stage2_results, stage3_result, metadata
+
+
 def _build_full_query_with_prior_deliberation(
     finalized_context: str,
     council_delib: dict,
@@ -782,12 +1134,13 @@ CRITICAL INSTRUCTIONS FOR THIS ROUND:
 
 
 @app.post("/api/conversations/{conversation_id}/council-deliberation/message")
-async def send_council_deliberation_message(conversation_id: str):
+async def send_council_deliberation_message(conversation_id: str, refresh: bool = False):
     """
     Start the council deliberation using finalized prompt and context.
     Returns the complete response with all stages.
+    A repeated query is served from the council cache unless refresh=true.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -810,20 +1163,30 @@ async def send_council_deliberation_message(conversation_id: str):
         finalized_context, council_delib, prior_synthesis=prior_synth
     )
     is_first_message = len(council_delib.get("messages", [])) == 0
-    storage.add_council_deliberation_message(conversation_id, "user", content=full_query)
+    await storage.add_council_deliberation_message(conversation_id, "user", content=full_query)
 
     # If this is the first message, generate a title from the prompt
     if is_first_message:
         title = await generate_conversation_title(finalized_prompt)
-        storage.update_conversation_title(conversation_id, title)
-
-    # Run the 3-stage council process
-    stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
-        full_query
-    )
+        await storage.update_conversation_title(conversation_id, title)
+
+    # Run the 3-stage council process (or reuse a cached result for a repeated query)
+    cache_key = None if refresh else council_cache.cache_key(full_query)
+    cached = await council_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        stage1_results, stage2_results, stage3_result, metadata = (
+            cached["stage1"], cached["stage2"], cached["stage3"], cached["metadata"]
+        )
+    else:
+        started = time.monotonic()
+        stage1_results, stage2_results, stage3_result, metadata = await run_full_council(
+            full_query
+        )
+        if cache_key:
+            await council_cache.put(cache_key, stage1_results, stage2_results, stage3_result, metadata, elapsed_seconds=time.monotonic() - started)
 
     # Add assistant message with all stages
-    storage.add_council_deliberation_message(
+    await storage.add_council_deliberation_message(
         conversation_id,
         "assistant",
         stage1=stage1_results,
@@ -841,12 +1204,15 @@ async def send_council_deliberation_message(conversation_id: str):
 
 
 @app.post("/api/conversations/{conversation_id}/council-deliberation/message/stream")
-async def send_council_deliberation_stream(conversation_id: str):
+async def send_council_deliberation_stream(conversation_id: str, refresh: bool = False):
     """
     Start the council deliberation using finalized prompt and context, with streaming.
-    Returns Server-Sent Events as each stage completes.
+    Returns Server-Sent Events as each stage completes, plus per-model token events
+    (stage1_delta / stage2_delta / stage3_delta with {model, text}) as they arrive.
+    A repeated query is replayed from the council cache (events carry cached=true)
+    unless refresh=true.
     """
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -869,96 +1235,53 @@ async def send_council_deliberation_stream(conversation_id: str):
         finalized_context, council_delib, prior_synthesis=prior_synth
     )
     is_first_message = len(council_delib.get("messages", [])) == 0
+    cache_key = None if refresh else council_cache.cache_key(full_query)
     log_api("council_stream_start", conv_id=conversation_id, is_first=is_first_message, query_len=len(full_query))
 
     async def event_generator():
-        try:
-            # Add user message
-            storage.add_council_deliberation_message(conversation_id, "user", content=full_query)
-
-            # Start title generation in parallel (don't await yet)
-            title_task = None
-            if is_first_message:
-                title_task = asyncio.create_task(generate_conversation_title(finalized_prompt))
-
-            # Stage 1: Collect responses
-            yield f"data: {json.dumps({'type': 'stage1_start'})}\n\n"
-            print(f"[COUNCIL] Starting Stage 1: Collecting responses from {len(__import__('backend.config', fromlist=['COUNCIL_MODELS']).COUNCIL_MODELS)} models", file=sys.stderr, flush=True)
-            stage1_results = await stage1_collect_responses(full_query)
-            print(f"[COUNCIL] Stage 1 complete: Received {len(stage1_results)} successful responses", file=sys.stderr, flush=True)
-            yield f"data: {json.dumps({'type': 'stage1_complete', 'data': stage1_results})}\n\n"
-
-            # Check if Stage 1 failed (no responses)
-            if not stage1_results:
-                # Return error message instead of continuing
-                stage3_result = {
-                    "model": "error",
-                    "response": "All models failed to respond. Please check your API key and try again."
-                }
-                stage2_results = []
-                label_to_model = {}
-                aggregate_rankings = []
-                
-                # Skip Stage 2 and go directly to Stage 3 with error
-                yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-                yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
-            else:
-                # Stage 2: Collect rankings
-                yield f"data: {json.dumps({'type': 'stage2_start'})}\n\n"
-                print(f"[COUNCIL] Starting Stage 2: Collecting peer rankings", file=sys.stderr, flush=True)
-                stage2_results, label_to_model = await stage2_collect_rankings(full_query, stage1_results)
-                print(f"[COUNCIL] Stage 2 complete: Received {len(stage2_results)} rankings", file=sys.stderr, flush=True)
-                aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
-                print(f"[COUNCIL] Aggregate rankings calculated: {len(aggregate_rankings)} models ranked", file=sys.stderr, flush=True)
-                yield f"data: {json.dumps({'type': 'stage2_complete', 'data': stage2_results, 'metadata': {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}})}\n\n"
-
-                # Stage 3: Synthesize final answer
-                yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-                print(f"[COUNCIL] Starting Stage 3 synthesis with chairman model", file=sys.stderr, flush=True)
-                try:
-                    stage3_result = await stage3_synthesize_final(full_query, stage1_results, stage2_results)
-                    if stage3_result is None:
-                        print(f"[COUNCIL] ERROR: Stage 3 returned None", file=sys.stderr, flush=True)
-                        stage3_result = {
-                            "model": "error",
-                            "response": "Error: Stage 3 synthesis failed - chairman model returned no response."
-                        }
-                    elif not stage3_result.get('response'):
-                        print(f"[COUNCIL] ERROR: Stage 3 returned empty response", file=sys.stderr, flush=True)
-                        stage3_result['response'] = "Error: Stage 3 synthesis failed - chairman model returned empty response."
+        # One trace per deliberation: storage, LLM and ranking calls below become child spans
+        with tracing.start_trace("council_deliberation", conversation_id=conversation_id, first_message=is_first_message, query_len=len(full_query)) as trace:
+            try:
+                # Add user message
+                await storage.add_council_deliberation_message(conversation_id, "user", content=full_query)
+
+                # Start title generation in parallel (don't await yet)
+                title_task = None
+                if is_first_message:
+                    title_task = asyncio.create_task(generate_conversation_title(finalized_prompt))
+
+                # Stages 1-3 (replayed instantly on a council cache hit)
+                async for item in _council_stage_events(full_query, cache_key):
+                    if isinstance(item, str):
+                        yield item
                     else:
-                        print(f"[COUNCIL] Stage 3 completed successfully. Response length: {len(stage3_result.get('response', ''))}", file=sys.stderr, flush=True)
-                except Exception as stage3_error:
-                    print(f"[COUNCIL] ERROR in Stage 3: {type(stage3_error).__name__}: {str(stage3_error)}", file=sys.stderr, flush=True)
-                    import traceback
-                    traceback.print_exc(file=sys.stderr)
-                    stage3_result = {
-                        "model": "error",
-                        "response": f"Error in Stage 3 synthesis: {str(stage3_error)}"
-                    }
-                yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
-
-            # Wait for title generation if it was started
-            if title_task:
-                title = await title_task
-                storage.update_conversation_title(conversation_id, title)
-                yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
+                        stage1_results, stage2_results, stage3_result, metadata = item
+
+                # Wait for title generation if it was started
+                if title_task:
+                    title = await title_task
+                    await storage.update_conversation_title(conversation_id, title)
+                    yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
+
+                # Save complete assistant message (trace id lets slow runs be looked up later)
+                await storage.add_council_deliberation_message(
+                    conversation_id,
+                    "assistant",
+                    stage1=stage1_results,
+                    stage2=stage2_results,
+                    stage3=stage3_result,
+                    trace_id=trace.trace_id if trace is not None else None
+                )
 
-            # Save complete assistant message
-            storage.add_council_deliberation_message(
-                conversation_id,
-                "assistant",
-                stage1=stage1_results,
-                stage2=stage2_results,
-                stage3=stage3_result
-            )
+                # Send completion event
+                yield f"data: {json.dumps({'type': 'complete'})}\n\n"
 
-            # Send completion event
-            yield f"data: {json.dumps({'type': 'complete'})}\n\n"
-
-        except Exception as e:
-            # Send error event
-            yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
+            except Exception as e:
+                if trace is not None:
+                    trace.status = "ERROR"
+                    trace.error = f"{type(e).__name__}: {e}"
+                # Send error event
+                yield f"data: {json.dumps({'type': 'error', 'message': str(e)})}\n\n"
 
     return StreamingResponse(
         event_generator(),
@@ -971,95 +1294,46 @@ async def send_council_deliberation_stream(conversation_id: str):
 
 
 @app.post("/api/conversations/{conversation_id}/message/stream")
-async def send_message_stream(conversation_id: str, request: SendMessageRequest):
+async def send_message_stream(conversation_id: str, request: SendMessageRequest, refresh: bool = False):
     """
     Send a message and stream the 3-stage council process.
-    Returns Server-Sent Events as each stage completes.
+    Returns Server-Sent Events as each stage completes, plus per-model token deltas.
+    A repeated message is replayed from the council cache unless refresh=true.
     """
     # Check if conversation exists
-    conversation = storage.get_conversation(conversation_id)
+    conversation = await storage.get_conversation(conversation_id)
     if conversation is None:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
     # Check if this is the first message
     is_first_message = len(conversation["messages"]) == 0
+    cache_key = None if refresh else council_cache.cache_key(request.content)
 
     async def event_generator():
         try:
             # Add user message
-            storage.add_user_message(conversation_id, request.content)
+            await storage.add_user_message(conversation_id, request.content)
 
             # Start title generation in parallel (don't await yet)
             title_task = None
             if is_first_message:
                 title_task = asyncio.create_task(generate_conversation_title(request.content))
 
-            # Stage 1: Collect responses
-            yield f"data: {json.dumps({'type': 'stage1_start'})}\n\n"
-            print(f"[COUNCIL] Starting Stage 1 for follow-up message: Collecting responses", file=sys.stderr, flush=True)
-            stage1_results = await stage1_collect_responses(request.content)
-            print(f"[COUNCIL] Stage 1 complete: Received {len(stage1_results)} successful responses", file=sys.stderr, flush=True)
-            yield f"data: {json.dumps({'type': 'stage1_complete', 'data': stage1_results})}\n\n"
-
-            # Check if Stage 1 failed (no responses)
-            if not stage1_results:
-                print(f"[COUNCIL] ERROR: No Stage 1 responses - all models failed", file=sys.stderr, flush=True)
-                # Return error message instead of continuing
-                stage3_result = {
-                    "model": "error",
-                    "response": "All models failed to respond. Please check your API key and try again."
-                }
-                stage2_results = []
-                label_to_model = {}
-                aggregate_rankings = []
-                
-                # Skip Stage 2 and go directly to Stage 3 with error
-                yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-                yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
-            else:
-                # Stage 2: Collect rankings
-                yield f"data: {json.dumps({'type': 'stage2_start'})}\n\n"
-                print(f"[COUNCIL] Starting Stage 2 for follow-up: Collecting peer rankings", file=sys.stderr, flush=True)
-                stage2_results, label_to_model = await stage2_collect_rankings(request.content, stage1_results)
-                print(f"[COUNCIL] Stage 2 complete: Received {len(stage2_results)} rankings", file=sys.stderr, flush=True)
-                aggregate_rankings = calculate_aggregate_rankings(stage2_results, label_to_model)
-                print(f"[COUNCIL] Aggregate rankings calculated: {len(aggregate_rankings)} models ranked", file=sys.stderr, flush=True)
-                yield f"data: {json.dumps({'type': 'stage2_complete', 'data': stage2_results, 'metadata': {'label_to_model': label_to_model, 'aggregate_rankings': aggregate_rankings}})}\n\n"
-
-                # Stage 3: Synthesize final answer
-                yield f"data: {json.dumps({'type': 'stage3_start'})}\n\n"
-                print(f"[COUNCIL] Starting Stage 3 synthesis for follow-up message", file=sys.stderr, flush=True)
-                try:
-                    stage3_result = await stage3_synthesize_final(request.content, stage1_results, stage2_results)
-                    if stage3_result is None:
-                        print(f"[COUNCIL] ERROR: Stage 3 returned None", file=sys.stderr, flush=True)
-                        stage3_result = {
-                            "model": "error",
-                            "response": "Error: Stage 3 synthesis failed - chairman model returned no response."
-                        }
-                    elif not stage3_result.get('response'):
-                        print(f"[COUNCIL] ERROR: Stage 3 returned empty response", file=sys.stderr, flush=True)
-                        stage3_result['response'] = "Error: Stage 3 synthesis failed - chairman model returned empty response."
-                    else:
-                        print(f"[COUNCIL] Stage 3 completed successfully. Response length: {len(stage3_result.get('response', ''))}", file=sys.stderr, flush=True)
-                except Exception as stage3_error:
-                    print(f"[COUNCIL] ERROR in Stage 3: {type(stage3_error).__name__}: {str(stage3_error)}", file=sys.stderr, flush=True)
-                    import traceback
-                    traceback.print_exc(file=sys.stderr)
-                    stage3_result = {
-                        "model": "error",
-                        "response": f"Error in Stage 3 synthesis: {str(stage3_error)}"
-                    }
-                yield f"data: {json.dumps({'type': 'stage3_complete', 'data': stage3_result})}\n\n"
+            # Stages 1-3 (replayed instantly on a council cache hit)
+            async for item in _council_stage_events(request.content, cache_key):
+                if isinstance(item, str):
+                    yield item
+                else:
+                    stage1_results, stage2_results, stage3_result, metadata = item
 
             # Wait for title generation if it was started
             if title_task:
                 title = await title_task
-                storage.update_conversation_title(conversation_id, title)
+                await storage.update_conversation_title(conversation_id, title)
                 yield f"data: {json.dumps({'type': 'title_complete', 'data': {'title': title}})}\n\n"
 
             # Save complete assistant message
-            storage.add_assistant_message(
+            await storage.add_assistant_message(
                 conversation_id,
                 stage1_results,
                 stage2_results,
@@ -0,0 +1,223 @@
+"""Per-call LLM telemetry: ring buffer of recent calls plus latency histograms.
+
+Every upstream OpenRouter call records one structured entry (model, stage, sizes,
+token usage, wall time, time-to-first-byte, status). Entries go into a bounded ring
+buffer for inspection, and into log-bucketed (HDR-style) histograms per
+(model, stage) so p50/p95/p99 stay cheap to compute with fixed memory.
+Exposed via /api/metrics (Prometheus text) and /api/metrics/summary (JSON).
+"""
+
+import contextlib
+import contextvars
+import math
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+from .config import METRICS_RING_SIZE
+
+# Stage label for calls made in the current task (set by the council orchestrator)
+current_stage: contextvars.ContextVar[str] = contextvars.ContextVar("llm_stage", default="other")
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Label every query_model call made inside this block (and tasks it spawns) with a stage."""
+    token = current_stage.set(name)
+    try:
+        yield
+    finally:
+        current_stage.reset(token)
+
+
+class Histogram:
+    """
+    Log-bucketed histogram: 8 buckets per power of two from 1 ms to ~20 min.
+
+    Quantiles are accurate to ~4.5% relative error regardless of how many samples
+    were recorded, and memory stays fixed (one int per bucket).
+    """
+
+    BASE = 0.001
+    PER_DOUBLING = 8
+    BUCKETS = 8 * 21
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def _index(self, value: float) -> int:
+        if value <= self.BASE:
+            return 0
+        return min(self.BUCKETS - 1, int(math.log2(value / self.BASE) * self.PER_DOUBLING))
+
+    def record(self, value: float):
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> Optional[float]:
+        if self.count == 0:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                # Geometric midpoint of the bucket, clamped to the observed range
+                mid = self.BASE * 2 ** ((i + 0.5) / self.PER_DOUBLING)
+                return min(max(mid, self.min), self.max)
+        return self.max
+
+
+_calls: Deque[Dict[str, Any]] = deque(maxlen=METRICS_RING_SIZE)
+_durations: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+_ttfb: Dict[Tuple[str, str], Histogram] = defaultdict(Histogram)
+_status_counts: Dict[Tuple[str, str, str], int] = defaultdict(int)
+_tokens: Dict[Tuple[str, str], Dict[str, int]] = defaultdict(lambda: {"prompt": 0, "completion": 0})
+
+
+def record_call(
+    model: str,
+    stage: Optional[str],
+    status: str,
+    duration: float,
+    ttfb: Optional[float] = None,
+    prompt_chars: int = 0,
+    completion_chars: int = 0,
+    usage: Optional[Dict[str, Any]] = None,
+    timeout: Optional[float] = None,
+    streamed: bool = False
+):
+    """
+    Record one upstream LLM call.
+
+    Args:
+        model: OpenRouter model identifier
+        stage: Stage label (defaults to the current_stage context)
+        status: "ok", "empty", "timeout", "cancelled", "error" or "http_<code>"
+        duration: Wall time in seconds
+        ttfb: Seconds until response headers (non-streaming) or first token (streaming)
+        prompt_chars / completion_chars: Request and response sizes
+        usage: The OpenRouter 'usage' object, if returned
+        timeout: Configured timeout for the call
+        streamed: Whether the call used stream: true
+    """
+    stage = stage or current_stage.get()
+    usage = usage or {}
+    entry = {
+        "ts": time.time(),
+        "model": model,
+        "stage": stage,
+        "status": status,
+        "duration": round(duration, 4),
+        "ttfb": round(ttfb, 4) if ttfb is not None else None,
+        "prompt_chars": prompt_chars,
+        "completion_chars": completion_chars,
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "completion_tokens": usage.get("completion_tokens"),
+        "total_tokens": usage.get("total_tokens"),
+        "timeout": timeout,
+        "streamed": streamed,
+    }
+    _calls.append(entry)
+
+    key = (model, stage)
+    _status_counts[(model, stage, status)] += 1
+    if status == "ok":
+        _durations[key].record(duration)
+        if ttfb is not None:
+            _ttfb[key].record(ttfb)
+    _tokens[key]["prompt"] += int(usage.get("prompt_tokens") or 0)
+    _tokens[key]["completion"] += int(usage.get("completion_tokens") or 0)
+
+
+def recent_calls(limit: int = 100) -> List[Dict[str, Any]]:
+    """Most recent call entries, newest first."""
+    return list(reversed(_calls))[:limit]
+
+
+def _quantiles(h: Histogram) -> Dict[str, Optional[float]]:
+    return {f"p{int(q * 100)}": round(h.quantile(q), 4) for q in (0.5, 0.95, 0.99)}
+
+
+def summary() -> Dict[str, Any]:
+    """Per (model, stage) call counts, status breakdown, latency percentiles and tokens."""
+    series: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for (model, stage_name, status), n in _status_counts.items():
+        s = series.setdefault((model, stage_name), {"model": model, "stage": stage_name, "calls": 0, "status": {}})
+        s["calls"] += n
+        s["status"][status] = n
+    for key, s in series.items():
+        s["duration"] = _quantiles(_durations[key]) if key in _durations else None
+        s["ttfb"] = _quantiles(_ttfb[key]) if key in _ttfb else None
+        s["tokens"] = dict(_tokens[key])
+    return {
+        "series": sorted(series.values(), key=lambda s: (s["stage"], s["model"])),
+        "recent": recent_calls(20),
+        "ring_size": _calls.maxlen,
+    }
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: Any) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _summary_lines(name: str, help_text: str, histograms: Dict[Tuple[str, str], Histogram]) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} summary"]
+    for (model, stage_name), h in sorted(histograms.items()):
+        for q in (0.5, 0.95, 0.99):
+            lines.append(f"{name}{_labels(model=model, stage=stage_name, quantile=q)} {h.quantile(q):.6f}")
+        lines.append(f"{name}_sum{_labels(model=model, stage=stage_name)} {h.sum:.6f}")
+        lines.append(f"{name}_count{_labels(model=model, stage=stage_name)} {h.count}")
+    return lines
+
+
+def render_prometheus() -> str:
+    """Prometheus text exposition of call metrics plus cache, single-flight and hedging counters."""
+    lines = ["# HELP llm_council_upstream_calls_total Upstream LLM calls by outcome",
+             "# TYPE llm_council_upstream_calls_total counter"]
+    for (model, stage_name, status), n in sorted(_status_counts.items()):
+        lines.append(f"llm_council_upstream_calls_total{_labels(model=model, stage=stage_name, status=status)} {n}")
+
+    lines += _summary_lines("llm_council_call_duration_seconds", "Wall time of successful LLM calls", _durations)
+    lines += _summary_lines("llm_council_call_ttfb_seconds", "Time to first byte (first token when streaming)", _ttfb)
+
+    lines += ["# HELP llm_council_tokens_total Tokens reported by OpenRouter usage",
+              "# TYPE llm_council_tokens_total counter"]
+    for (model, stage_name), tokens in sorted(_tokens.items()):
+        for kind, n in tokens.items():
+            lines.append(f"llm_council_tokens_total{_labels(model=model, stage=stage_name, kind=kind)} {n}")
+
+    from .singleflight import all_stats as singleflight_stats
+    lines += ["# HELP llm_council_singleflight_calls_total Calls that led or joined a single-flight group",
+              "# TYPE llm_council_singleflight_calls_total counter"]
+    for group, stats in sorted(singleflight_stats().items()):
+        lines.append(f"llm_council_singleflight_calls_total{_labels(group=group, role='leader')} {stats['leaders']}")
+        lines.append(f"llm_council_singleflight_calls_total{_labels(group=group, role='coalesced')} {stats['coalesced']}")
+
+    from . import council_cache
+    cache = council_cache.get_stats()
+    lines += ["# HELP llm_council_cache_lookups_total Council result cache lookups",
+              "# TYPE llm_council_cache_lookups_total counter",
+              f"llm_council_cache_lookups_total{_labels(result='memory_hit')} {cache['memory_hits']}",
+              f"llm_council_cache_lookups_total{_labels(result='disk_hit')} {cache['disk_hits']}",
+              f"llm_council_cache_lookups_total{_labels(result='miss')} {cache['misses']}"]
+
+    from .hedging import hedge_policy
+    lines += ["# HELP llm_council_hedges_total Hedged council calls by winning path",
+              "# TYPE llm_council_hedges_total counter"]
+    for model, stats in sorted(hedge_policy.get_stats()["models"].items()):
+        lines.append(f"llm_council_hedges_total{_labels(model=model, path='primary')} {stats['primary_wins']}")
+        lines.append(f"llm_council_hedges_total{_labels(model=model, path='backup')} {stats['backup_wins']}")
+
+    return "\n".join(lines) + "\n"
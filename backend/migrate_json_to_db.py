@@ -59,18 +59,14 @@ def migrate_json_to_database():
                 else:
                     created_at = datetime.utcnow()
                 
-                # Create database record
-                conversation = Conversation(
-                    id=data.get("id", conversation_id),
-                    created_at=created_at,
-                    title=data.get("title", "New Conversation"),
-                    prompt_engineering=data.get("prompt_engineering", {}),
-                    context_engineering=data.get("context_engineering", {}),
-                    council_deliberation=data.get("council_deliberation", {}),
-                    messages=data.get("messages", [])  # For backward compatibility
-                )
-                
-                db.add(conversation)
+                # Create database record (messages/attachments become rows)
+                from .storage_db import save_conversation
+                data = dict(data, id=data.get("id", conversation_id), created_at=created_at.isoformat())
+                council = dict(data.get("council_deliberation") or {})
+                if "messages" not in council and data.get("messages"):
+                    council["messages"] = data["messages"]  # For backward compatibility
+                data["council_deliberation"] = council
+                save_conversation(data)
                 migrated_count += 1
                 print(f"Migrated {conversation_id}")
                 
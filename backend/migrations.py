@@ -0,0 +1,240 @@
+"""Versioned schema migrations, applied once at startup.
+
+Each migration is a (version, name, function) entry in MIGRATIONS. run_migrations()
+applies the ones newer than the version recorded in the schema_version table, in
+order, recording each as it completes. Storage calls never introspect the schema -
+database.init_db() runs this once per process.
+
+Migrations must be idempotent: databases created before versioning existed start at
+version 0 and replay every step against tables that may already be (partly) up to date.
+To change the schema, add a model/column in database.py and append a migration here;
+never edit a released one. Before pending migrations run, nullable (or defaulted) columns
+of the current models are added to existing tables, so data migrations that load the
+models still work on databases several versions behind.
+"""
+
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .logger import get_logger
+
+_meta = MetaData()
+schema_version = Table(
+    "schema_version",
+    _meta,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, default=datetime.utcnow, nullable=False),
+)
+
+# Section JSON keys that moved to their own tables (migration 3)
+_LIST_KEYS = {
+    "prompt_engineering": ("messages",),
+    "context_engineering": ("messages", "documents", "files", "links"),
+    "council_deliberation": ("messages",),
+}
+
+
+def _add_missing_columns(conn: Connection, table: str, columns: List[Tuple[str, str]]):
+    existing = {col["name"] for col in inspect(conn).get_columns(table)}
+    for col, sql_type in columns:
+        if col not in existing:
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {col} {sql_type}"))
+
+
+def _add_model_columns(conn: Connection):
+    """Add the current models' nullable/defaulted columns missing from existing tables."""
+    from .database import Base
+    existing = set(inspect(conn).get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = []
+        for column in table.columns:
+            if column.primary_key or (not column.nullable and column.server_default is None):
+                continue
+            sql_type = column.type.compile(dialect=conn.dialect)
+            if column.server_default is not None:
+                sql_type += f" DEFAULT '{column.server_default.arg}'" + ("" if column.nullable else " NOT NULL")
+            columns.append((column.name, sql_type))
+        _add_missing_columns(conn, table.name, columns)
+
+
+def _create_tables(conn: Connection):
+    """Create every table of the current models (no-op for existing ones)."""
+    from .database import Base
+    Base.metadata.create_all(conn)
+
+
+def _add_chain_columns(conn: Connection):
+    """Multi-round chain fields on conversations."""
+    _add_missing_columns(conn, "conversations", [
+        ("chain_id", "TEXT"),
+        ("parent_id", "TEXT"),
+        ("round_number", "INTEGER"),
+        ("prior_synthesis", "TEXT"),
+        ("prior_preparation_summary", "TEXT"),
+    ])
+
+
+def _move_json_lists_to_rows(conn: Connection):
+    """Move messages/attachments/council answers out of the JSON columns into their tables."""
+    from .database import Conversation, add_message_row, add_attachment_row
+    moved = 0
+    db = Session(bind=conn)
+    rows = db.query(
+        Conversation.id,
+        Conversation.prompt_engineering,
+        Conversation.context_engineering,
+        Conversation.council_deliberation,
+        Conversation.messages,
+    ).all()
+    for conv in rows:
+        sections = {
+            "prompt_engineering": dict(conv.prompt_engineering or {}),
+            "context_engineering": dict(conv.context_engineering or {}),
+            "council_deliberation": dict(conv.council_deliberation or {}),
+        }
+        legacy = conv.messages if isinstance(conv.messages, list) else []
+        if not any(k in sections[name] for name, keys in _LIST_KEYS.items() for k in keys) and not legacy:
+            continue
+        if "messages" not in sections["council_deliberation"] and legacy:
+            sections["council_deliberation"]["messages"] = legacy
+        for name, keys in _LIST_KEYS.items():
+            for key in keys:
+                for item in sections[name].pop(key, None) or []:
+                    if not isinstance(item, dict):
+                        continue
+                    if key == "messages":
+                        add_message_row(db, conv.id, name, item)
+                    else:
+                        add_attachment_row(db, conv.id, key[:-1], item)
+        db.query(Conversation).filter(Conversation.id == conv.id).update({
+            "prompt_engineering": sections["prompt_engineering"],
+            "context_engineering": sections["context_engineering"],
+            "council_deliberation": sections["council_deliberation"],
+            "messages": [],
+        }, synchronize_session=False)
+        moved += 1
+    db.flush()
+    if moved:
+        get_logger("db").info("Moved messages/attachments of %d conversations into row tables", moved)
+
+
+def _add_listing_columns(conn: Connection):
+    """Denormalized message_count/updated_at plus the keyset index for the sidebar listing."""
+    _add_missing_columns(conn, "conversations", [
+        ("message_count", "INTEGER"),
+        ("updated_at", "TIMESTAMP"),
+    ])
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_conversations_created_at_id ON conversations (created_at, id)"
+    ))
+    conn.execute(text(
+        "UPDATE conversations SET message_count = ("
+        "SELECT COUNT(*) FROM messages WHERE messages.conversation_id = conversations.id "
+        "AND messages.section = 'council_deliberation') WHERE message_count IS NULL"
+    ))
+    conn.execute(text("UPDATE conversations SET updated_at = created_at WHERE updated_at IS NULL"))
+
+
+def _add_attachment_status(conn: Connection):
+    """Ingestion status of attachments (existing ones are ready)."""
+    _add_missing_columns(conn, "attachments", [("status", "VARCHAR DEFAULT 'ready' NOT NULL")])
+
+
+def _add_content_blobs(conn: Connection):
+    """Attachment content moves to shared, compressed blobs; RAG chunks are stored per blob."""
+    from .database import Attachment, Blob, BlobChunk, add_blob_chunks, load_blob_texts, put_blob
+    Blob.__table__.create(conn, checkfirst=True)
+    BlobChunk.__table__.create(conn, checkfirst=True)
+    _add_missing_columns(conn, "attachments", [("content_hash", "VARCHAR"), ("raw_hash", "VARCHAR")])
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_attachments_content_hash ON attachments (content_hash)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_attachments_raw_hash ON attachments (raw_hash)"))
+    db = Session(bind=conn)
+    moved = 0
+    for (attachment_id,) in db.query(Attachment.id).order_by(Attachment.id).all():
+        attachment = db.get(Attachment, attachment_id)
+        data = dict(attachment.data or {})
+        if "content" in data or attachment.content_hash is None:
+            content = data.pop("content", None) or ""
+            attachment.content_hash = put_blob(db, content)
+            attachment.data = data
+            moved += 1
+        else:
+            content = load_blob_texts(db, [attachment.content_hash]).get(attachment.content_hash, "")
+        if (attachment.status or "ready") == "ready":
+            add_blob_chunks(db, attachment.content_hash, attachment.kind, {**data, "content": content})
+        db.flush()
+        db.expunge(attachment)
+    conn.execute(text("DROP TABLE IF EXISTS attachment_chunks"))
+    if moved:
+        get_logger("db").info("Moved the content of %d attachments into blobs", moved)
+
+
+def _drop_attachment_chunks(conn: Connection):
+    """Drop the per-attachment chunk table (replaced by blob_chunks) wherever a pre-release build left it."""
+    conn.execute(text("DROP TABLE IF EXISTS attachment_chunks"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "create_tables", _create_tables),
+    (2, "add_chain_columns", _add_chain_columns),
+    (3, "move_json_lists_to_rows", _move_json_lists_to_rows),
+    (4, "add_listing_columns", _add_listing_columns),
+    # 5 (add_attachment_chunks, a per-attachment chunk table) was withdrawn before release
+    (6, "add_attachment_status", _add_attachment_status),
+    (7, "add_content_blobs", _add_content_blobs),
+    (8, "drop_attachment_chunks", _drop_attachment_chunks),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn: Connection) -> int:
+    """Highest applied migration version (0 for a new or pre-versioning database)."""
+    version = conn.execute(select(schema_version.c.version).order_by(schema_version.c.version.desc()).limit(1)).scalar()
+    return version or 0
+
+
+def run_migrations(engine: Engine) -> int:
+    """
+    Apply pending migrations, each in its own transaction.
+
+    Args:
+        engine: SQLAlchemy engine of the target database
+
+    Returns:
+        Schema version after the run
+    """
+    logger = get_logger("db")
+    _meta.create_all(engine)
+    with engine.connect() as conn:
+        version = current_version(conn)
+    if version < LATEST_VERSION:
+        with engine.begin() as conn:
+            _add_model_columns(conn)
+
+    for number, name, migrate in MIGRATIONS:
+        if number <= version:
+            continue
+        try:
+            with engine.begin() as conn:
+                # Another worker may have applied it since we looked
+                if current_version(conn) >= number:
+                    continue
+                migrate(conn)
+                conn.execute(schema_version.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+        except IntegrityError:
+            # Lost the race to record this version: the other worker's run stands, ours rolled back
+            version = number
+            continue
+        logger.info("Applied schema migration %d (%s)", number, name)
+        version = number
+
+    return version
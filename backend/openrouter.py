@@ -1,16 +1,134 @@
 """OpenRouter API client for making LLM requests."""
 
+import asyncio
+import hashlib
 import httpx
+import json
 import sys
-from typing import List, Dict, Any, Optional
-from .config import OPENROUTER_API_KEY, OPENROUTER_API_URL
+import time
+from collections import OrderedDict
+from .singleflight import SingleFlight
+from . import metrics, tracing
+from typing import List, Dict, Any, Optional, AsyncIterator, Callable, Union
+from .config import (
+    OPENROUTER_API_KEY,
+    OPENROUTER_API_URL,
+    OPENROUTER_HTTP2,
+    OPENROUTER_MAX_CONNECTIONS,
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+    OPENROUTER_KEEPALIVE_EXPIRY,
+    OPENROUTER_MEMO_MAX_ENTRIES,
+)
+
+# Shared pooled client - created on app startup, closed on shutdown
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional 'h2' package (httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def init_client() -> httpx.AsyncClient:
+    """
+    Create the shared OpenRouter client (idempotent).
+
+    All modules that call query_model reuse this client, so connections (and their
+    TCP/TLS handshakes) are kept alive across council members, stages and requests.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        http2 = OPENROUTER_HTTP2 and _http2_available()
+        if OPENROUTER_HTTP2 and not http2:
+            print("[OPENROUTER] h2 not installed - shared client falling back to HTTP/1.1 keep-alive", file=sys.stderr, flush=True)
+        _client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=OPENROUTER_MAX_CONNECTIONS,
+                max_keepalive_connections=OPENROUTER_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=OPENROUTER_KEEPALIVE_EXPIRY,
+            ),
+            timeout=120.0,
+        )
+        print(f"[OPENROUTER] Shared client ready (http2={http2}, max_connections={OPENROUTER_MAX_CONNECTIONS})", file=sys.stderr, flush=True)
+    return _client
+
+
+def get_client() -> httpx.AsyncClient:
+    """Get the shared client, creating it lazily outside the app (scripts, tests)."""
+    if _client is None or _client.is_closed:
+        return init_client()
+    return _client
+
+
+async def close_client():
+    """Close the shared client and its pooled connections (app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+# Callback for streamed tokens: on_delta(model, text)
+DeltaCallback = Callable[[str, str], None]
+
+
+def _prompt_chars(messages: List[Dict[str, str]]) -> int:
+    return sum(len(m.get("content") or "") for m in messages)
+
+
+def _headers() -> Dict[str, str]:
+    return {
+        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
+        "Content-Type": "application/json",
+    }
+
+
+# Opt-in response memoization: key -> (expires_at monotonic seconds, response dict)
+_memo: "OrderedDict[str, tuple]" = OrderedDict()
+# Identical requests currently in flight share one upstream call (single-flight)
+_flights = SingleFlight("openrouter")
+
+
+def memo_key(model: str, messages: List[Dict[str, str]], **params: Any) -> str:
+    """Content-addressed key for a request: sha256 of (model, messages, params)."""
+    material = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _memo_get(key: str) -> Optional[Dict[str, Any]]:
+    entry = _memo.get(key)
+    if entry is None:
+        return None
+    expires_at, response = entry
+    if expires_at <= time.monotonic():
+        del _memo[key]
+        return None
+    _memo.move_to_end(key)
+    return dict(response)
+
+
+def _memo_put(key: str, response: Dict[str, Any], ttl: float):
+    _memo[key] = (time.monotonic() + ttl, dict(response))
+    _memo.move_to_end(key)
+    while len(_memo) > OPENROUTER_MEMO_MAX_ENTRIES:
+        _memo.popitem(last=False)
 
 
 async def query_model(
     model: str,
     messages: List[Dict[str, str]],
-    timeout: float = 120.0  # Longer timeout for best models (they may take more time for quality)
-) -> Optional[Dict[str, Any]]:
+    timeout: float = 120.0,  # Longer timeout for best models (they may take more time for quality)
+    stream: bool = False,
+    cache_ttl: Optional[float] = None,
+    bypass_cache: bool = False,
+    stage: Optional[str] = None,
+    coalesce: bool = True
+) -> Union[Optional[Dict[str, Any]], AsyncIterator[str]]:
     """
     Query a single model via OpenRouter API.
 
@@ -18,14 +136,52 @@ async def query_model(
         model: OpenRouter model identifier (e.g., "openai/gpt-4o")
         messages: List of message dicts with 'role' and 'content'
         timeout: Request timeout in seconds
+        stream: If True, use OpenRouter's `stream: true` mode and return an async
+            iterator of content deltas instead of a response dict
+        cache_ttl: Opt-in memoization - reuse an identical earlier response for this many
+            seconds. (Concurrent identical calls always share one upstream request.)
+        bypass_cache: Skip the memo lookup (the fresh response still refreshes the entry)
+        stage: Metrics label for the call (default: the metrics.stage() context, else "other")
+        coalesce: Share an identical in-flight request (False forces a separate upstream
+            call - hedged backups must not just join the slow request they back up)
 
     Returns:
-        Response dict with 'content' and optional 'reasoning_details', or None if failed
+        Response dict with 'content' and optional 'reasoning_details', or None if failed.
+        With stream=True, an async iterator yielding text deltas as they arrive.
     """
-    headers = {
-        "Authorization": f"Bearer {OPENROUTER_API_KEY}",
-        "Content-Type": "application/json",
-    }
+    if stream:
+        return stream_model(model, messages, timeout=timeout, stage=stage)
+
+    with tracing.span("query_model", model=model, stage=stage or metrics.current_stage.get()) as span:
+        key = memo_key(model, messages)
+        if cache_ttl is not None and not bypass_cache:
+            cached = _memo_get(key)
+            if cached is not None:
+                print(f"[OPENROUTER] Memo hit for {model}", file=sys.stderr, flush=True)
+                if span is not None:
+                    span.set_attribute("memo_hit", True)
+                return cached
+
+        # Identical concurrent requests (retry storms, duplicate tabs) share one upstream call
+        if coalesce:
+            response = await _flights.do(key, lambda: _query_model_uncached(model, messages, timeout, stage))
+        else:
+            response = await _query_model_uncached(model, messages, timeout, stage)
+        if cache_ttl is not None and response is not None:
+            _memo_put(key, response, cache_ttl)
+        if span is not None:
+            span.set_attribute("ok", response is not None)
+        return response
+
+
+async def _query_model_uncached(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float,
+    stage: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """POST one non-streaming chat completion; returns None on any failure."""
+    headers = _headers()
 
     payload = {
         "model": model,
@@ -36,64 +192,227 @@ async def query_model(
     if not OPENROUTER_API_KEY:
         print(f"Error: OPENROUTER_API_KEY is not set", file=sys.stderr, flush=True)
         return None
-    
+
+    started = time.perf_counter()
+    call = {"status": "error", "ttfb": None, "completion_chars": 0, "usage": None}
     try:
         print(f"[OPENROUTER] Querying {model} with timeout={timeout}s", file=sys.stderr, flush=True)
         
-        async with httpx.AsyncClient(timeout=timeout) as client:
-            response = await client.post(
-                OPENROUTER_API_URL,
-                headers=headers,
-                json=payload
-            )
-            
-            # Log response status for debugging
-            if response.status_code != 200:
-                error_text = response.text[:500] if hasattr(response, 'text') else str(response.status_code)
-                print(f"[OPENROUTER] Error querying model {model}: HTTP {response.status_code} - {error_text}", file=sys.stderr, flush=True)
-                return None
-            
-            response.raise_for_status()
-
-            data = response.json()
-            
-            # Validate response structure
-            if 'choices' not in data or not data['choices']:
-                print(f"[OPENROUTER] Error: Invalid response structure from {model} - no choices", file=sys.stderr, flush=True)
-                return None
-            
-            message = data['choices'][0]['message']
-            content = message.get('content', '')
-            
-            if not content:
-                print(f"[OPENROUTER] Warning: {model} returned empty content", file=sys.stderr, flush=True)
-            else:
-                print(f"[OPENROUTER] SUCCESS: {model} returned {len(content)} characters", file=sys.stderr, flush=True)
-
-            return {
-                'content': content,
-                'reasoning_details': message.get('reasoning_details')
-            }
+        client = get_client()
+        async with client.stream(
+            "POST",
+            OPENROUTER_API_URL,
+            headers=headers,
+            json=payload,
+            timeout=timeout
+        ) as response:
+            call["ttfb"] = time.perf_counter() - started
+            await response.aread()
+        
+        # Log response status for debugging
+        if response.status_code != 200:
+            call["status"] = f"http_{response.status_code}"
+            error_text = response.text[:500] if hasattr(response, 'text') else str(response.status_code)
+            print(f"[OPENROUTER] Error querying model {model}: HTTP {response.status_code} - {error_text}", file=sys.stderr, flush=True)
+            return None
+        
+        response.raise_for_status()
+
+        data = response.json()
+        call["usage"] = data.get('usage')
+        
+        # Validate response structure
+        if 'choices' not in data or not data['choices']:
+            print(f"[OPENROUTER] Error: Invalid response structure from {model} - no choices", file=sys.stderr, flush=True)
+            return None
+        
+        message = data['choices'][0]['message']
+        content = message.get('content', '')
+        call["completion_chars"] = len(content or '')
+        
+        if not content:
+            call["status"] = "empty"
+            print(f"[OPENROUTER] Warning: {model} returned empty content", file=sys.stderr, flush=True)
+        else:
+            call["status"] = "ok"
+            print(f"[OPENROUTER] SUCCESS: {model} returned {len(content)} characters", file=sys.stderr, flush=True)
+
+        return {
+            'content': content,
+            'reasoning_details': message.get('reasoning_details')
+        }
 
     except httpx.TimeoutException as e:
+        call["status"] = "timeout"
         print(f"[OPENROUTER] TIMEOUT querying model {model} after {timeout}s", file=sys.stderr, flush=True)
         return None
     except httpx.HTTPStatusError as e:
         error_text = str(e.response.text)[:500] if hasattr(e, 'response') and hasattr(e.response, 'text') else str(e)
         print(f"[OPENROUTER] HTTP error querying model {model}: {error_text}", file=sys.stderr, flush=True)
         return None
+    except asyncio.CancelledError:
+        call["status"] = "cancelled"
+        raise
     except Exception as e:
         print(f"[OPENROUTER] Error querying model {model}: {type(e).__name__}: {str(e)}", file=sys.stderr, flush=True)
         import traceback
         traceback.print_exc(file=sys.stderr)
         return None
+    finally:
+        metrics.record_call(
+            model, stage, call["status"], time.perf_counter() - started,
+            ttfb=call["ttfb"],
+            prompt_chars=_prompt_chars(messages),
+            completion_chars=call["completion_chars"],
+            usage=call["usage"],
+            timeout=timeout
+        )
+
+
+async def stream_model(
+    model: str,
+    messages: List[Dict[str, str]],
+    timeout: float = 120.0,
+    stage: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Stream a single model's response via OpenRouter (`stream: true`).
+
+    Yields content deltas as they arrive. On errors the iterator logs and ends early,
+    so callers should treat an empty stream as a failed query.
+
+    Args:
+        model: OpenRouter model identifier
+        messages: List of message dicts with 'role' and 'content'
+        timeout: Max seconds to wait between streamed chunks
+        stage: Metrics label for the call
+    """
+    if not OPENROUTER_API_KEY:
+        print(f"Error: OPENROUTER_API_KEY is not set", file=sys.stderr, flush=True)
+        return
+
+    payload = {
+        "model": model,
+        "messages": messages,
+        "stream": True,
+    }
+
+    started = time.perf_counter()
+    call = {"status": "error", "ttfb": None, "completion_chars": 0, "usage": None}
+    try:
+        print(f"[OPENROUTER] Streaming {model} with timeout={timeout}s", file=sys.stderr, flush=True)
+        client = get_client()
+        async with client.stream(
+            "POST",
+            OPENROUTER_API_URL,
+            headers=_headers(),
+            json=payload,
+            timeout=timeout
+        ) as response:
+            if response.status_code != 200:
+                call["status"] = f"http_{response.status_code}"
+                error_text = (await response.aread()).decode("utf-8", errors="replace")[:500]
+                print(f"[OPENROUTER] Error streaming model {model}: HTTP {response.status_code} - {error_text}", file=sys.stderr, flush=True)
+                return
+
+            async for line in response.aiter_lines():
+                # SSE: skip blank lines and ": OPENROUTER PROCESSING" keep-alive comments
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    chunk = json.loads(data)
+                except json.JSONDecodeError:
+                    continue
+                if chunk.get("error"):
+                    print(f"[OPENROUTER] Stream error from {model}: {chunk['error']}", file=sys.stderr, flush=True)
+                    break
+                if chunk.get("usage"):
+                    call["usage"] = chunk["usage"]  # sent with the final chunk
+                choices = chunk.get("choices") or []
+                if not choices:
+                    continue
+                text = (choices[0].get("delta") or {}).get("content")
+                if text:
+                    if call["ttfb"] is None:
+                        call["ttfb"] = time.perf_counter() - started
+                    call["completion_chars"] += len(text)
+                    yield text
+            call["status"] = "ok" if call["completion_chars"] else "empty"
+
+    except httpx.TimeoutException:
+        call["status"] = "timeout"
+        print(f"[OPENROUTER] TIMEOUT streaming model {model} after {timeout}s", file=sys.stderr, flush=True)
+    except (asyncio.CancelledError, GeneratorExit):
+        # Overall timeout in query_model_streaming, a losing hedge, or a disconnected client
+        call["status"] = "cancelled"
+        raise
+    except Exception as e:
+        print(f"[OPENROUTER] Error streaming model {model}: {type(e).__name__}: {str(e)}", file=sys.stderr, flush=True)
+    finally:
+        metrics.record_call(
+            model, stage, call["status"], time.perf_counter() - started,
+            ttfb=call["ttfb"],
+            prompt_chars=_prompt_chars(messages),
+            completion_chars=call["completion_chars"],
+            usage=call["usage"],
+            timeout=timeout,
+            streamed=True
+        )
+
+
+async def query_model_streaming(
+    model: str,
+    messages: List[Dict[str, str]],
+    on_delta: DeltaCallback,
+    timeout: float = 120.0,
+    stage: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Stream a model's response, forwarding each delta to on_delta(model, text).
+
+    Returns the same shape as query_model once the stream ends, so callers can
+    switch between streaming and non-streaming without changing result handling.
+    The whole call is bounded by timeout (not just the gap between chunks).
+    """
+    parts: List[str] = []
+
+    async def consume():
+        async for text in stream_model(model, messages, timeout=timeout, stage=stage):
+            parts.append(text)
+            on_delta(model, text)
+
+    with tracing.span("query_model", model=model, stage=stage or metrics.current_stage.get(), streamed=True) as span:
+        try:
+            await asyncio.wait_for(consume(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"[OPENROUTER] TIMEOUT streaming model {model} after {timeout}s", file=sys.stderr, flush=True)
+            if span is not None:
+                span.set_attribute("ok", False)
+            return None
+        if span is not None:
+            span.set_attribute("ok", bool(parts))
+
+    content = "".join(parts)
+    if not content:
+        print(f"[OPENROUTER] Warning: {model} streamed no content", file=sys.stderr, flush=True)
+        return None
+    print(f"[OPENROUTER] SUCCESS: {model} streamed {len(content)} characters", file=sys.stderr, flush=True)
+    return {
+        'content': content,
+        'reasoning_details': None
+    }
 
 
 async def query_models_parallel(
     models: List[str],
     messages: List[Dict[str, str]],
     timeout: Optional[float] = None,
-    stage_timeout: Optional[float] = None
+    stage_timeout: Optional[float] = None,
+    on_delta: Optional[DeltaCallback] = None,
+    hedge: bool = False
 ) -> Dict[str, Optional[Dict[str, Any]]]:
     """
     Query multiple models in parallel.
@@ -103,15 +422,21 @@ async def query_models_parallel(
         messages: List of message dicts to send to each model
         timeout: Per-model timeout in seconds (default 120)
         stage_timeout: Max seconds for whole stage - proceed with partial results (avoids long stalls)
+        on_delta: If given, stream each model and call on_delta(model, text) per token
+        hedge: Fire a backup request for models running past their own p95 (see hedging.py);
+            responses then carry a 'hedge' entry saying which path won
 
     Returns:
         Dict mapping model identifier to response dict (or None if failed)
     """
-    import asyncio
-
     per_model = timeout if timeout is not None else 120.0
 
     async def query_one(model: str):
+        if hedge:
+            from .hedging import hedged_query
+            return model, await hedged_query(model, messages, per_model, on_delta=on_delta)
+        if on_delta is not None:
+            return model, await query_model_streaming(model, messages, on_delta, timeout=per_model)
         return model, await query_model(model, messages, timeout=per_model)
 
     tasks = [asyncio.create_task(query_one(m)) for m in models]
@@ -0,0 +1,312 @@
+"""Process pool for CPU-heavy document parsing.
+
+pypdf/python-docx/openpyxl/python-pptx parsing is pure-Python CPU work. Run on the
+event loop (or in a thread, holding the GIL) a 300-page PDF froze every other user's
+SSE stream until it finished. parse_file hands those parsers to this service instead:
+a fixed set of worker processes, each driven by its own dispatcher thread, which
+
+- are started with "spawn" (no inherited threads, locks or database connections),
+- run under an address-space cap (PARSER_MEMORY_LIMIT_MB) so a pathological file fails
+  its own job with MemoryError instead of exhausting the host,
+- are replaced after PARSER_MAX_JOBS_PER_WORKER jobs (parsers leak - caches, fragmented
+  heaps), and
+- are killed when a job runs longer than PARSER_TIMEOUT_SECONDS.
+
+The timeout starts when a worker picks the job up, so time spent waiting behind other
+uploads doesn't count, and only the stuck job's own worker is killed. (A
+ProcessPoolExecutor can't do either: its futures only time out from submission, and
+one dead worker breaks the whole pool, failing every other job in it.)
+
+At most PARSER_MAX_QUEUE jobs are accepted at once; beyond that run() raises
+ParsingQueueFull so the caller can answer 503 instead of queueing unbounded work.
+With PARSER_POOL_ENABLED=false, jobs run in worker threads (off the event loop, but
+sharing the GIL).
+"""
+
+import asyncio
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+from .config import (
+    PARSER_POOL_ENABLED, PARSER_WORKERS, PARSER_TIMEOUT_SECONDS, PARSER_MEMORY_LIMIT_MB,
+    PARSER_MAX_JOBS_PER_WORKER, PARSER_MAX_QUEUE,
+)
+
+# How often a running job checks whether its caller was cancelled
+_CANCEL_POLL_SECONDS = 0.25
+
+
+class ParsingQueueFull(Exception):
+    """More parse jobs are in flight than PARSER_MAX_QUEUE allows."""
+
+
+class ParsingTimeout(Exception):
+    """A parse job ran longer than the per-job timeout (its worker was killed)."""
+
+
+def _limit_worker_memory(limit_mb: int):
+    """Worker process start-up: cap its address space."""
+    if limit_mb <= 0:
+        return
+    try:
+        import resource
+        limit = limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass  # Not supported on this platform (e.g. Windows) - run uncapped
+
+
+def _worker_main(conn, memory_limit_mb: int):
+    """Worker process: run (function, args) jobs received on conn until it is closed."""
+    _limit_worker_memory(memory_limit_mb)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        function, args = job
+        try:
+            reply = (True, function(*args))
+        except BaseException as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception as e:  # result or exception that can't be pickled
+            conn.send((False, RuntimeError(f"{type(e).__name__}: {e}")))
+
+
+class _Worker:
+    """One parser process and the parent's end of its pipe."""
+
+    def __init__(self, memory_limit_mb: int):
+        context = multiprocessing.get_context("spawn")
+        self.conn, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child, memory_limit_mb), daemon=True)
+        self.process.start()
+        child.close()
+        self.jobs = 0
+
+    def stop(self, kill: bool = False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        self.conn.close()
+        self.process.join(timeout=5)
+
+
+class ParsingService:
+    """Bounded process pool with per-job timeouts, worker recycling and queue metrics."""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        timeout: float = 120.0,
+        memory_limit_mb: int = 1024,
+        max_jobs_per_worker: int = 50,
+        max_queue: int = 32,
+        use_processes: bool = True,
+    ):
+        """
+        Args:
+            workers: Worker processes
+            timeout: Seconds a job may run (once a worker picks it up) before its worker is killed
+            memory_limit_mb: Address-space cap per worker (0 = none)
+            max_jobs_per_worker: Jobs before a worker is replaced
+            max_queue: Most jobs accepted at once (running + waiting)
+            use_processes: False runs jobs in threads instead
+        """
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_jobs_per_worker = max(1, max_jobs_per_worker)
+        self.max_queue = max(1, max_queue)
+        self.use_processes = use_processes
+        # One dispatcher thread per worker process: a queued job waits for a free thread
+        self._threads: Optional[ThreadPoolExecutor] = None
+        self._local = threading.local()
+        self._workers: Set[_Worker] = set()
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._stats = {
+            "jobs": 0, "failures": 0, "timeouts": 0, "rejected": 0, "workers_started": 0, "workers_killed": 0,
+            "max_queue_depth": 0, "parse_seconds": 0.0, "max_parse_seconds": 0.0, "max_wait_seconds": 0.0,
+        }
+
+    def _get_threads(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser")
+            return self._threads
+
+    def _retire(self, worker: _Worker, kill: bool = False):
+        with self._lock:
+            self._workers.discard(worker)
+        if kill:
+            self._stats["workers_killed"] += 1
+        worker.stop(kill=kill)
+
+    def _worker(self) -> _Worker:
+        """This dispatcher thread's worker process (replaced when dead or due for recycling)."""
+        worker = getattr(self._local, "worker", None)
+        if worker is not None and (not worker.process.is_alive() or worker.jobs >= self.max_jobs_per_worker):
+            self._retire(worker)
+            worker = None
+        if worker is None:
+            worker = self._local.worker = _Worker(self.memory_limit_mb)
+            with self._lock:
+                self._workers.add(worker)
+            self._stats["workers_started"] += 1
+        return worker
+
+    def _execute(
+        self, function: Callable, args: Tuple[Any, ...], submitted: float, cancelled: threading.Event
+    ) -> Tuple[bool, Any]:
+        """Run one job on this thread's worker process (blocking); its timeout starts here."""
+        started = time.perf_counter()
+        self._stats["max_wait_seconds"] = max(self._stats["max_wait_seconds"], started - submitted)
+        if cancelled.is_set():
+            return False, asyncio.CancelledError()
+        worker = self._worker()
+        worker.jobs += 1
+        try:
+            worker.conn.send((function, args))
+            deadline = started + self.timeout
+            while not worker.conn.poll(max(0.0, min(_CANCEL_POLL_SECONDS, deadline - time.perf_counter()))):
+                if cancelled.is_set():
+                    # Nobody awaits the result any more - free the worker for queued jobs
+                    self._local.worker = None
+                    self._retire(worker, kill=True)
+                    return False, asyncio.CancelledError()
+                if time.perf_counter() >= deadline:
+                    self._stats["timeouts"] += 1
+                    self._local.worker = None
+                    self._retire(worker, kill=True)
+                    raise ParsingTimeout(f"parsing took longer than {self.timeout:.0f}s")
+            return worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died mid-job (e.g. killed by the OS) - only this job is lost
+            self._local.worker = None
+            self._retire(worker, kill=True)
+            raise BrokenProcessPool("parser worker exited unexpectedly")
+        finally:
+            elapsed = time.perf_counter() - started
+            self._stats["parse_seconds"] += elapsed
+            self._stats["max_parse_seconds"] = max(self._stats["max_parse_seconds"], elapsed)
+
+    async def run(self, function: Callable, *args: Any) -> Any:
+        """
+        Run function(*args) in a worker and await its result.
+
+        Args:
+            function: Module-level (picklable) function
+            *args: Picklable arguments
+
+        Returns:
+            The function's return value
+
+        Raises:
+            ParsingQueueFull: PARSER_MAX_QUEUE jobs are already in flight
+            ParsingTimeout: The job exceeded the timeout
+        """
+        if self._in_flight >= self.max_queue:
+            self._stats["rejected"] += 1
+            raise ParsingQueueFull(f"{self._in_flight} parse jobs in flight")
+        self._in_flight += 1
+        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._in_flight)
+        try:
+            if not self.use_processes:
+                started = time.perf_counter()
+                try:
+                    return await asyncio.wait_for(asyncio.to_thread(function, *args), self.timeout)
+                except asyncio.TimeoutError:
+                    self._stats["timeouts"] += 1
+                    raise ParsingTimeout(f"parsing took longer than {self.timeout:.0f}s")
+                finally:
+                    elapsed = time.perf_counter() - started
+                    self._stats["parse_seconds"] += elapsed
+                    self._stats["max_parse_seconds"] = max(self._stats["max_parse_seconds"], elapsed)
+            cancelled = threading.Event()
+            try:
+                ok, value = await asyncio.get_running_loop().run_in_executor(
+                    self._get_threads(), self._execute, function, args, time.perf_counter(), cancelled
+                )
+            except asyncio.CancelledError:
+                cancelled.set()  # a running job's worker is killed, a queued one is skipped
+                raise
+            if not ok:
+                raise value
+            return value
+        except Exception:
+            self._stats["failures"] += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self._stats["jobs"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["in_flight"] = self._in_flight
+        stats["waiting"] = max(0, self._in_flight - self.workers) if self.use_processes else 0
+        stats["workers"] = self.workers if self.use_processes else 0
+        stats["avg_parse_seconds"] = round(stats["parse_seconds"] / stats["jobs"], 3) if stats["jobs"] else 0.0
+        stats["parse_seconds"] = round(stats["parse_seconds"], 3)
+        stats["max_parse_seconds"] = round(stats["max_parse_seconds"], 3)
+        return stats
+
+    def close(self):
+        """Stop the worker processes (app shutdown)."""
+        with self._lock:
+            threads, self._threads = self._threads, None
+            workers, self._workers = list(self._workers), set()
+        if threads is not None:
+            threads.shutdown(wait=False, cancel_futures=True)
+        for worker in workers:
+            worker.stop(kill=True)
+
+
+_service: Optional[ParsingService] = None
+
+
+def get_service() -> ParsingService:
+    """The process-wide parsing service."""
+    global _service
+    if _service is None:
+        _service = ParsingService(
+            workers=PARSER_WORKERS,
+            timeout=PARSER_TIMEOUT_SECONDS,
+            memory_limit_mb=PARSER_MEMORY_LIMIT_MB,
+            max_jobs_per_worker=PARSER_MAX_JOBS_PER_WORKER,
+            max_queue=PARSER_MAX_QUEUE,
+            use_processes=PARSER_POOL_ENABLED,
+        )
+    return _service
+
+
+async def run(function: Callable, *args: Any) -> Any:
+    """Run a parse job on the process-wide service (see ParsingService.run)."""
+    return await get_service().run(function, *args)
+
+
+def get_stats() -> Dict[str, Any]:
+    if _service is None:
+        return {"enabled": PARSER_POOL_ENABLED, "jobs": 0}
+    return {"enabled": _service.use_processes, **_service.get_stats()}
+
+
+def close():
+    global _service
+    if _service is not None:
+        _service.close()
+        print("[PARSER] Worker processes stopped", file=sys.stderr, flush=True)
+    _service = None
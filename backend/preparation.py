@@ -130,7 +130,7 @@ The user already discussed the following in the previous round. Do NOT re-ask qu
         user_content += f"\n\n## Attached content (use this in your guidance):{doc_content_section}"
     messages.append({"role": "user", "content": user_content})
     
-    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0)
+    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0, stage="preparation")
     if response is None:
         return None
     
@@ -45,7 +45,7 @@ Keep your responses concise and focused on prompt refinement."""
     messages.append({"role": "user", "content": user_message})
     
     # Query the prompt engineering model
-    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0)
+    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0, stage="prompt_engineering")
     
     if response is None:
         return None
@@ -83,8 +83,9 @@ Return ONLY the finalized prompt text, without any additional commentary or expl
         "content": "Based on our conversation, please generate the final, refined prompt that captures what I want to achieve. Return only the prompt text."
     })
     
-    # Query the prompt engineering model
-    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0)
+    # Query the prompt engineering model (memoized - re-invoking on an unchanged history
+    # returns the same suggestion without another upstream call)
+    response = await query_model(PROMPT_ENGINEERING_MODEL, messages, timeout=60.0, cache_ttl=600, stage="prompt_engineering")
     
     if response is None:
         return None
@@ -1,9 +1,313 @@
 """RAG (Retrieval-Augmented Generation) system for intelligent document retrieval."""
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, defaultdict
+from functools import lru_cache
+import asyncio
+import hashlib
+import heapq
+import json
+import math
 import re
+import sys
+import threading
+import zlib
 from .openrouter import query_model
-from .config import CONTEXT_ENGINEERING_MODEL
+from .config import (
+    CONTEXT_ENGINEERING_MODEL, RAG_BM25_K1, RAG_BM25_B, RAG_INDEX_CACHE_SIZE,
+    RAG_RETRIEVAL_MODE, RAG_EMBEDDING_MODEL, RAG_EMBEDDING_DIM,
+    RAG_RERANK_CANDIDATES, RAG_RERANK_BATCH_SIZE, RAG_RERANK_CONCURRENCY,
+    RAG_RERANK_BUDGET_SECONDS, RAG_RERANK_CACHE_SIZE,
+)
+
+# NumPy is needed for dense/hybrid retrieval; without it retrieval stays BM25-only
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Common words that carry no retrieval signal
+STOP_WORDS = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'should', 'could', 'may', 'might', 'must', 'can', 'what', 'how', 'why', 'when', 'where', 'who', 'which'}
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens without stop words (whole words - "art" does not match "start")."""
+    return [t for t in _TOKEN_RE.findall(text.lower()) if len(t) > 1 and t not in STOP_WORDS]
+
+
+class BM25Index:
+    """
+    Inverted index over chunk texts with Okapi BM25 scoring.
+
+    Texts are tokenized once when added; a query only touches the postings of its own
+    terms, so search cost depends on how often the query words occur, not on the total
+    attachment size. Chunks are identified by position (order of add()).
+    """
+
+    def __init__(self, k1: float = RAG_BM25_K1, b: float = RAG_BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.lengths: List[int] = []
+        self.total_length = 0
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)  # term -> [(position, term frequency)]
+
+    def add(self, text: str):
+        position = len(self.lengths)
+        terms = Counter(tokenize(text))
+        length = sum(terms.values())
+        self.lengths.append(length)
+        self.total_length += length
+        for term, freq in terms.items():
+            self.postings[term].append((position, freq))
+
+    def scores(self, query: str) -> Dict[int, float]:
+        """
+        Scores of every chunk matching a query term, normalized to 0.0-1.0.
+
+        A chunk that contains every query term once at average length scores ~1.0, one
+        that matches terms holding 30% of the query's IDF weight ~0.3 - the same scale
+        as the keyword scores this replaced, so relevance thresholds keep their meaning.
+        """
+        count = len(self.lengths)
+        terms = set(tokenize(query))
+        if not count or not terms:
+            return {}
+        avg_length = self.total_length / count or 1.0
+        scores: Dict[int, float] = defaultdict(float)
+        idf_total = 0.0
+        for term in terms:
+            postings = self.postings.get(term, ())
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            idf_total += idf
+            for position, freq in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / avg_length)
+                scores[position] += idf * freq * (self.k1 + 1) / (freq + norm)
+        if idf_total <= 0:
+            return {}
+        return {position: min(1.0, score / idf_total) for position, score in scores.items()}
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Best-matching (position, score) pairs, highest first."""
+        return heapq.nlargest(top_k, self.scores(query).items(), key=lambda item: item[1])
+
+
+@lru_cache(maxsize=200_000)
+def _token_features(token: str, dim: int) -> "np.ndarray":
+    """
+    Hashed feature slots of one token: the word itself plus its character trigrams.
+
+    crc32, not hash(): the builtin is salted per process (PYTHONHASHSEED), so vectors
+    would differ between restarts and between the app and its worker processes.
+    """
+    padded = f" {token} "
+    slots = [zlib.crc32(token.encode("utf-8", "surrogatepass")) % dim] + [
+        zlib.crc32(padded[i:i + 3].encode("utf-8", "surrogatepass")) % dim for i in range(len(padded) - 2)
+    ]
+    return np.asarray(slots, dtype=np.int64)
+
+
+def _hash_embedding(text: str, dim: int) -> "np.ndarray":
+    """
+    Feature-hashed bag of words and character trigrams, L2-normalized.
+
+    Needs no model download. Trigrams make inflections and compounds overlap
+    ("museum"/"museums", "database"/"databases") where exact keywords miss; real
+    synonyms need an embedding model (RAG_EMBEDDING_MODEL).
+    """
+    counts = Counter(tokenize(text))
+    if not counts:
+        return np.zeros(dim, dtype=np.float32)
+    features = [_token_features(token, dim) for token in counts]
+    weights = np.repeat(np.sqrt(np.fromiter(counts.values(), dtype=np.float64)), [len(f) for f in features])  # damp repeated terms
+    vector = np.bincount(np.concatenate(features), weights=weights, minlength=dim).astype(np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+_embedding_model = None
+_embedding_model_loaded = False
+_embedding_model_lock = threading.Lock()
+
+
+def _get_embedding_model():
+    """The RAG_EMBEDDING_MODEL sentence-transformers model, or None for hashing embeddings."""
+    global _embedding_model, _embedding_model_loaded
+    if _embedding_model_loaded:
+        return _embedding_model
+    with _embedding_model_lock:
+        if not _embedding_model_loaded:
+            if RAG_EMBEDDING_MODEL:
+                try:
+                    from sentence_transformers import SentenceTransformer
+                    _embedding_model = SentenceTransformer(RAG_EMBEDDING_MODEL, device="cpu")
+                    print(f"[RAG] Loaded embedding model {RAG_EMBEDDING_MODEL}", file=sys.stderr, flush=True)
+                except Exception as e:
+                    print(f"[RAG] Embedding model {RAG_EMBEDDING_MODEL} unavailable ({e}); using hashing embeddings", file=sys.stderr, flush=True)
+            _embedding_model_loaded = True
+    return _embedding_model
+
+
+def embed_texts(texts: List[str]) -> "np.ndarray":
+    """
+    Embed texts on the CPU.
+
+    Args:
+        texts: Texts to embed
+
+    Returns:
+        float32 matrix of shape (len(texts), dim) with L2-normalized rows
+    """
+    model = _get_embedding_model()
+    if model is not None:
+        return np.asarray(model.encode(texts, batch_size=32, normalize_embeddings=True), dtype=np.float32)
+    matrix = np.empty((len(texts), RAG_EMBEDDING_DIM), dtype=np.float32)
+    for row, text in enumerate(texts):
+        matrix[row] = _hash_embedding(text, RAG_EMBEDDING_DIM)
+    return matrix
+
+
+def _top_k(scores: "np.ndarray", k: int) -> "np.ndarray":
+    """Indices of the k highest scores, highest first (argpartition, then sort only those k)."""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+
+class DenseIndex:
+    """
+    Chunk embeddings in one contiguous float32 matrix (one row per position).
+
+    A query is one matrix-vector product over all rows - cosine similarity, since rows
+    and query are normalized - followed by an argpartition top-k.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self._matrix: Optional["np.ndarray"] = None
+
+    def add_many(self, texts: List[str]):
+        if not texts:
+            return
+        vectors = embed_texts(texts)
+        needed = self.size + len(texts)
+        if self._matrix is None or needed > len(self._matrix):
+            # Grow geometrically so incremental adds stay amortized O(1) per row
+            capacity = max(needed, 2 * (len(self._matrix) if self._matrix is not None else 0), 64)
+            grown = np.zeros((capacity, vectors.shape[1]), dtype=np.float32)
+            if self._matrix is not None:
+                grown[:self.size] = self._matrix[:self.size]
+            self._matrix = grown
+        self._matrix[self.size:needed] = vectors
+        self.size = needed
+
+    def scores(self, query: str) -> "np.ndarray":
+        """Cosine similarity of every chunk to the query, clipped to 0.0-1.0."""
+        if not self.size:
+            return np.zeros(0, dtype=np.float32)
+        query_vector = embed_texts([query])[0]
+        return np.clip(self._matrix[:self.size] @ query_vector, 0.0, 1.0)
+
+    def search(self, query: str, top_k: int) -> List[Tuple[int, float]]:
+        """Best-matching (position, score) pairs, highest first."""
+        scores = self.scores(query)
+        return [(int(i), float(scores[i])) for i in _top_k(scores, top_k) if scores[i] > 0]
+
+
+class ChunkIndex:
+    """
+    The retrievable chunks of one conversation: a BM25 index, plus a dense index that
+    is built on the first dense/hybrid query and then kept in step with new chunks.
+    """
+
+    def __init__(self):
+        self.chunks: List[Dict[str, Any]] = []
+        self.keys: Dict[Any, int] = {}  # chunk_id (persisted chunks) -> position
+        self.bm25 = BM25Index()
+        self.dense: Optional[DenseIndex] = None
+        self.lock = threading.Lock()
+
+    def add_many(self, chunks: List[Dict[str, Any]]):
+        for chunk in chunks:
+            if chunk.get('chunk_id') is not None:
+                self.keys[chunk['chunk_id']] = len(self.chunks)
+            self.chunks.append(chunk)
+            self.bm25.add(chunk.get('text', ''))
+        if self.dense is not None:
+            self.dense.add_many([chunk.get('text', '') for chunk in chunks])
+
+    def search(self, query: str, top_k: int, mode: str = "bm25") -> List[Tuple[int, float]]:
+        """
+        Best-matching (position, score) pairs, highest first.
+
+        Args:
+            query: The query text
+            top_k: Number of results
+            mode: "bm25", "dense", or "hybrid" (both scores fused as 1 - (1 - bm25)(1 - dense):
+                a chunk ranks at least as high as either retriever puts it, higher when both agree)
+        """
+        if mode not in ("dense", "hybrid") or np is None:
+            return self.bm25.search(query, top_k)
+        if self.dense is None:
+            self.dense = DenseIndex()
+            self.dense.add_many([chunk.get('text', '') for chunk in self.chunks])
+        if mode == "dense":
+            return self.dense.search(query, top_k)
+        missed = 1.0 - self.dense.scores(query)
+        for position, score in self.bm25.scores(query).items():
+            missed[position] *= 1.0 - score
+        fused = 1.0 - missed
+        return [(int(i), float(fused[i])) for i in _top_k(fused, top_k) if fused[i] > 0]
+
+
+# Per-conversation indexes over persisted chunks, extended as new chunks arrive
+_index_cache: "OrderedDict[str, ChunkIndex]" = OrderedDict()
+_index_cache_lock = threading.Lock()
+
+
+def get_index(chunks: List[Dict[str, Any]], index_key: Optional[str] = None) -> ChunkIndex:
+    """
+    Index over chunks. With index_key (a conversation id) the index is cached and only
+    chunks it hasn't seen are indexed; it is rebuilt if any indexed chunk is gone.
+    Callers hold index.lock while adding to or searching it.
+    """
+    cacheable = bool(index_key) and all(chunk.get('chunk_id') is not None for chunk in chunks)
+    with _index_cache_lock:
+        index = _index_cache.get(index_key) if cacheable else None
+        if index is not None and not {chunk['chunk_id'] for chunk in chunks}.issuperset(index.keys):
+            index = None
+        if index is None:
+            index = ChunkIndex()
+        if cacheable:
+            _index_cache[index_key] = index
+            _index_cache.move_to_end(index_key)
+            while len(_index_cache) > RAG_INDEX_CACHE_SIZE:
+                _index_cache.popitem(last=False)
+    return index
+
+
+def update_index(chunks: List[Dict[str, Any]], index_key: Optional[str] = None) -> ChunkIndex:
+    """Index over chunks with the ones it hasn't seen added (see get_index)."""
+    index = get_index(chunks, index_key)
+    with index.lock:
+        index.add_many([chunk for chunk in chunks if chunk.get('chunk_id') is None or chunk['chunk_id'] not in index.keys])
+    return index
+
+
+def _rank_chunks(
+    query: str,
+    chunks: List[Dict[str, Any]],
+    top_k: int,
+    mode: str,
+    index_key: Optional[str]
+) -> List[Dict[str, Any]]:
+    index = update_index(chunks, index_key)
+    with index.lock:
+        return [{**index.chunks[position], 'relevance_score': score} for position, score in index.search(query, top_k, mode)]
 
 
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[Dict[str, Any]]:
@@ -109,6 +413,16 @@ def chunk_file(file_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         if 'slide_count' in file_data:
             chunk['slide_count'] = file_data['slide_count']
     
+    # PDFs carry page offsets: record which pages each chunk spans so answers can cite them
+    pages = [page for page in file_data.get('pages') or [] if page['end_char'] > page['start_char']]
+    if pages:
+        starts = [page['start_char'] for page in pages]
+        for chunk in chunks:
+            first = max(0, bisect_right(starts, chunk['start_char']) - 1)
+            last = max(first, bisect_left(starts, chunk['end_char']) - 1)
+            chunk['page_start'] = pages[first]['page']
+            chunk['page_end'] = pages[last]['page']
+    
     return chunks
 
 
@@ -136,6 +450,20 @@ def chunk_link(link_data: Dict[str, Any]) -> List[Dict[str, Any]]:
     return chunks
 
 
+def chunk_attachment(kind: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Chunk a stored attachment by kind ("document", "file" or "link").
+
+    Storage calls this once when the attachment is added and persists the result,
+    so packaging doesn't re-chunk every attachment.
+    """
+    if kind == "document":
+        return chunk_document(data)
+    if kind == "link":
+        return chunk_link(data)
+    return chunk_file(data)
+
+
 async def score_chunk_relevance(chunk: Dict[str, Any], query: str) -> float:
     """
     Score a chunk's relevance to the query using LLM-based scoring.
@@ -152,43 +480,148 @@ async def score_chunk_relevance(chunk: Dict[str, Any], query: str) -> float:
         return 0.0
     
     # Use LLM to score relevance (more accurate than keyword matching)
-    prompt = f"""You are evaluating how relevant a text chunk is to a query. 
-    
+    try:
+        scores = await _score_batch([chunk], query, timeout=10.0)
+        if scores:
+            return scores[0]
+        
+        # Fallback: simple keyword matching if LLM fails
+        return simple_relevance_score(chunk_text, query)
+        
+    except Exception as e:
+        print(f"Error scoring chunk relevance: {e}")
+        # Fallback to simple keyword matching
+        return simple_relevance_score(chunk_text, query)
+
+
+# LLM re-rank scores by (chunk text hash, query hash): a chunk keeps its score across
+# packaging runs no matter which batch it lands in
+_rerank_cache: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+_rerank_semaphore: Optional[asyncio.Semaphore] = None
+_rerank_semaphore_loop = None
+
+
+def _text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest()
+
+
+def _get_rerank_semaphore() -> asyncio.Semaphore:
+    """Process-wide cap on concurrent re-rank calls (one semaphore per event loop)."""
+    global _rerank_semaphore, _rerank_semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _rerank_semaphore is None or _rerank_semaphore_loop is not loop:
+        _rerank_semaphore = asyncio.Semaphore(RAG_RERANK_CONCURRENCY)
+        _rerank_semaphore_loop = loop
+    return _rerank_semaphore
+
+
+def parse_score_array(content: str, count: int) -> Optional[List[float]]:
+    """
+    Parse the JSON array of scores from a re-rank response.
+
+    Args:
+        content: Model response (may wrap the array in prose or a code fence)
+        count: Number of scores expected
+
+    Returns:
+        Scores clamped to 0.0-1.0, or None if no array of count numbers is found
+    """
+    match = re.search(r"\[[^\[\]]*\]", content or "")
+    if not match:
+        return None
+    try:
+        values = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return None
+    if len(values) != count or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+        return None
+    return [max(0.0, min(1.0, float(v))) for v in values]
+
+
+async def _score_batch(chunks: List[Dict[str, Any]], query: str, timeout: float) -> Optional[List[float]]:
+    """Score a batch of chunks against the query in one LLM call."""
+    passages = "\n\n".join(
+        f"[{i}]\n{chunk.get('text', '')[:1000]}" for i, chunk in enumerate(chunks, 1)
+    )
+    prompt = f"""You are evaluating how relevant each text passage is to a query.
+
 Query: {query[:500]}
 
-Text Chunk:
-{chunk_text[:1000]}
+Passages:
+{passages}
 
-Rate the relevance on a scale of 0.0 to 1.0, where:
+Rate each passage's relevance on a scale of 0.0 to 1.0, where:
 - 1.0 = Highly relevant, directly addresses the query
 - 0.7-0.9 = Moderately relevant, provides useful context
 - 0.4-0.6 = Somewhat relevant, tangentially related
 - 0.1-0.3 = Minimally relevant, very little connection
 - 0.0 = Not relevant
 
-Respond with ONLY a single number between 0.0 and 1.0 (no explanation, just the number):"""
+Respond with ONLY a JSON array of {len(chunks)} numbers, one per passage in order (e.g. [0.8, 0.1, ...]):"""
 
-    try:
-        messages = [{"role": "user", "content": prompt}]
-        response = await query_model(CONTEXT_ENGINEERING_MODEL, messages, timeout=10.0)
-        
-        if response and 'content' in response:
-            # Extract numeric score from response
-            score_text = response['content'].strip()
-            # Try to find a float in the response
-            match = re.search(r'([0-9]*\.?[0-9]+)', score_text)
-            if match:
-                score = float(match.group(1))
-                # Ensure score is between 0 and 1
-                return max(0.0, min(1.0, score))
-        
-        # Fallback: simple keyword matching if LLM fails
-        return simple_relevance_score(chunk_text, query)
-        
-    except Exception as e:
-        print(f"Error scoring chunk relevance: {e}")
-        # Fallback to simple keyword matching
-        return simple_relevance_score(chunk_text, query)
+    messages = [{"role": "user", "content": prompt}]
+    async with _get_rerank_semaphore():
+        response = await query_model(CONTEXT_ENGINEERING_MODEL, messages, timeout=timeout, stage="rag_rerank")
+    if not response:
+        return None
+    return parse_score_array(response.get('content', ''), len(chunks))
+
+
+async def rerank_chunks(
+    chunks: List[Dict[str, Any]],
+    query: str,
+    budget: float = RAG_RERANK_BUDGET_SECONDS
+) -> int:
+    """
+    Blend LLM relevance scores into the chunks' relevance_score (in place).
+
+    Chunks not in the score cache are split into batches of RAG_RERANK_BATCH_SIZE, each
+    scored by one LLM call returning a JSON array; batches run concurrently (at most
+    RAG_RERANK_CONCURRENCY calls in flight process-wide). Batches that fail or are still
+    running when the latency budget runs out leave their chunks' local scores as they are.
+
+    Args:
+        chunks: Chunks with a 'relevance_score' from local ranking
+        query: The query text
+        budget: Seconds to wait for the re-rank calls
+
+    Returns:
+        Number of chunks whose score was blended with an LLM score
+    """
+    query_hash = _text_hash(query)
+    rescored = 0
+    pending: List[Tuple[Dict[str, Any], Tuple[str, str]]] = []
+    for chunk in chunks:
+        key = (_text_hash(chunk.get('text', '')), query_hash)
+        if key in _rerank_cache:
+            _rerank_cache.move_to_end(key)
+            # Blend local and LLM scores (weighted average)
+            chunk['relevance_score'] = chunk['relevance_score'] * 0.4 + _rerank_cache[key] * 0.6
+            rescored += 1
+        else:
+            pending.append((chunk, key))
+    if not pending:
+        return rescored
+
+    batches = [pending[i:i + RAG_RERANK_BATCH_SIZE] for i in range(0, len(pending), RAG_RERANK_BATCH_SIZE)]
+    tasks = [asyncio.create_task(_score_batch([chunk for chunk, _ in batch], query, budget)) for batch in batches]
+    done, not_done = await asyncio.wait(tasks, timeout=budget)
+    for task in not_done:
+        task.cancel()
+
+    for batch, task in zip(batches, tasks):
+        if task not in done or task.exception() is not None or task.result() is None:
+            continue
+        for (chunk, key), score in zip(batch, task.result()):
+            _rerank_cache[key] = score
+            chunk['relevance_score'] = chunk['relevance_score'] * 0.4 + score * 0.6
+            rescored += 1
+    while len(_rerank_cache) > RAG_RERANK_CACHE_SIZE:
+        _rerank_cache.popitem(last=False)
+
+    if rescored < len(chunks):
+        print(f"[RAG] Re-ranked {rescored}/{len(chunks)} chunks (rest keep local scores; {len(not_done)} batches over the {budget}s budget)", file=sys.stderr, flush=True)
+    return rescored
 
 
 def simple_relevance_score(chunk_text: str, query: str) -> float:
@@ -202,25 +635,19 @@ def simple_relevance_score(chunk_text: str, query: str) -> float:
     Returns:
         Relevance score from 0.0 to 1.0
     """
-    chunk_lower = chunk_text.lower()
-    query_lower = query.lower()
-    
-    # Extract meaningful words from query (skip common words)
-    stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'should', 'could', 'may', 'might', 'must', 'can', 'what', 'how', 'why', 'when', 'where', 'who', 'which'}
-    query_words = [w for w in query_lower.split() if len(w) > 2 and w not in stop_words]
-    
+    query_words = set(tokenize(query))
     if not query_words:
         return 0.5  # Default score if no meaningful words
     
-    # Count matches
-    matches = sum(1 for word in query_words if word in chunk_lower)
+    chunk_terms = Counter(tokenize(chunk_text))
+    matches = sum(1 for word in query_words if word in chunk_terms)
     
     # Calculate score based on match ratio
     score = matches / len(query_words)
     
     # Boost score if important keywords appear multiple times
     if matches > 0:
-        total_occurrences = sum(chunk_lower.count(word) for word in query_words)
+        total_occurrences = sum(chunk_terms[word] for word in query_words)
         boost = min(0.3, total_occurrences / 100)  # Cap boost at 0.3
         score = min(1.0, score + boost)
     
@@ -234,14 +661,18 @@ async def retrieve_relevant_chunks(
     links: List[Dict[str, Any]],
     top_k: int = 10,
     relevance_threshold: float = 0.3,
-    use_llm_scoring: bool = False
+    use_llm_scoring: bool = False,
+    chunks: Optional[List[Dict[str, Any]]] = None,
+    index_key: Optional[str] = None,
+    mode: Optional[str] = None
 ) -> List[Dict[str, Any]]:
     """
     Retrieve the most relevant chunks from all documents, files, and links.
     
     Uses a hybrid approach:
-    1. First, use fast keyword-based scoring to filter chunks
-    2. Optionally, use LLM-based scoring for top candidates (more accurate but slower)
+    1. First, rank chunks locally (BM25, dense embeddings, or both) to filter chunks
+    2. Optionally, use batched LLM scoring for top candidates (more accurate, bounded by
+       RAG_RERANK_BUDGET_SECONDS)
     
     Args:
         query: The query/prompt to match against
@@ -250,70 +681,53 @@ async def retrieve_relevant_chunks(
         links: List of link dicts
         top_k: Maximum number of chunks to retrieve
         relevance_threshold: Minimum relevance score to include
-        use_llm_scoring: Whether to use LLM for final scoring (slower but more accurate)
+        use_llm_scoring: Whether to blend in LLM re-rank scores for the top candidates
+        chunks: Pre-computed chunks of the attachments (storage's persisted chunk index);
+            when None, documents/files/links are chunked here
+        index_key: Cache the chunk index under this key (conversation id) and extend it
+            incrementally on later calls
+        mode: "bm25", "dense" or "hybrid" (default RAG_RETRIEVAL_MODE)
         
     Returns:
         List of relevant chunks sorted by relevance (highest first)
     """
-    all_chunks = []
-    
-    # Chunk all documents
-    for doc in documents:
-        chunks = chunk_document(doc)
-        all_chunks.extend(chunks)
-    
-    # Chunk all files
-    for file_data in files:
-        chunks = chunk_file(file_data)
-        all_chunks.extend(chunks)
-    
-    # Chunk all links
-    for link_data in links:
-        chunks = chunk_link(link_data)
-        all_chunks.extend(chunks)
+    if chunks is not None:
+        all_chunks = chunks
+    else:
+        all_chunks = []
+        for doc in documents:
+            all_chunks.extend(chunk_document(doc))
+        for file_data in files:
+            all_chunks.extend(chunk_file(file_data))
+        for link_data in links:
+            all_chunks.extend(chunk_link(link_data))
     
     if not all_chunks:
         return []
     
-    # Step 1: Fast keyword-based scoring for all chunks
-    scored_chunks = []
-    for chunk in all_chunks:
-        score = simple_relevance_score(chunk.get('text', ''), query)
-        if score >= relevance_threshold:
-            scored_chunks.append({
-                **chunk,
-                'relevance_score': score
-            })
-    
-    # Sort by keyword relevance (highest first)
-    scored_chunks.sort(key=lambda x: x['relevance_score'], reverse=True)
+    # Step 1: Local ranking, off the event loop (indexing/embedding a large set takes a while)
+    candidates = max(top_k, RAG_RERANK_CANDIDATES if use_llm_scoring else top_k)
+    ranked = await asyncio.to_thread(_rank_chunks, query, all_chunks, candidates, mode or RAG_RETRIEVAL_MODE, index_key)
+    scored_chunks = [chunk for chunk in ranked if chunk['relevance_score'] >= relevance_threshold]
     
     # Step 2: If LLM scoring is enabled, re-score top candidates for better accuracy
     if use_llm_scoring and scored_chunks:
-        # Only re-score top candidates (e.g., top 20) to save time and API calls
-        candidates_to_rescore = min(20, len(scored_chunks))
-        top_candidates = scored_chunks[:candidates_to_rescore]
-        
-        # Re-score with LLM
-        rescored = []
-        for chunk in top_candidates:
-            llm_score = await score_chunk_relevance(chunk, query)
-            # Blend keyword and LLM scores (weighted average)
-            blended_score = (chunk['relevance_score'] * 0.4) + (llm_score * 0.6)
-            chunk['relevance_score'] = blended_score
-            rescored.append(chunk)
-        
-        # Keep the rest with their keyword scores
-        remaining = scored_chunks[candidates_to_rescore:]
-        
-        # Combine and re-sort
-        scored_chunks = rescored + remaining
+        # Only re-score top candidates to save time and API calls; the rest keep local scores
+        await rerank_chunks(scored_chunks[:RAG_RERANK_CANDIDATES], query)
         scored_chunks.sort(key=lambda x: x['relevance_score'], reverse=True)
     
     # Return top K chunks
     return scored_chunks[:top_k]
 
 
+def retrieved_chunks_heading(count: int) -> str:
+    """Section heading format_retrieved_chunks puts above count chunks."""
+    return (
+        "\n\n---\n\n## RETRIEVED RELEVANT CONTEXT (RAG)\n\n"
+        f"*The following {count} most relevant chunks were retrieved from your attachments using RAG (Relevance scores shown):*\n\n"
+    )
+
+
 def format_retrieved_chunks(chunks: List[Dict[str, Any]]) -> str:
     """
     Format retrieved chunks into a readable string for inclusion in context.
@@ -327,8 +741,7 @@ def format_retrieved_chunks(chunks: List[Dict[str, Any]]) -> str:
     if not chunks:
         return ""
     
-    formatted = "\n\n---\n\n## RETRIEVED RELEVANT CONTEXT (RAG)\n\n"
-    formatted += f"*The following {len(chunks)} most relevant chunks were retrieved from your attachments using RAG (Relevance scores shown):*\n\n"
+    formatted = retrieved_chunks_heading(len(chunks))
     
     for i, chunk in enumerate(chunks, 1):
         doc_name = chunk.get('document_name', 'Unknown')
@@ -340,7 +753,10 @@ def format_retrieved_chunks(chunks: List[Dict[str, Any]]) -> str:
         formatted += f"{chunk_text}\n\n"
         
         # Add metadata if available
-        if 'page_count' in chunk:
+        if 'page_start' in chunk:
+            pages = f"page {chunk['page_start']}" if chunk['page_start'] == chunk['page_end'] else f"pages {chunk['page_start']}-{chunk['page_end']}"
+            formatted += f"*Source: {pages}" + (f" of {chunk['page_count']}*\n\n" if 'page_count' in chunk else "*\n\n")
+        elif 'page_count' in chunk:
             formatted += f"*Source: {chunk['page_count']} pages*\n\n"
         elif 'slide_count' in chunk:
             formatted += f"*Source: {chunk['slide_count']} slides*\n\n"
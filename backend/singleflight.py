@@ -0,0 +1,109 @@
+"""Single-flight request coalescing for identical concurrent async calls.
+
+When two browser tabs or a retrying client trigger the same LLM call at the same
+time, only the first caller (the leader) goes upstream; everyone else awaits the
+leader's shared future. The shared call is cancelled only once every waiter has
+gone away, so one disconnecting client does not fail the others.
+"""
+
+import asyncio
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import weakref
+from typing import Any, Awaitable, Callable, Dict, Iterable, TypeVar
+
+T = TypeVar("T")
+
+# Every SingleFlight group, for metrics
+_groups: "weakref.WeakSet[SingleFlight]" = weakref.WeakSet()
+
+
+class SingleFlight:
+    """A group of in-flight calls, deduplicated by key."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, list] = {}  # key -> [task, waiter_count]
+        self.stats = {"leaders": 0, "coalesced": 0}
+        _groups.add(self)
+
+    def in_flight(self) -> int:
+        """Number of distinct calls currently running."""
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() once per key at a time; concurrent callers with the same key share the result.
+
+        Followers receive a deep copy so no caller can mutate another caller's result.
+        """
+        entry = self._inflight.get(key)
+        leader = entry is None
+        if leader:
+            task = asyncio.ensure_future(fn())
+            entry = [task, 0]
+            self._inflight[key] = entry
+
+            def forget(t, key=key):
+                current = self._inflight.get(key)
+                if current is not None and current[0] is t:
+                    del self._inflight[key]
+
+            task.add_done_callback(forget)
+            self.stats["leaders"] += 1
+        else:
+            self.stats["coalesced"] += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            result = await asyncio.shield(task)
+        except asyncio.CancelledError:
+            # Cancel the shared call only when nobody is waiting for it any more
+            if not task.done() and entry[1] <= 1:
+                task.cancel()
+            raise
+        finally:
+            entry[1] -= 1
+        return result if leader else copy.deepcopy(result)
+
+
+def all_stats() -> Dict[str, Dict[str, int]]:
+    """Leader/coalesced counters for every SingleFlight group, by group name."""
+    return {group.name: {**group.stats, "in_flight": group.in_flight()} for group in _groups}
+
+
+def flight_key(name: str, **values: Any) -> str:
+    """Stable key for a call: sha256 of its name and JSON-serialized arguments."""
+    material = json.dumps({"call": name, "args": values}, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def coalesce(flight: SingleFlight, name: str, ignore: Iterable[str] = ()):
+    """
+    Decorator: coalesce concurrent calls to an async function with identical arguments.
+
+    Args:
+        flight: The SingleFlight group to run in
+        name: Call name, part of the key
+        ignore: Parameter names left out of the key (e.g. streaming callbacks -
+            followers get the final result, not the leader's token stream)
+    """
+    ignored = set(ignore)
+
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            values = {k: v for k, v in bound.arguments.items() if k not in ignored}
+            return await flight.do(flight_key(name, **values), lambda: fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,193 @@
+"""Single-writer queue with group commit for SQLite.
+
+SQLite allows one writer at a time. With concurrent deliberations every storage write
+competed for the database lock (and paid its own fsync), which showed up as
+"database is locked" errors and long commit latencies. Instead, storage_db write
+operations are queued to one writer thread. It takes everything that has queued up
+while the previous commit ran (up to SQLITE_WRITE_BATCH_MAX) and applies it in a single
+transaction - one lock acquisition and one commit for the whole batch. Readers don't
+go through the queue; with WAL they run concurrently with the writer.
+
+If a batched transaction fails (e.g. one write targets a deleted conversation), it is
+rolled back and each write is retried in its own transaction, so a bad write only
+fails its own caller.
+"""
+
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import SQLITE_WRITE_QUEUE_ENABLED, SQLITE_WRITE_BATCH_MAX
+
+
+class _Write:
+    __slots__ = ("operation", "args", "kwargs", "future")
+
+    def __init__(self, operation: Callable, args: Tuple, kwargs: Dict[str, Any]):
+        self.operation = operation
+        self.args = args
+        self.kwargs = kwargs
+        self.future: Future = Future()
+
+
+class GroupCommitWriter:
+    """One writer thread applying queued storage operations in batched transactions."""
+
+    def __init__(self, session_factory: Callable, max_batch: int = 64):
+        """
+        Args:
+            session_factory: Returns a new sync SQLAlchemy session
+            max_batch: Most writes applied in one transaction
+        """
+        self._sessions = session_factory
+        self.max_batch = max(1, max_batch)
+        self._queue: "queue.Queue[Optional[_Write]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._stats = {"writes": 0, "batches": 0, "max_batch": 0, "retried_batches": 0, "errors": 0, "commit_seconds": 0.0}
+
+    def submit(self, operation: Callable, *args: Any, **kwargs: Any) -> Future:
+        """
+        Queue operation(session, *args, **kwargs); the future resolves after it commits.
+
+        Returns:
+            Future with the operation's return value (or its exception)
+        """
+        self._ensure_started()
+        write = _Write(operation, args, kwargs)
+        self._queue.put(write)
+        return write.future
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name="sqlite-writer", daemon=True)
+                self._thread.start()
+
+    def _loop(self):
+        stopping = False
+        while not stopping:
+            first = self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            while len(batch) < self.max_batch:
+                try:
+                    write = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stopping = True
+                    break
+                batch.append(write)
+            batch = [w for w in batch if w.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                self._apply(batch)
+            except Exception as e:
+                # Failure outside an operation (e.g. no connection) - fail the batch, keep the writer alive
+                for write in batch:
+                    if not write.future.done():
+                        write.future.set_exception(e)
+
+    def _apply(self, batch: List[_Write]):
+        started = time.perf_counter()
+        failure: Optional[Exception] = None
+        db = self._sessions()
+        try:
+            results = [w.operation(db, *w.args, **w.kwargs) for w in batch]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            failure = e
+        finally:
+            db.close()
+
+        if failure is None:
+            self._record(len(batch), time.perf_counter() - started)
+            for write, result in zip(batch, results):
+                write.future.set_result(result)
+        elif len(batch) == 1:
+            self._stats["errors"] += 1
+            batch[0].future.set_exception(failure)
+        else:
+            # Isolate the failing write(s): retry each in its own transaction
+            self._stats["retried_batches"] += 1
+            for write in batch:
+                self._apply_one(write)
+
+    def _apply_one(self, write: _Write):
+        started = time.perf_counter()
+        db = self._sessions()
+        try:
+            result = write.operation(db, *write.args, **write.kwargs)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            self._stats["errors"] += 1
+            write.future.set_exception(e)
+            return
+        finally:
+            db.close()
+        self._record(1, time.perf_counter() - started)
+        write.future.set_result(result)
+
+    def _record(self, size: int, seconds: float):
+        self._stats["writes"] += size
+        self._stats["batches"] += 1
+        self._stats["max_batch"] = max(self._stats["max_batch"], size)
+        self._stats["commit_seconds"] += seconds
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch"] = round(stats["writes"] / stats["batches"], 2) if stats["batches"] else 0.0
+        stats["commit_seconds"] = round(stats["commit_seconds"], 3)
+        return stats
+
+    def close(self, timeout: float = 5.0):
+        """Apply what is already queued, then stop the writer thread."""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+
+_writer: Optional[GroupCommitWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_writer() -> Optional[GroupCommitWriter]:
+    """The process-wide writer for a SQLite database, or None (PostgreSQL, or the queue is disabled)."""
+    global _writer
+    if _writer is not None or not SQLITE_WRITE_QUEUE_ENABLED:
+        return _writer
+    from .database import get_database_url, get_session
+    if not get_database_url().startswith("sqlite"):
+        return None
+    with _writer_lock:
+        if _writer is None:
+            _writer = GroupCommitWriter(get_session, SQLITE_WRITE_BATCH_MAX)
+    return _writer
+
+
+def get_stats() -> Dict[str, Any]:
+    if _writer is None:
+        return {"enabled": False}
+    return {"enabled": True, **_writer.get_stats()}
+
+
+def close():
+    """Drain and stop the writer (app shutdown)."""
+    global _writer
+    if _writer is not None:
+        _writer.close()
+        print("[SQLITE] Write queue drained", file=sys.stderr, flush=True)
+    _writer = None
@@ -54,7 +54,8 @@ def create_conversation(
         round_number: Round number in chain (default: 1)
         prior_synthesis: Prior council synthesis for continuation rounds (default: None)
         prior_preparation_summary: Summary of prior preparation conversation (default: None)
-        **kwargs: Additional fields (e.g. title, prompt_engineering, context_engineering)
+        **kwargs: Additional fields (e.g. title, prompt_engineering, context_engineering,
+            attachments_from - a conversation whose ingested documents/files/links are copied)
 
     Returns:
         New conversation dict
@@ -87,6 +88,15 @@ def create_conversation(
         ),
     }
 
+    source = get_conversation(kwargs["attachments_from"]) if kwargs.get("attachments_from") else None
+    if source is not None:
+        source_context = source.get("context_engineering") or {}
+        context = conversation["context_engineering"]
+        for kind in ("documents", "files", "links"):
+            context[kind] = list(context.get(kind) or []) + [
+                item for item in source_context.get(kind) or [] if item.get("status") != "pending"
+            ]
+
     # Save to file
     path = get_conversation_path(conversation_id)
     with open(path, 'w') as f:
@@ -168,9 +178,14 @@ def save_conversation(conversation: Dict[str, Any]):
         json.dump(conversation, f, indent=2)
 
 
-def list_conversations() -> List[Dict[str, Any]]:
+def list_conversations(limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
     """
-    List all conversations (metadata only).
+    List all conversations (metadata only), newest first.
+
+    Args:
+        limit: Maximum number of conversations to return (None = all)
+        before: `created_at|id` cursor; only conversations listed after it are returned
+            (a bare ISO created_at returns those created strictly before it)
 
     Returns:
         List of conversation metadata dicts
@@ -202,14 +217,30 @@ def list_conversations() -> List[Dict[str, Any]]:
                     "chain_id": chain_id,
                     "parent_id": parent_id,
                     "round_number": round_number,
+                    "cursor": f"{data['created_at']}|{data['id']}",
                 })
 
-    # Sort by creation time, newest first
-    conversations.sort(key=lambda x: x["created_at"], reverse=True)
+    # Sort by creation time (then id, to break ties), newest first
+    conversations.sort(key=lambda x: (x["created_at"], x["id"]), reverse=True)
+    if before:
+        created_at, _, conversation_id = before.partition("|")
+        if conversation_id:
+            conversations = [c for c in conversations if (c["created_at"], c["id"]) < (created_at, conversation_id)]
+        else:
+            conversations = [c for c in conversations if c["created_at"] < created_at]
+    if limit is not None:
+        conversations = conversations[:limit]
 
     return conversations
 
 
+def get_attachment_chunks(conversation_id: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    JSON storage keeps no chunk index; None tells RAG to chunk the attachments itself.
+    """
+    return None
+
+
 def add_prompt_engineering_message(conversation_id: str, role: str, content: str):
     """
     Add a message to the prompt engineering stage.
@@ -367,7 +398,9 @@ def add_council_deliberation_message(
     content: str = None,
     stage1: List[Dict[str, Any]] = None,
     stage2: List[Dict[str, Any]] = None,
-    stage3: Dict[str, Any] = None
+    stage3: Dict[str, Any] = None,
+    metadata: Dict[str, Any] = None,
+    trace_id: str = None
 ):
     """
     Add a message to the council deliberation stage.
@@ -379,6 +412,8 @@ def add_council_deliberation_message(
         stage1: List of individual model responses (for assistant messages)
         stage2: List of model rankings (for assistant messages)
         stage3: Final synthesized response (for assistant messages)
+        metadata: Optional metadata (label_to_model, aggregate_rankings)
+        trace_id: Deliberation trace id (see tracing.py)
     """
     conversation = get_conversation(conversation_id)
     if conversation is None:
@@ -400,6 +435,10 @@ def add_council_deliberation_message(
             "stage2": stage2,
             "stage3": stage3
         }
+        if metadata is not None:
+            message["metadata"] = metadata
+        if trace_id:
+            message["trace_id"] = trace_id
         conversation["council_deliberation"]["messages"].append(message)
 
     save_conversation(conversation)
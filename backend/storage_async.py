@@ -0,0 +1,243 @@
+"""Async conversation storage - the storage_db API, awaitable.
+
+The FastAPI handlers and SSE generators await these instead of calling storage_db
+directly, so database I/O no longer blocks the event loop (and every other user's
+stream) while a write runs. Each function executes the same storage_db operation on
+an aiosqlite AsyncSession via run_sync, so both paths share one implementation. On
+SQLite, writes are awaited on the single-writer group-commit queue (sqlite_writer.py)
+and only reads use the async session.
+
+With DB_ASYNC_ENABLED=false, or without an async driver - which is the case on
+PostgreSQL unless asyncpg is installed separately (it is not a dependency) - the sync
+storage_db operations run in worker threads instead, still off the event loop.
+"""
+
+import asyncio
+import sys
+from typing import List, Dict, Any, Optional
+
+from . import storage_db
+from .config import DB_ASYNC_ENABLED
+from .database import get_async_sessionmaker, dispose_async_engine
+from .sqlite_writer import get_writer
+from .tracing import traced
+
+_sessions = None
+_use_threads = not DB_ASYNC_ENABLED
+
+
+def _async_sessions():
+    """Async session factory, or None when falling back to worker threads."""
+    global _sessions, _use_threads
+    if _sessions is None and not _use_threads:
+        try:
+            _sessions = get_async_sessionmaker()
+        except ImportError as e:
+            _use_threads = True
+            print(f"[STORAGE] Async database driver unavailable ({e}); using worker threads", file=sys.stderr, flush=True)
+    return _sessions
+
+
+async def _run(operation, *args, **kwargs):
+    """Run one storage_db operation in its own async session and commit it (SQLite writes via the write queue)."""
+    if getattr(operation, "is_write", False):
+        writer = get_writer()
+        if writer is not None:
+            return await asyncio.wrap_future(writer.submit(operation, *args, **kwargs))
+    sessions = _async_sessions()
+    if sessions is None:
+        return await asyncio.to_thread(storage_db._run, operation, *args, **kwargs)
+    async with sessions() as db:
+        result = await db.run_sync(operation, *args, **kwargs)
+        await db.commit()
+        return result
+
+
+async def close():
+    """Release pooled connections (app shutdown)."""
+    global _sessions
+    _sessions = None
+    await dispose_async_engine()
+
+
+@traced("storage.create_conversation")
+async def create_conversation(
+    conversation_id: str,
+    chain_id: Optional[str] = None,
+    parent_id: Optional[str] = None,
+    round_number: int = 1,
+    prior_synthesis: Optional[str] = None,
+    prior_preparation_summary: Optional[str] = None,
+    title: Optional[str] = None,
+    prompt_engineering: Optional[Dict[str, Any]] = None,
+    context_engineering: Optional[Dict[str, Any]] = None,
+    council_deliberation: Optional[Dict[str, Any]] = None,
+    attachments_from: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Create a new conversation (any messages/attachments passed in become rows)."""
+    return await _run(
+        storage_db._create_conversation, conversation_id,
+        chain_id=chain_id,
+        parent_id=parent_id,
+        round_number=round_number,
+        prior_synthesis=prior_synthesis,
+        prior_preparation_summary=prior_preparation_summary,
+        title=title,
+        prompt_engineering=prompt_engineering,
+        context_engineering=context_engineering,
+        council_deliberation=council_deliberation,
+        attachments_from=attachments_from,
+    )
+
+
+@traced("storage.get_conversation")
+async def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
+    """Get a conversation by ID."""
+    return await _run(storage_db._get_conversation, conversation_id)
+
+
+@traced("storage.save_conversation")
+async def save_conversation(conversation: Dict[str, Any]):
+    """Save/update a whole conversation dict (replaces its message/attachment rows)."""
+    await _run(storage_db._save_conversation, conversation)
+
+
+@traced("storage.list_conversations")
+async def list_conversations(limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """List conversations (metadata only), newest first; keyset-paginated by a created_at|id cursor."""
+    return await _run(storage_db._list_conversations, limit=limit, before=before)
+
+
+@traced("storage.delete_conversation")
+async def delete_conversation(conversation_id: str) -> bool:
+    """Delete a conversation and its messages/attachments."""
+    return await _run(storage_db._delete_conversation, conversation_id)
+
+
+@traced("storage.get_attachment_chunks")
+async def get_attachment_chunks(conversation_id: str) -> List[Dict[str, Any]]:
+    """Persisted RAG chunks of all the conversation's attachments (in attachment order)."""
+    return await _run(storage_db._get_attachment_chunks, conversation_id)
+
+
+@traced("storage.create_pending_attachment")
+async def create_pending_attachment(conversation_id: str, kind: str, data: Dict[str, Any], raw_hash: Optional[str] = None) -> int:
+    """Add a file/link in "pending" state while it is ingested in the background; returns the attachment id."""
+    return await _run(storage_db._create_pending_attachment, conversation_id, kind, data, raw_hash=raw_hash)
+
+
+@traced("storage.complete_attachment")
+async def complete_attachment(
+    attachment_id: int,
+    data: Dict[str, Any],
+    status: str = "ready",
+    chunks: Optional[List[Dict[str, Any]]] = None
+) -> bool:
+    """Store an ingested attachment ("ready" with its chunks, or "failed")."""
+    return await _run(storage_db._complete_attachment, attachment_id, data, status=status, chunks=chunks)
+
+
+async def fail_pending_attachments(error: str, older_than_seconds: float = 0) -> int:
+    """Mark attachments left pending by a previous process as failed (startup)."""
+    return await _run(storage_db._fail_pending_attachments, error, older_than_seconds)
+
+
+async def get_attachment_status(attachment_id: int) -> Optional[Dict[str, Any]]:
+    """Ingestion status of one attachment (None if it doesn't exist)."""
+    return await _run(storage_db._get_attachment_status, attachment_id)
+
+
+async def find_parsed_content(raw_hash: str) -> Optional[Dict[str, Any]]:
+    """Parse result (with content) of an earlier upload of the same bytes, or None."""
+    return await _run(storage_db._find_parsed_content, raw_hash)
+
+
+async def has_content_chunks(content_hash: str) -> bool:
+    """Whether the RAG chunks of this content are already stored."""
+    return await _run(storage_db._has_content_chunks, content_hash)
+
+
+async def list_pending_attachments(conversation_id: str) -> List[int]:
+    """Ids of the conversation's attachments that are still being ingested."""
+    return await _run(storage_db._list_pending_attachments, conversation_id)
+
+
+@traced("storage.add_prompt_engineering_message")
+async def add_prompt_engineering_message(conversation_id: str, role: str, content: str):
+    """Add a message to prompt engineering."""
+    await _run(storage_db._append_message, conversation_id, "prompt_engineering", {"role": role, "content": content})
+
+
+@traced("storage.finalize_prompt")
+async def finalize_prompt(conversation_id: str, finalized_prompt: str):
+    """Finalize the prompt."""
+    await _run(storage_db._set_section_value, conversation_id, "prompt_engineering", "finalized_prompt", finalized_prompt)
+
+
+@traced("storage.add_context_engineering_message")
+async def add_context_engineering_message(conversation_id: str, role: str, content: str):
+    """Add a message to context engineering."""
+    await _run(storage_db._append_message, conversation_id, "context_engineering", {"role": role, "content": content})
+
+
+@traced("storage.add_document")
+async def add_document(conversation_id: str, document_name: str, document_content: str):
+    """Add a document to context engineering."""
+    await _run(storage_db._add_document, conversation_id, document_name, document_content)
+
+
+@traced("storage.add_file")
+async def add_file(conversation_id: str, file_data: Dict[str, Any]):
+    """Add a file to context engineering."""
+    await _run(storage_db._append_attachment, conversation_id, "file", file_data)
+
+
+@traced("storage.add_link")
+async def add_link(conversation_id: str, link_data: Dict[str, Any]):
+    """Add a link to context engineering."""
+    await _run(storage_db._append_attachment, conversation_id, "link", link_data)
+
+
+@traced("storage.finalize_context")
+async def finalize_context(conversation_id: str, finalized_context: str):
+    """Finalize the context."""
+    await _run(storage_db._set_section_value, conversation_id, "context_engineering", "finalized_context", finalized_context)
+
+
+@traced("storage.update_conversation_title")
+async def update_conversation_title(conversation_id: str, title: str):
+    """Update conversation title."""
+    await _run(storage_db._update_conversation_title, conversation_id, title)
+
+
+@traced("storage.add_council_deliberation_message")
+async def add_council_deliberation_message(
+    conversation_id: str,
+    role: str,
+    content: str = None,
+    stage1: List[Dict[str, Any]] = None,
+    stage2: List[Dict[str, Any]] = None,
+    stage3: Dict[str, Any] = None,
+    metadata: Dict[str, Any] = None,
+    trace_id: str = None
+):
+    """Add a message to council deliberation (trace_id links it to its deliberation trace)."""
+    await _run(
+        storage_db._add_council_deliberation_message, conversation_id, role,
+        content=content, stage1=stage1, stage2=stage2, stage3=stage3, metadata=metadata, trace_id=trace_id,
+    )
+
+
+async def add_user_message(conversation_id: str, content: str):
+    """Legacy function - redirects to council_deliberation for backward compatibility."""
+    await add_council_deliberation_message(conversation_id, "user", content=content)
+
+
+async def add_assistant_message(
+    conversation_id: str,
+    stage1: List[Dict[str, Any]],
+    stage2: List[Dict[str, Any]],
+    stage3: Dict[str, Any]
+):
+    """Legacy function - redirects to council_deliberation for backward compatibility."""
+    await add_council_deliberation_message(conversation_id, "assistant", stage1=stage1, stage2=stage2, stage3=stage3)
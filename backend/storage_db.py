@@ -1,13 +1,52 @@
-"""Database-based storage for conversations using SQLAlchemy."""
-
-from typing import List, Dict, Any, Optional
-from datetime import datetime
-from sqlalchemy.orm import Session
-from .database import Conversation, get_db, get_session, init_db
+"""Database-based storage for conversations using SQLAlchemy.
 
+Conversation rows hold scalars (title, chain fields, finalized prompt/context). Messages,
+attachments and council answers live in their own tables, so appends are single-row
+INSERTs instead of rewriting every JSON column of the conversation.
+"""
 
-def _ensure_conversation_structure(conversation: Conversation) -> Dict[str, Any]:
-    """Ensure conversation has the correct structure (backward compatibility)."""
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+from .database import (
+    Conversation, Message, Attachment, Blob, BlobChunk, CouncilRun,
+    get_db, get_session, add_message_row, add_attachment_row, add_blob_chunks, put_blob, load_blob_texts,
+)
+from .sqlite_writer import get_writer
+from .tracing import traced
+
+# Attachment kind -> context_engineering list key
+_ATTACHMENT_LISTS = {"document": "documents", "file": "files", "link": "links"}
+
+
+def _writes(operation):
+    """Mark a storage operation as a write (queued to the SQLite single writer, see sqlite_writer.py)."""
+    operation.is_write = True
+    return operation
+
+
+def _message_dict(row: Message, run: Optional[CouncilRun]) -> Dict[str, Any]:
+    message = {"role": row.role}
+    if row.content is not None:
+        message["content"] = row.content
+    if run is not None:
+        for key, value in (
+            ("stage1", run.stage1),
+            ("stage2", run.stage2),
+            ("stage3", run.stage3),
+            ("metadata", run.run_metadata),
+            ("trace_id", run.trace_id),
+        ):
+            if value is not None:
+                message[key] = value
+    if row.extra:
+        message.update(row.extra)
+    return message
+
+
+def _ensure_conversation_structure(conversation: Conversation, db: Session) -> Dict[str, Any]:
+    """Assemble the API conversation dict from the conversation row and its message/attachment rows."""
     chain_id = getattr(conversation, "chain_id", None) or conversation.id
     parent_id = getattr(conversation, "parent_id", None)
     round_number = getattr(conversation, "round_number", None) or 1
@@ -24,40 +63,35 @@ def _ensure_conversation_structure(conversation: Conversation) -> Dict[str, Any]
         "prior_preparation_summary": prior_preparation_summary,
     }
     
-    # Get JSON fields with defaults - always ensure they exist
-    prompt_eng = conversation.prompt_engineering if conversation.prompt_engineering is not None else {}
-    context_eng = conversation.context_engineering if conversation.context_engineering is not None else {}
-    council_delib = conversation.council_deliberation if conversation.council_deliberation is not None else {}
-    
-    # Ensure structure for prompt_engineering
-    if not isinstance(prompt_eng, dict):
-        prompt_eng = {}
-    if "messages" not in prompt_eng:
-        prompt_eng["messages"] = []
-    if "finalized_prompt" not in prompt_eng:
-        prompt_eng["finalized_prompt"] = None
-    
-    # Ensure structure for context_engineering - always initialize even if empty
-    if not isinstance(context_eng, dict):
-        context_eng = {}
-    if "messages" not in context_eng:
-        context_eng["messages"] = []
-    if "documents" not in context_eng:
-        context_eng["documents"] = []
-    if "files" not in context_eng:
-        context_eng["files"] = []
-    if "links" not in context_eng:
-        context_eng["links"] = []
-    if "finalized_context" not in context_eng:
-        context_eng["finalized_context"] = None
-    
-    # Ensure structure for council_deliberation
-    if not isinstance(council_delib, dict):
-        council_delib = {}
-    if "messages" not in council_delib:
-        # Try to migrate from old messages field
-        old_messages = conversation.messages or []
-        council_delib["messages"] = old_messages if isinstance(old_messages, list) else []
+    # Scalar JSON fields with defaults - always ensure they exist
+    prompt_eng = dict(conversation.prompt_engineering) if isinstance(conversation.prompt_engineering, dict) else {}
+    context_eng = dict(conversation.context_engineering) if isinstance(conversation.context_engineering, dict) else {}
+    council_delib = dict(conversation.council_deliberation) if isinstance(conversation.council_deliberation, dict) else {}
+    prompt_eng.setdefault("finalized_prompt", None)
+    context_eng.setdefault("finalized_context", None)
+
+    # Lists come from the row tables (in insertion order)
+    runs = {
+        run.id: run
+        for run in db.query(CouncilRun).filter(CouncilRun.conversation_id == conversation.id)
+    }
+    sections = {"prompt_engineering": [], "context_engineering": [], "council_deliberation": []}
+    for row in db.query(Message).filter(Message.conversation_id == conversation.id).order_by(Message.id):
+        sections.setdefault(row.section, []).append(_message_dict(row, runs.get(row.council_run_id)))
+    attachments = {key: [] for key in _ATTACHMENT_LISTS.values()}
+    rows = db.query(Attachment).filter(Attachment.conversation_id == conversation.id).order_by(Attachment.id).all()
+    texts = load_blob_texts(db, [row.content_hash for row in rows if row.content_hash])
+    for row in rows:
+        item = dict(row.data)
+        if row.content_hash:
+            item["content"] = texts.get(row.content_hash, "")
+        item.update(attachment_id=row.id, status=row.status or "ready")
+        attachments[_ATTACHMENT_LISTS.get(row.kind, "files")].append(item)
+
+    prompt_eng["messages"] = sections["prompt_engineering"]
+    context_eng["messages"] = sections["context_engineering"]
+    context_eng.update(attachments)
+    council_delib["messages"] = sections["council_deliberation"]
     
     data["prompt_engineering"] = prompt_eng
     data["context_engineering"] = context_eng
@@ -66,7 +100,252 @@ def _ensure_conversation_structure(conversation: Conversation) -> Dict[str, Any]
     return data
 
 
-def create_conversation(
+def _split_sections(
+    prompt_eng: Dict[str, Any],
+    context_eng: Dict[str, Any],
+    council_delib: Dict[str, Any]
+) -> Tuple[Dict[str, Dict[str, Any]], List[Tuple[str, Dict[str, Any]]], List[Tuple[str, Dict[str, Any]]]]:
+    """Split API section dicts into (scalar JSON per section, messages, attachments)."""
+    scalars = {}
+    messages: List[Tuple[str, Dict[str, Any]]] = []
+    attachments: List[Tuple[str, Dict[str, Any]]] = []
+    for section, value in (
+        ("prompt_engineering", prompt_eng),
+        ("context_engineering", context_eng),
+        ("council_deliberation", council_delib),
+    ):
+        value = dict(value or {})
+        for message in value.pop("messages", None) or []:
+            messages.append((section, message))
+        if section == "context_engineering":
+            for kind, key in _ATTACHMENT_LISTS.items():
+                for item in value.pop(key, None) or []:
+                    attachments.append((kind, item))
+        scalars[section] = value
+    return scalars, messages, attachments
+
+
+def _council_message_count(messages: List[Tuple[str, Dict[str, Any]]]) -> int:
+    return sum(1 for section, _ in messages if section == "council_deliberation")
+
+
+def _insert_attachment(db: Session, conversation_id: str, kind: str, data: Dict[str, Any]):
+    """INSERT an attachment; its content's blob and RAG chunks are stored only if no attachment has them yet."""
+    row = add_attachment_row(db, conversation_id, kind, data)
+    if row.status == "ready":
+        add_blob_chunks(db, row.content_hash, kind, data)
+
+
+def _insert_rows(db: Session, conversation_id: str, messages, attachments):
+    for section, message in messages:
+        add_message_row(db, conversation_id, section, message)
+    for kind, item in attachments:
+        _insert_attachment(db, conversation_id, kind, item)
+
+
+def _copy_attachments(db: Session, source_id: str, target_id: str) -> int:
+    """INSERT copies of the source conversation's ingested attachments; rows share its blobs (no content is read)."""
+    rows = db.query(
+        Attachment.kind, Attachment.name, Attachment.data, Attachment.status, Attachment.content_hash, Attachment.raw_hash
+    ).filter(
+        Attachment.conversation_id == source_id, Attachment.status != "pending"
+    ).order_by(Attachment.id).all()
+    for row in rows:
+        db.add(Attachment(
+            conversation_id=target_id,
+            kind=row.kind,
+            name=row.name,
+            data=row.data,
+            status=row.status,
+            content_hash=row.content_hash,
+            raw_hash=row.raw_hash,
+        ))
+    return len(rows)
+
+
+def _delete_rows(db: Session, conversation_id: str) -> List[str]:
+    """DELETE the conversation's message/attachment rows; returns the content hashes its attachments referenced."""
+    content_hashes = [
+        row.content_hash for row in
+        db.query(Attachment.content_hash).filter(Attachment.conversation_id == conversation_id).distinct()
+        if row.content_hash
+    ]
+    db.query(Message).filter(Message.conversation_id == conversation_id).delete(synchronize_session=False)
+    db.query(CouncilRun).filter(CouncilRun.conversation_id == conversation_id).delete(synchronize_session=False)
+    db.query(Attachment).filter(Attachment.conversation_id == conversation_id).delete(synchronize_session=False)
+    return content_hashes
+
+
+def _drop_unreferenced_blobs(db: Session, content_hashes: List[str]):
+    """DELETE the blobs (and their chunks) among content_hashes that no attachment references any more."""
+    if not content_hashes:
+        return
+    db.flush()
+    referenced = {
+        row.content_hash for row in
+        db.query(Attachment.content_hash).filter(Attachment.content_hash.in_(content_hashes)).distinct()
+    }
+    orphans = [content_hash for content_hash in content_hashes if content_hash not in referenced]
+    if orphans:
+        db.query(BlobChunk).filter(BlobChunk.content_hash.in_(orphans)).delete(synchronize_session=False)
+        db.query(Blob).filter(Blob.sha256.in_(orphans)).delete(synchronize_session=False)
+
+
+def _touch(db: Session, conversation_id: str, **values: Any):
+    """Bump updated_at (plus any other listing columns); raises ValueError if the conversation is missing."""
+    values["updated_at"] = datetime.utcnow()
+    updated = db.query(Conversation).filter(Conversation.id == conversation_id).update(
+        values, synchronize_session=False
+    )
+    if not updated:
+        raise ValueError(f"Conversation {conversation_id} not found")
+
+
+@_writes
+def _append_message(db: Session, conversation_id: str, section: str, message: Dict[str, Any]):
+    """INSERT one message row (no read-modify-write of the conversation)."""
+    if section == "council_deliberation":
+        _touch(db, conversation_id, message_count=func.coalesce(Conversation.message_count, 0) + 1)
+    else:
+        _touch(db, conversation_id)
+    add_message_row(db, conversation_id, section, message)
+
+
+@_writes
+def _append_attachment(db: Session, conversation_id: str, kind: str, data: Dict[str, Any]):
+    """INSERT one attachment row."""
+    _touch(db, conversation_id)
+    _insert_attachment(db, conversation_id, kind, data)
+
+
+@_writes
+def _create_pending_attachment(
+    db: Session,
+    conversation_id: str,
+    kind: str,
+    data: Dict[str, Any],
+    raw_hash: Optional[str] = None
+) -> int:
+    """INSERT an attachment in "pending" state, before its content is ingested; returns its id."""
+    _touch(db, conversation_id)
+    row = add_attachment_row(db, conversation_id, kind, {**data, "status": "pending"}, raw_hash=raw_hash)
+    db.flush()
+    return row.id
+
+
+@_writes
+def _complete_attachment(
+    db: Session,
+    attachment_id: int,
+    data: Dict[str, Any],
+    status: str = "ready",
+    chunks: Optional[List[Dict[str, Any]]] = None
+) -> bool:
+    """Store an ingested attachment's content, status and (if ready) chunks; False if it was deleted meanwhile."""
+    row = db.query(Attachment).filter(Attachment.id == attachment_id).first()
+    if row is None:
+        return False
+    row.data = {k: v for k, v in data.items() if k not in ("attachment_id", "status", "content")}
+    row.name = data.get("name", row.name)
+    row.status = status
+    previous_hash, row.content_hash = row.content_hash, put_blob(db, data.get("content") or "")
+    if status == "ready":
+        add_blob_chunks(db, row.content_hash, row.kind, data, chunks)
+    if previous_hash != row.content_hash:
+        _drop_unreferenced_blobs(db, [previous_hash] if previous_hash else [])
+    _touch(db, row.conversation_id)
+    return True
+
+
+@_writes
+def _fail_pending_attachments(db: Session, error: str, older_than_seconds: float = 0) -> int:
+    """Mark pending attachments created more than older_than_seconds ago failed (their ingestion job died)."""
+    cutoff = datetime.utcnow() - timedelta(seconds=older_than_seconds)
+    rows = db.query(Attachment).filter(Attachment.status == "pending", Attachment.created_at <= cutoff).all()
+    for row in rows:
+        row.status = "failed"
+        row.data = {**row.data, "error": error}
+    return len(rows)
+
+
+def _get_attachment_status(db: Session, attachment_id: int) -> Optional[Dict[str, Any]]:
+    row = db.query(
+        Attachment.id,
+        Attachment.conversation_id,
+        Attachment.kind,
+        Attachment.name,
+        Attachment.status,
+        Attachment.data["error"].as_string().label("error"),
+    ).filter(Attachment.id == attachment_id).first()
+    if row is None:
+        return None
+    return {
+        "attachment_id": row.id,
+        "conversation_id": row.conversation_id,
+        "kind": row.kind,
+        "name": row.name,
+        "status": row.status or "ready",
+        "error": row.error,
+    }
+
+
+def _find_parsed_content(db: Session, raw_hash: str) -> Optional[Dict[str, Any]]:
+    """Attachment dict (with content) of the latest successful ingestion of the same uploaded bytes."""
+    rows = db.query(Attachment.data, Attachment.content_hash).filter(
+        Attachment.raw_hash == raw_hash, Attachment.status == "ready", Attachment.content_hash.isnot(None)
+    ).order_by(Attachment.id.desc()).limit(5)
+    for row in rows:
+        if not row.data.get("error"):
+            texts = load_blob_texts(db, [row.content_hash])
+            if row.content_hash in texts:
+                return {**row.data, "content": texts[row.content_hash]}
+    return None
+
+
+def _has_content_chunks(db: Session, content_hash: str) -> bool:
+    return db.query(BlobChunk.id).filter(BlobChunk.content_hash == content_hash).first() is not None
+
+
+def _list_pending_attachments(db: Session, conversation_id: str) -> List[int]:
+    rows = db.query(Attachment.id).filter(
+        Attachment.conversation_id == conversation_id, Attachment.status == "pending"
+    ).order_by(Attachment.id)
+    return [row.id for row in rows]
+
+
+@_writes
+def _set_section_value(db: Session, conversation_id: str, section: str, key: str, value: Any):
+    """Update one scalar (e.g. finalized_prompt) in a section's small JSON column."""
+    conv = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conv:
+        raise ValueError(f"Conversation {conversation_id} not found")
+    data = dict(getattr(conv, section) or {})
+    data[key] = value
+    setattr(conv, section, data)
+    conv.updated_at = datetime.utcnow()
+
+
+def _run(operation, *args, **kwargs):
+    """Run one storage operation in its own session and commit it (writes via the SQLite write queue)."""
+    writer = get_writer() if getattr(operation, "is_write", False) else None
+    if writer is not None:
+        return writer.submit(operation, *args, **kwargs).result()
+    db = get_session()
+    try:
+        result = operation(db, *args, **kwargs)
+        db.commit()
+        return result
+    finally:
+        db.close()
+
+
+# Storage operations. Each takes the session as its first argument and leaves committing
+# to the caller: the public functions below run them via _run, storage_async via
+# AsyncSession.run_sync - one implementation for both backends.
+
+@_writes
+def _create_conversation(
+    db: Session,
     conversation_id: str,
     chain_id: Optional[str] = None,
     parent_id: Optional[str] = None,
@@ -77,263 +356,424 @@ def create_conversation(
     prompt_engineering: Optional[Dict[str, Any]] = None,
     context_engineering: Optional[Dict[str, Any]] = None,
     council_deliberation: Optional[Dict[str, Any]] = None,
+    attachments_from: Optional[str] = None,
 ) -> Dict[str, Any]:
-    """Create a new conversation."""
-    init_db()
-
     if chain_id is None:
         chain_id = conversation_id
 
-    prompt_eng = prompt_engineering or {"messages": [], "finalized_prompt": None}
-    context_eng = context_engineering or {
-        "messages": [],
-        "documents": [],
-        "files": [],
-        "links": [],
-        "finalized_context": None,
-    }
-    council_delib = council_deliberation or {"messages": []}
-
-    db = get_session()
-    try:
-        conversation = Conversation(
-            id=conversation_id,
-            created_at=datetime.utcnow(),
-            title=title or "New Conversation",
-            chain_id=chain_id,
-            parent_id=parent_id,
-            round_number=round_number,
-            prior_synthesis=prior_synthesis,
-            prior_preparation_summary=prior_preparation_summary,
-            prompt_engineering=prompt_eng,
-            context_engineering=context_eng,
-            council_deliberation=council_delib,
+    scalars, messages, attachments = _split_sections(
+        prompt_engineering or {"finalized_prompt": None},
+        context_engineering or {"finalized_context": None},
+        council_deliberation or {},
+    )
+
+    now = datetime.utcnow()
+    conversation = Conversation(
+        id=conversation_id,
+        created_at=now,
+        updated_at=now,
+        title=title or "New Conversation",
+        chain_id=chain_id,
+        parent_id=parent_id,
+        round_number=round_number,
+        prior_synthesis=prior_synthesis,
+        prior_preparation_summary=prior_preparation_summary,
+        prompt_engineering=scalars["prompt_engineering"],
+        context_engineering=scalars["context_engineering"],
+        council_deliberation=scalars["council_deliberation"],
+        message_count=_council_message_count(messages),
+    )
+    db.add(conversation)
+    db.flush()
+    _insert_rows(db, conversation_id, messages, attachments)
+    if attachments_from:
+        _copy_attachments(db, attachments_from, conversation_id)
+    db.flush()
+    return _ensure_conversation_structure(conversation, db)
+
+
+def _get_conversation(db: Session, conversation_id: str) -> Optional[Dict[str, Any]]:
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if not conversation:
+        # Log for debugging in Azure
+        import os
+        if os.path.exists("/home/site/wwwroot"):
+            import sys
+            print(f"⚠️ Conversation {conversation_id} not found in database", file=sys.stderr, flush=True)
+        return None
+    return _ensure_conversation_structure(conversation, db)
+
+
+@_writes
+def _save_conversation(db: Session, conversation: Dict[str, Any]):
+    scalars, messages, attachments = _split_sections(
+        conversation.get("prompt_engineering", {}),
+        conversation.get("context_engineering", {}),
+        conversation.get("council_deliberation", {}),
+    )
+    
+    conv = db.query(Conversation).filter(Conversation.id == conversation["id"]).first()
+    
+    if conv:
+        # Update existing
+        conv.title = conversation.get("title", conv.title)
+        if "chain_id" in conversation:
+            conv.chain_id = conversation["chain_id"]
+        if "parent_id" in conversation:
+            conv.parent_id = conversation["parent_id"]
+        if "round_number" in conversation:
+            conv.round_number = conversation["round_number"]
+        if "prior_synthesis" in conversation:
+            conv.prior_synthesis = conversation["prior_synthesis"]
+        conv.prompt_engineering = scalars["prompt_engineering"]
+        conv.context_engineering = scalars["context_engineering"]
+        conv.council_deliberation = scalars["council_deliberation"]
+        conv.message_count = _council_message_count(messages)
+        conv.updated_at = datetime.utcnow()
+        previous_hashes = _delete_rows(db, conv.id)
+    else:
+        previous_hashes = []
+        # Create new
+        conv = Conversation(
+            id=conversation["id"],
+            created_at=datetime.fromisoformat(conversation.get("created_at", datetime.utcnow().isoformat())),
+            title=conversation.get("title", "New Conversation"),
+            chain_id=conversation.get("chain_id", conversation["id"]),
+            parent_id=conversation.get("parent_id"),
+            round_number=conversation.get("round_number", 1),
+            prior_synthesis=conversation.get("prior_synthesis"),
+            prompt_engineering=scalars["prompt_engineering"],
+            context_engineering=scalars["context_engineering"],
+            council_deliberation=scalars["council_deliberation"],
+            message_count=_council_message_count(messages),
+            updated_at=datetime.utcnow(),
         )
-        db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
-        return _ensure_conversation_structure(conversation)
-    finally:
-        db.close()
+        db.add(conv)
+        db.flush()
+    
+    _insert_rows(db, conv.id, messages, attachments)
+    _drop_unreferenced_blobs(db, previous_hashes)
+
+
+def _parse_cursor(before: str) -> Tuple[datetime, Optional[str]]:
+    """Split a `created_at|id` cursor; a bare ISO created_at (no id) is accepted too."""
+    created_at, _, conversation_id = before.partition("|")
+    return datetime.fromisoformat(created_at), conversation_id or None
+
+
+def _list_conversations(db: Session, limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
+    query = db.query(
+        Conversation.id,
+        Conversation.created_at,
+        Conversation.updated_at,
+        Conversation.title,
+        Conversation.message_count,
+        Conversation.chain_id,
+        Conversation.parent_id,
+        Conversation.round_number,
+    )
+    if before:
+        created_at, conversation_id = _parse_cursor(before)
+        if conversation_id:
+            # Matches the (created_at desc, id desc) order, so equal timestamps aren't skipped
+            query = query.filter(or_(
+                Conversation.created_at < created_at,
+                and_(Conversation.created_at == created_at, Conversation.id < conversation_id),
+            ))
+        else:
+            query = query.filter(Conversation.created_at < created_at)
+    query = query.order_by(Conversation.created_at.desc(), Conversation.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    
+    result = []
+    for conv in query:
+        created_at = conv.created_at.isoformat() if conv.created_at else datetime.utcnow().isoformat()
+        result.append({
+            "cursor": f"{created_at}|{conv.id}",
+            "id": conv.id,
+            "created_at": created_at,
+            "updated_at": conv.updated_at.isoformat() if conv.updated_at else created_at,
+            "title": conv.title or "New Conversation",
+            "message_count": conv.message_count or 0,
+            "chain_id": conv.chain_id or conv.id,
+            "parent_id": conv.parent_id,
+            "round_number": conv.round_number or 1,
+        })
+    
+    return result
+
+
+@_writes
+def _delete_conversation(db: Session, conversation_id: str) -> bool:
+    conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+    if conversation:
+        content_hashes = _delete_rows(db, conversation_id)
+        db.delete(conversation)
+        _drop_unreferenced_blobs(db, content_hashes)
+        return True
+    return False
+
+
+def _get_attachment_chunks(db: Session, conversation_id: str) -> List[Dict[str, Any]]:
+    # One attachment per distinct content (the first), so identical attachments don't duplicate chunks
+    first = db.query(
+        func.min(Attachment.id).label("attachment_id"),
+        Attachment.content_hash,
+    ).filter(
+        Attachment.conversation_id == conversation_id,
+        Attachment.status == "ready",
+        Attachment.content_hash.isnot(None),
+    ).group_by(Attachment.content_hash).subquery()
+    rows = db.query(
+        BlobChunk.id,
+        BlobChunk.text,
+        BlobChunk.chunk_index,
+        BlobChunk.start_char,
+        BlobChunk.end_char,
+        BlobChunk.document_type,
+        BlobChunk.extra,
+        Attachment.name,
+    ).join(first, first.c.content_hash == BlobChunk.content_hash).join(
+        Attachment, Attachment.id == first.c.attachment_id
+    ).order_by(first.c.attachment_id, BlobChunk.chunk_index)
+    chunks = []
+    for row in rows:
+        chunk = {
+            "chunk_id": row.id,
+            "text": row.text,
+            "chunk_index": row.chunk_index,
+            "start_char": row.start_char,
+            "end_char": row.end_char,
+            "document_name": row.name or "Untitled",
+            "document_type": row.document_type,
+        }
+        if row.extra:
+            chunk.update(row.extra)
+        chunks.append(chunk)
+    return chunks
+
+
+@_writes
+def _add_document(db: Session, conversation_id: str, document_name: str, document_content: str):
+    _append_attachment(db, conversation_id, "document", {
+        "type": "text",
+        "name": document_name,
+        "content": document_content
+    })
 
 
+@_writes
+def _update_conversation_title(db: Session, conversation_id: str, title: str):
+    _touch(db, conversation_id, title=title)
+
+
+@_writes
+def _add_council_deliberation_message(
+    db: Session,
+    conversation_id: str,
+    role: str,
+    content: str = None,
+    stage1: List[Dict[str, Any]] = None,
+    stage2: List[Dict[str, Any]] = None,
+    stage3: Dict[str, Any] = None,
+    metadata: Dict[str, Any] = None,
+    trace_id: str = None
+):
+    message = {"role": role}
+    if content:
+        message["content"] = content
+    if stage1 is not None:
+        message["stage1"] = stage1
+    if stage2 is not None:
+        message["stage2"] = stage2
+    if stage3 is not None:
+        message["stage3"] = stage3
+    if metadata is not None:
+        message["metadata"] = metadata
+    if trace_id:
+        message["trace_id"] = trace_id
+    
+    # Assistant answers put stage1-3 in a council_runs row; the message row references it
+    _append_message(db, conversation_id, "council_deliberation", message)
+
+
+@traced("storage.create_conversation")
+def create_conversation(
+    conversation_id: str,
+    chain_id: Optional[str] = None,
+    parent_id: Optional[str] = None,
+    round_number: int = 1,
+    prior_synthesis: Optional[str] = None,
+    prior_preparation_summary: Optional[str] = None,
+    title: Optional[str] = None,
+    prompt_engineering: Optional[Dict[str, Any]] = None,
+    context_engineering: Optional[Dict[str, Any]] = None,
+    council_deliberation: Optional[Dict[str, Any]] = None,
+    attachments_from: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Create a new conversation (any messages/attachments passed in become rows).
+
+    attachments_from: Conversation whose ingested attachments are copied by reference
+    (e.g. the parent round) - the copies share its content blobs and chunks.
+    """
+    return _run(
+        _create_conversation, conversation_id,
+        chain_id=chain_id,
+        parent_id=parent_id,
+        round_number=round_number,
+        prior_synthesis=prior_synthesis,
+        prior_preparation_summary=prior_preparation_summary,
+        title=title,
+        prompt_engineering=prompt_engineering,
+        context_engineering=context_engineering,
+        council_deliberation=council_deliberation,
+        attachments_from=attachments_from,
+    )
+
+
+@traced("storage.get_conversation")
 def get_conversation(conversation_id: str) -> Optional[Dict[str, Any]]:
     """Get a conversation by ID."""
-    init_db()
-    
-    db = get_session()
-    try:
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if not conversation:
-            # Log for debugging in Azure
-            import os
-            if os.path.exists("/home/site/wwwroot"):
-                import sys
-                print(f"⚠️ Conversation {conversation_id} not found in database", file=sys.stderr, flush=True)
-            return None
-        return _ensure_conversation_structure(conversation)
-    finally:
-        db.close()
+    return _run(_get_conversation, conversation_id)
 
 
+@traced("storage.save_conversation")
 def save_conversation(conversation: Dict[str, Any]):
-    """Save/update a conversation."""
-    init_db()
-    
-    db = get_session()
-    try:
-        conv = db.query(Conversation).filter(Conversation.id == conversation["id"]).first()
-        
-        if conv:
-            # Update existing
-            conv.title = conversation.get("title", conv.title)
-            if "chain_id" in conversation:
-                conv.chain_id = conversation["chain_id"]
-            if "parent_id" in conversation:
-                conv.parent_id = conversation["parent_id"]
-            if "round_number" in conversation:
-                conv.round_number = conversation["round_number"]
-            if "prior_synthesis" in conversation:
-                conv.prior_synthesis = conversation["prior_synthesis"]
-            conv.prompt_engineering = conversation.get("prompt_engineering", conv.prompt_engineering or {})
-            conv.context_engineering = conversation.get("context_engineering", conv.context_engineering or {})
-            conv.council_deliberation = conversation.get("council_deliberation", conv.council_deliberation or {})
-        else:
-            # Create new
-            conv = Conversation(
-                id=conversation["id"],
-                created_at=datetime.fromisoformat(conversation.get("created_at", datetime.utcnow().isoformat())),
-                title=conversation.get("title", "New Conversation"),
-                chain_id=conversation.get("chain_id", conversation["id"]),
-                parent_id=conversation.get("parent_id"),
-                round_number=conversation.get("round_number", 1),
-                prior_synthesis=conversation.get("prior_synthesis"),
-                prompt_engineering=conversation.get("prompt_engineering", {}),
-                context_engineering=conversation.get("context_engineering", {}),
-                council_deliberation=conversation.get("council_deliberation", {}),
-            )
-            db.add(conv)
-        
-        db.commit()
-    finally:
-        db.close()
+    """
+    Save/update a whole conversation dict.
 
+    This replaces every message/attachment row of the conversation - prefer the add_* /
+    finalize_* functions, which write a single row.
+    """
+    _run(_save_conversation, conversation)
 
-def list_conversations() -> List[Dict[str, Any]]:
-    """List all conversations (metadata only)."""
-    init_db()
-    
-    db = get_session()
-    try:
-        conversations = db.query(Conversation).order_by(Conversation.created_at.desc()).all()
-        
-        result = []
-        for conv in conversations:
-            # Count messages
-            council_delib = conv.council_deliberation or {}
-            message_count = len(council_delib.get("messages", []))
-            
-            chain_id = conv.chain_id if conv.chain_id else conv.id
-            result.append({
-                "id": conv.id,
-                "created_at": conv.created_at.isoformat() if conv.created_at else datetime.utcnow().isoformat(),
-                "title": conv.title or "New Conversation",
-                "message_count": message_count,
-                "chain_id": chain_id,
-                "parent_id": conv.parent_id,
-                "round_number": conv.round_number or 1,
-            })
-        
-        return result
-    finally:
-        db.close()
 
+@traced("storage.list_conversations")
+def list_conversations(limit: Optional[int] = None, before: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    List conversations (metadata only), newest first.
+
+    Column-only query on the conversations table - no JSON sections or message rows
+    are loaded. Keyset pagination: pass the `cursor` (created_at|id) of the last item of
+    the previous page as `before` to get the next page.
+
+    Args:
+        limit: Maximum number of conversations to return (None = all)
+        before: `created_at|id` cursor; only conversations listed after it are returned
+            (a bare ISO created_at returns those created strictly before it)
+
+    Returns:
+        List of conversation metadata dicts
+    """
+    return _run(_list_conversations, limit=limit, before=before)
 
+
+@traced("storage.delete_conversation")
 def delete_conversation(conversation_id: str) -> bool:
-    """Delete a conversation."""
-    init_db()
-    
-    db = get_session()
-    try:
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
-        if conversation:
-            db.delete(conversation)
-            db.commit()
-            return True
-        return False
-    finally:
-        db.close()
+    """Delete a conversation and its messages/attachments."""
+    return _run(_delete_conversation, conversation_id)
+
+
+@traced("storage.get_attachment_chunks")
+def get_attachment_chunks(conversation_id: str) -> List[Dict[str, Any]]:
+    """Persisted RAG chunks of all the conversation's attachments (in attachment order)."""
+    return _run(_get_attachment_chunks, conversation_id)
+
+
+@traced("storage.create_pending_attachment")
+def create_pending_attachment(conversation_id: str, kind: str, data: Dict[str, Any], raw_hash: Optional[str] = None) -> int:
+    """Add a file/link in "pending" state while it is ingested in the background; returns the attachment id."""
+    return _run(_create_pending_attachment, conversation_id, kind, data, raw_hash=raw_hash)
+
+
+@traced("storage.complete_attachment")
+def complete_attachment(
+    attachment_id: int,
+    data: Dict[str, Any],
+    status: str = "ready",
+    chunks: Optional[List[Dict[str, Any]]] = None
+) -> bool:
+    """Store an ingested attachment ("ready" with its chunks, or "failed")."""
+    return _run(_complete_attachment, attachment_id, data, status=status, chunks=chunks)
+
+
+def fail_pending_attachments(error: str, older_than_seconds: float = 0) -> int:
+    """Mark attachments left pending by a previous process as failed (startup)."""
+    return _run(_fail_pending_attachments, error, older_than_seconds)
+
+
+def get_attachment_status(attachment_id: int) -> Optional[Dict[str, Any]]:
+    """Ingestion status of one attachment (None if it doesn't exist)."""
+    return _run(_get_attachment_status, attachment_id)
+
+
+def find_parsed_content(raw_hash: str) -> Optional[Dict[str, Any]]:
+    """Parse result (with content) of an earlier upload of the same bytes, or None."""
+    return _run(_find_parsed_content, raw_hash)
+
+
+def has_content_chunks(content_hash: str) -> bool:
+    """Whether the RAG chunks of this content are already stored."""
+    return _run(_has_content_chunks, content_hash)
+
+
+def list_pending_attachments(conversation_id: str) -> List[int]:
+    """Ids of the conversation's attachments that are still being ingested."""
+    return _run(_list_pending_attachments, conversation_id)
 
 
-# All the message and data manipulation functions
+# All the message and data manipulation functions - each is a single-row write
+@traced("storage.add_prompt_engineering_message")
 def add_prompt_engineering_message(conversation_id: str, role: str, content: str):
     """Add a message to prompt engineering."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    prompt_eng = conv.get("prompt_engineering", {})
-    messages = prompt_eng.get("messages", [])
-    messages.append({"role": role, "content": content})
-    prompt_eng["messages"] = messages
-    conv["prompt_engineering"] = prompt_eng
-    save_conversation(conv)
+    _run(_append_message, conversation_id, "prompt_engineering", {"role": role, "content": content})
 
 
+@traced("storage.finalize_prompt")
 def finalize_prompt(conversation_id: str, finalized_prompt: str):
     """Finalize the prompt."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    prompt_eng = conv.get("prompt_engineering", {})
-    prompt_eng["finalized_prompt"] = finalized_prompt
-    conv["prompt_engineering"] = prompt_eng
-    save_conversation(conv)
+    _run(_set_section_value, conversation_id, "prompt_engineering", "finalized_prompt", finalized_prompt)
 
 
+@traced("storage.add_context_engineering_message")
 def add_context_engineering_message(conversation_id: str, role: str, content: str):
     """Add a message to context engineering."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    context_eng = conv.get("context_engineering", {})
-    messages = context_eng.get("messages", [])
-    messages.append({"role": role, "content": content})
-    context_eng["messages"] = messages
-    conv["context_engineering"] = context_eng
-    save_conversation(conv)
+    _run(_append_message, conversation_id, "context_engineering", {"role": role, "content": content})
 
 
+@traced("storage.add_document")
 def add_document(conversation_id: str, document_name: str, document_content: str):
     """Add a document to context engineering."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    context_eng = conv.get("context_engineering", {})
-    documents = context_eng.get("documents", [])
-    documents.append({
-        "type": "text",
-        "name": document_name,
-        "content": document_content
-    })
-    context_eng["documents"] = documents
-    conv["context_engineering"] = context_eng
-    save_conversation(conv)
+    _run(_add_document, conversation_id, document_name, document_content)
 
 
+@traced("storage.add_file")
 def add_file(conversation_id: str, file_data: Dict[str, Any]):
     """Add a file to context engineering."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    context_eng = conv.get("context_engineering", {})
-    files = context_eng.get("files", [])
-    files.append(file_data)
-    context_eng["files"] = files
-    conv["context_engineering"] = context_eng
-    save_conversation(conv)
+    _run(_append_attachment, conversation_id, "file", file_data)
 
 
+@traced("storage.add_link")
 def add_link(conversation_id: str, link_data: Dict[str, Any]):
     """Add a link to context engineering."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    context_eng = conv.get("context_engineering", {})
-    links = context_eng.get("links", [])
-    links.append(link_data)
-    context_eng["links"] = links
-    conv["context_engineering"] = context_eng
-    save_conversation(conv)
+    _run(_append_attachment, conversation_id, "link", link_data)
 
 
+@traced("storage.finalize_context")
 def finalize_context(conversation_id: str, finalized_context: str):
     """Finalize the context."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    context_eng = conv.get("context_engineering", {})
-    context_eng["finalized_context"] = finalized_context
-    conv["context_engineering"] = context_eng
-    save_conversation(conv)
+    _run(_set_section_value, conversation_id, "context_engineering", "finalized_context", finalized_context)
 
 
+@traced("storage.update_conversation_title")
 def update_conversation_title(conversation_id: str, title: str):
     """Update conversation title."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    conv["title"] = title
-    save_conversation(conv)
+    _run(_update_conversation_title, conversation_id, title)
 
 
+@traced("storage.add_council_deliberation_message")
 def add_council_deliberation_message(
     conversation_id: str,
     role: str,
@@ -341,30 +781,11 @@ def add_council_deliberation_message(
     stage1: List[Dict[str, Any]] = None,
     stage2: List[Dict[str, Any]] = None,
     stage3: Dict[str, Any] = None,
-    metadata: Dict[str, Any] = None
+    metadata: Dict[str, Any] = None,
+    trace_id: str = None
 ):
-    """Add a message to council deliberation."""
-    conv = get_conversation(conversation_id)
-    if not conv:
-        raise ValueError(f"Conversation {conversation_id} not found")
-    
-    council_delib = conv.get("council_deliberation", {})
-    messages = council_delib.get("messages", [])
-    
-    message = {"role": role}
-    if content:
-        message["content"] = content
-    if stage1 is not None:
-        message["stage1"] = stage1
-    if stage2 is not None:
-        message["stage2"] = stage2
-    if stage3 is not None:
-        message["stage3"] = stage3
-    if metadata is not None:
-        message["metadata"] = metadata
-    
-    messages.append(message)
-    council_delib["messages"] = messages
-    conv["council_deliberation"] = council_delib
-    save_conversation(conv)
-
+    """Add a message to council deliberation (trace_id links it to its deliberation trace)."""
+    _run(
+        _add_council_deliberation_message, conversation_id, role,
+        content=content, stage1=stage1, stage2=stage2, stage3=stage3, metadata=metadata, trace_id=trace_id,
+    )
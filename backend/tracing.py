@@ -0,0 +1,157 @@
+"""Lightweight deliberation tracing with a local JSONL exporter.
+
+One trace per council deliberation, with child spans for storage calls, LLM calls
+and ranking aggregation. IDs follow the OpenTelemetry/W3C format (32-hex trace id,
+16-hex span id) and each exported line uses OTLP/JSON span field names, so traces
+can be loaded by OpenTelemetry tooling - but nothing beyond the standard library is
+needed. The active span lives in a contextvar, so tasks spawned inside a span
+(parallel council queries) become its children automatically.
+
+Spans are buffered per trace and written in one append when the root span ends.
+"""
+
+import contextlib
+import contextvars
+import functools
+import inspect
+import json
+import os
+import secrets
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import TRACING_ENABLED, TRACE_EXPORT_PATH
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    def __init__(self, name: str, trace_id: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent = parent
+        self.attributes: Dict[str, Any] = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.status = "OK"
+        self.error: Optional[str] = None
+        # Finished spans of the whole trace, shared with every descendant
+        self.finished: List["Span"] = parent.finished if parent is not None else []
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent.span_id if self.parent is not None else "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "durationMs": round((self.end_ns - self.start_ns) / 1e6, 3) if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": {"code": "STATUS_CODE_ERROR" if self.status == "ERROR" else "STATUS_CODE_OK", "message": self.error or ""},
+        }
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("trace_span", default=None)
+_export_lock = threading.Lock()
+
+
+def _export_path() -> Path:
+    if TRACE_EXPORT_PATH:
+        return Path(TRACE_EXPORT_PATH)
+    # Same persistent data directory as the SQLite database
+    if os.path.exists("/home/site/wwwroot"):
+        return Path("/home/site/wwwroot/data/traces.jsonl")
+    return Path(__file__).parent.parent / "data" / "traces.jsonl"
+
+
+def _export(spans: List[Span]):
+    try:
+        path = _export_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = "".join(json.dumps(s.to_otlp(), default=str) + "\n" for s in spans)
+        with _export_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(lines)
+    except Exception as e:
+        print(f"[TRACING] Export failed: {type(e).__name__}: {e}", file=sys.stderr, flush=True)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    """Trace id of the active trace, or None outside a trace."""
+    span = _current_span.get()
+    return span.trace_id if span is not None else None
+
+
+@contextlib.contextmanager
+def _activate(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "ERROR"
+        span.error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        span.end_ns = time.time_ns()
+        span.finished.append(span)
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Generator closed from another context (e.g. SSE client disconnected)
+            pass
+        if span.parent is None:
+            _export(span.finished)
+
+
+@contextlib.contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Start a new trace with a root span; exported when the block exits."""
+    if not TRACING_ENABLED:
+        yield None
+        return
+    with _activate(Span(name, secrets.token_hex(16), attributes=attributes)) as span:
+        yield span
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the active span. Outside a trace this is a no-op (yields None)."""
+    parent = _current_span.get()
+    if parent is None:
+        yield None
+        return
+    with _activate(Span(name, parent.trace_id, parent=parent, attributes=attributes)) as child:
+        yield child
+
+
+def traced(name: Optional[str] = None):
+    """Decorator: run a sync or async function inside a child span (named after the function by default)."""
+
+    def decorator(fn):
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(span_name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,144 @@
+"""Streaming intake of uploaded files.
+
+upload_file_endpoint used to `await file.read()` the whole upload into memory and the
+parsers wrapped it in io.BytesIO - two full copies per upload, plus one more pickled
+into every parser job. Now the upload is copied in UPLOAD_CHUNK_BYTES pieces to a
+temporary file while it is hashed and measured, and the parsers get the file's path.
+Memory per upload stays at one chunk whatever the file size.
+
+Limits are enforced as early as possible: the extension before anything is read, the
+file signature on the first chunk (a ".pdf" that isn't a PDF), and the size as soon as
+UPLOAD_MAX_BYTES is exceeded.
+"""
+
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from fastapi import UploadFile
+
+from .config import UPLOAD_MAX_BYTES, UPLOAD_ALLOWED_EXTENSIONS, UPLOAD_CHUNK_BYTES, UPLOAD_TMP_DIR
+
+# Leading bytes of the binary formats the parsers handle (OOXML files are zip archives,
+# legacy Office files OLE compound documents)
+_ZIP = (b"PK\x03\x04",)
+_OFFICE = (b"PK\x03\x04", b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1")
+_SIGNATURES = {
+    "docx": _ZIP, "xlsx": _ZIP, "pptx": _ZIP,
+    "doc": _OFFICE, "xls": _OFFICE, "ppt": _OFFICE,
+}
+
+
+class UploadRejected(Exception):
+    """An upload over the size limit (413) or of a type that isn't accepted (415)."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class SpooledUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def _extension(filename: str) -> str:
+    return Path(filename or "").suffix.lstrip(".").lower()
+
+
+def check_type(filename: str):
+    """Raise UploadRejected (415) if the file's extension isn't in UPLOAD_ALLOWED_EXTENSIONS."""
+    if "*" in UPLOAD_ALLOWED_EXTENSIONS:
+        return
+    extension = _extension(filename)
+    if extension not in UPLOAD_ALLOWED_EXTENSIONS:
+        allowed = ", ".join(f".{ext}" for ext in sorted(UPLOAD_ALLOWED_EXTENSIONS))
+        raise UploadRejected(415, f"Unsupported file type '.{extension}'. Allowed: {allowed}" if extension else f"Files need an extension. Allowed: {allowed}")
+
+
+def _check_signature(filename: str, head: bytes):
+    extension = _extension(filename)
+    if extension == "pdf":
+        valid = b"%PDF-" in head[:1024]  # the header may follow a few junk bytes
+    elif extension in _SIGNATURES:
+        valid = head.startswith(_SIGNATURES[extension])
+    else:
+        return
+    if not valid:
+        raise UploadRejected(415, f"{filename} is not a valid .{extension} file")
+
+
+def upload_dir() -> str:
+    """Directory the uploads are spooled to (created on first use)."""
+    path = Path(UPLOAD_TMP_DIR or tempfile.gettempdir()) / "llm-council-uploads"
+    path.mkdir(parents=True, exist_ok=True)
+    return str(path)
+
+
+async def spool(file: UploadFile, max_bytes: Optional[int] = None) -> SpooledUpload:
+    """
+    Copy an upload to a temporary file, hashing it on the way.
+
+    Args:
+        file: The multipart upload
+        max_bytes: Size limit (default: UPLOAD_MAX_BYTES)
+
+    Returns:
+        SpooledUpload(path, sha256, size) - the caller deletes path (discard())
+
+    Raises:
+        UploadRejected: Unsupported type (415) or larger than max_bytes (413)
+    """
+    check_type(file.filename)
+    max_bytes = UPLOAD_MAX_BYTES if max_bytes is None else max_bytes
+    digest = hashlib.sha256()
+    size = 0
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=f".{_extension(file.filename) or 'bin'}", dir=upload_dir())
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                if size == 0:
+                    _check_signature(file.filename, chunk)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"File is larger than the {max_bytes // (1024 * 1024)} MB upload limit")
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+    except BaseException:
+        discard(path)
+        raise
+    return SpooledUpload(path, digest.hexdigest(), size)
+
+
+def discard(path: str):
+    """Delete a spooled upload (missing files are fine)."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        print(f"[UPLOAD] Could not delete {path}: {e}", file=sys.stderr, flush=True)
+
+
+def remove_stale(max_age_seconds: float) -> int:
+    """Delete spooled uploads older than max_age_seconds, left behind by a previous process (startup)."""
+    removed = 0
+    cutoff = time.time() - max_age_seconds
+    for entry in Path(upload_dir()).glob("upload-*"):
+        try:
+            if entry.stat().st_mtime < cutoff:
+                entry.unlink()
+                removed += 1
+        except OSError:
+            pass
+    return removed
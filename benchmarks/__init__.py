@@ -0,0 +1 @@
+"""Offline benchmarks for LLM Council (no API key or spend needed)."""
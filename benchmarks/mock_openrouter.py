@@ -0,0 +1,176 @@
+"""Local fake OpenRouter-compatible server for offline benchmarks.
+
+Serves POST /api/v1/chat/completions (plain and `stream: true`) with configurable
+latency distributions, failure rates and streaming chunking, and answers in the
+shapes the council expects: peer rankings end in a parseable FINAL RANKING list,
+RAG relevance prompts get a bare score. GET /stats reports upstream call counts.
+
+Run standalone:
+    python -m benchmarks.mock_openrouter --port 8765 --latency-median 0.8 --failure-rate 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import re
+from collections import Counter
+from typing import Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+class MockSettings:
+    """Latency/failure behaviour of the fake upstream."""
+
+    def __init__(
+        self,
+        latency_median: float = 0.5,
+        latency_sigma: float = 0.4,
+        failure_rate: float = 0.0,
+        stream_chunks: int = 20,
+        ttft_fraction: float = 0.3,
+        model_latency: Optional[Dict[str, float]] = None,
+        seed: Optional[int] = None
+    ):
+        """
+        Args:
+            latency_median: Median seconds per completion
+            latency_sigma: Log-normal sigma (0 = fixed latency)
+            failure_rate: Fraction of calls answered with HTTP 500
+            stream_chunks: Content chunks per streamed completion
+            ttft_fraction: Share of the latency spent before the first streamed token
+            model_latency: Per-model median overrides (model id -> seconds)
+            seed: RNG seed for repeatable runs
+        """
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.failure_rate = failure_rate
+        self.stream_chunks = max(1, stream_chunks)
+        self.ttft_fraction = ttft_fraction
+        self.model_latency = model_latency or {}
+        self.rng = random.Random(seed)
+
+    def sample_latency(self, model: str) -> float:
+        median = self.model_latency.get(model, self.latency_median)
+        if self.latency_sigma <= 0:
+            return median
+        return self.rng.lognormvariate(0, self.latency_sigma) * median
+
+
+def _reply_for(prompt: str, model: str, rng: random.Random) -> str:
+    """Plausible reply text for the council prompt types."""
+    if "FINAL RANKING:" in prompt:
+        labels = list(dict.fromkeys(re.findall(r"Response [A-Z]\b", prompt)))
+        rng.shuffle(labels)
+        ranking = "\n".join(f"{i}. {label}" for i, label in enumerate(labels, 1))
+        return f"Each response has merits; evaluated by {model}.\n\nFINAL RANKING:\n{ranking}"
+    if "single number between 0.0 and 1.0" in prompt:
+        return f"{rng.random():.2f}"
+    if "Generate a very short title" in prompt:
+        return "Benchmark Conversation"
+    body = " ".join(f"token{i}" for i in range(120))
+    return f"Answer from {model}: {body}"
+
+
+def create_app(settings: MockSettings) -> FastAPI:
+    """Build the fake OpenRouter app."""
+    app = FastAPI(title="Mock OpenRouter")
+    stats: Counter = Counter()
+
+    @app.post("/api/v1/chat/completions")
+    async def chat_completions(request: Request):
+        payload = await request.json()
+        model = payload.get("model", "unknown")
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        stats["calls"] += 1
+        stats[f"model:{model}"] += 1
+
+        latency = settings.sample_latency(model)
+        if settings.rng.random() < settings.failure_rate:
+            stats["failures"] += 1
+            await asyncio.sleep(latency * settings.ttft_fraction)
+            return JSONResponse({"error": {"message": "mock upstream failure", "code": 500}}, status_code=500)
+
+        text = _reply_for(prompt, model, settings.rng)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(text) // 4, "total_tokens": (len(prompt) + len(text)) // 4}
+
+        if not payload.get("stream"):
+            await asyncio.sleep(latency)
+            return {
+                "id": f"mock-{stats['calls']}",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            }
+
+        stats["streamed"] += 1
+        size = max(1, len(text) // settings.stream_chunks)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        ttft = latency * settings.ttft_fraction
+        gap = (latency - ttft) / max(1, len(pieces))
+
+        async def events():
+            yield ": OPENROUTER PROCESSING\n\n"
+            await asyncio.sleep(ttft)
+            for piece in pieces:
+                yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {'content': piece}}]})}\n\n"
+                await asyncio.sleep(gap)
+            yield f"data: {json.dumps({'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}], 'usage': usage})}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def get_stats():
+        return dict(stats)
+
+    @app.post("/reset")
+    async def reset():
+        stats.clear()
+        return {"ok": True}
+
+    return app
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Mock server options (shared with the benchmark runner)."""
+    parser.add_argument("--latency-median", type=float, default=0.5, help="median upstream latency in seconds")
+    parser.add_argument("--latency-sigma", type=float, default=0.4, help="log-normal sigma (0 = fixed latency)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of upstream calls that fail with HTTP 500")
+    parser.add_argument("--stream-chunks", type=int, default=20, help="chunks per streamed completion")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="per-model median latency override (repeatable), e.g. openai/gpt-5.2=5")
+    parser.add_argument("--seed", type=int, default=None, help="RNG seed for repeatable runs")
+
+
+def settings_from_args(args: argparse.Namespace) -> MockSettings:
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, seconds = item.partition("=")
+        model_latency[model.strip()] = float(seconds)
+    return MockSettings(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        failure_rate=args.failure_rate,
+        stream_chunks=args.stream_chunks,
+        model_latency=model_latency,
+        seed=args.seed,
+    )
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Fake OpenRouter-compatible server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(settings_from_args(args)), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""Offline benchmark runner for LLM Council.
+
+Starts the mock OpenRouter server (benchmarks/mock_openrouter.py) in a subprocess,
+points the backend at it via OPENROUTER_API_URL, and drives one scenario at a given
+concurrency:
+
+    council  - run_full_council() directly
+    sse      - POST /api/conversations/{id}/council-deliberation/message/stream over real HTTP
+    context  - /context-engineering/package work (load conversation + chunk index, RAG retrieval)
+
+Reports throughput, latency percentiles, memory high-water mark and upstream calls
+per operation. Compare against a saved run to catch regressions before deploy:
+
+    python -m benchmarks.run sse --concurrency 4 --iterations 20 --json bench.json
+    python -m benchmarks.run sse --concurrency 4 --iterations 20 --baseline bench.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .mock_openrouter import add_arguments as add_mock_arguments
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(p * (len(ordered) - 1)))))]
+
+
+def _max_rss_mb() -> Optional[float]:
+    """Process memory high-water mark in MB (None where the resource module is unavailable)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS bytes
+    return round(rss / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def start_mock_server(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    """Launch the mock upstream in its own process so it doesn't skew our CPU/memory numbers."""
+    cmd = [
+        sys.executable, "-m", "benchmarks.mock_openrouter", "--port", str(port),
+        "--latency-median", str(args.latency_median),
+        "--latency-sigma", str(args.latency_sigma),
+        "--failure-rate", str(args.failure_rate),
+        "--stream-chunks", str(args.stream_chunks),
+    ]
+    for item in args.model_latency:
+        cmd += ["--model-latency", item]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(cmd, cwd=project_root)
+
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=0.5)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("mock OpenRouter server did not start")
+
+
+def configure_backend_env(args: argparse.Namespace, mock_port: int, workdir: str):
+    """Point the backend at the mock upstream and a throwaway database. Must run before importing backend."""
+    os.environ["OPENROUTER_API_URL"] = f"http://127.0.0.1:{mock_port}/api/v1/chat/completions"
+    os.environ["OPENROUTER_API_KEY"] = "benchmark"
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["TRACE_EXPORT_PATH"] = os.path.join(workdir, "traces.jsonl")
+    # Every iteration uses a unique query anyway; keep the result cache out of the measurement unless asked
+    os.environ.setdefault("COUNCIL_CACHE_ENABLED", "true" if args.cache else "false")
+    if args.pipeline:
+        os.environ["COUNCIL_PIPELINE_ENABLED"] = "true"
+
+
+async def drive(
+    operation: Callable[[int], Awaitable[Dict[str, Any]]],
+    iterations: int,
+    concurrency: int
+) -> Dict[str, Any]:
+    """Run operation(i) for every iteration with at most `concurrency` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors: List[str] = []
+
+    async def one(i: int):
+        async with semaphore:
+            try:
+                result = await operation(i)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+                return
+            if not result.get("ok", True):
+                errors.append(result.get("error", "failed"))
+                return
+            latencies.append(result["latency"])
+            if result.get("ttfb") is not None:
+                ttfbs.append(result["ttfb"])
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(iterations)))
+    wall = time.perf_counter() - started
+
+    def summarize(values: List[float]) -> Dict[str, Optional[float]]:
+        return {
+            "p50": _percentile(values, 0.5),
+            "p95": _percentile(values, 0.95),
+            "p99": _percentile(values, 0.99),
+            "max": max(values) if values else None,
+            "mean": sum(values) / len(values) if values else None,
+        }
+
+    return {
+        "completed": len(latencies),
+        "errors": len(errors),
+        "error_samples": errors[:5],
+        "wall_seconds": wall,
+        "throughput_per_s": len(latencies) / wall if wall > 0 else 0.0,
+        "latency": summarize(latencies),
+        "ttfb": summarize(ttfbs) if ttfbs else None,
+    }
+
+
+async def scenario_council(args: argparse.Namespace) -> Dict[str, Any]:
+    from backend.council import run_full_council
+
+    async def op(i: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        stage1, stage2, stage3, _ = await run_full_council(f"Benchmark question {i} ({uuid.uuid4()}): compare approaches A and B.")
+        ok = bool(stage1) and stage3.get("model") != "error"
+        return {"ok": ok, "latency": time.perf_counter() - started, "error": "council returned no answer"}
+
+    return await drive(op, args.iterations, args.concurrency)
+
+
+async def scenario_sse(args: argparse.Namespace) -> Dict[str, Any]:
+    import uvicorn
+    from backend.main import app
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}/api/conversations"
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    try:
+        async with httpx.AsyncClient(timeout=300.0, limits=limits) as client:
+
+            async def op(i: int) -> Dict[str, Any]:
+                # Setup is not timed: conversation with finalized prompt and context
+                conv_id = (await client.post(base, json={})).json()["id"]
+                await client.post(f"{base}/{conv_id}/prompt-engineering/finalize", json={"finalized_prompt": f"Benchmark question {i}"})
+                await client.post(f"{base}/{conv_id}/context-engineering/finalize", json={"finalized_context": f"Context {uuid.uuid4()}: compare approaches A and B."})
+
+                started = time.perf_counter()
+                ttfb = None
+                error = None
+                async with client.stream("POST", f"{base}/{conv_id}/council-deliberation/message/stream") as response:
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        event = json.loads(line[len("data:"):])
+                        if ttfb is None and event["type"].endswith("_delta"):
+                            ttfb = time.perf_counter() - started
+                        if event["type"] == "error":
+                            error = event.get("message")
+                latency = time.perf_counter() - started
+                await client.delete(f"{base}/{conv_id}")
+                return {"ok": error is None, "latency": latency, "ttfb": ttfb, "error": error}
+
+            return await drive(op, args.iterations, args.concurrency)
+    finally:
+        server.should_exit = True
+        await serve_task
+
+
+async def scenario_context(args: argparse.Namespace) -> Dict[str, Any]:
+    from backend import storage_async as storage
+    from backend.context_engineering import package_context
+
+    sentence = "Quarterly revenue grew in the enterprise segment while support costs fell. "
+    body = sentence * (args.attachment_kb * 1024 // len(sentence) + 1)
+
+    async def op(i: int) -> Dict[str, Any]:
+        # Setup is not timed: store the attachments (chunked once, as the upload endpoints do)
+        conv_id = str(uuid.uuid4())
+        await storage.create_conversation(conv_id)
+        for n in range(args.attachments):
+            await storage.add_file(conv_id, {"name": f"report-{i}-{n}.pdf", "type": "pdf", "content": f"Attachment {n} of run {i}. " + body})
+
+        # Timed: what /context-engineering/package does
+        started = time.perf_counter()
+        conversation = await storage.get_conversation(conv_id)
+        context_eng = conversation["context_engineering"]
+        packaged = await package_context(
+            conversation_history=[{"role": "user", "content": "Focus on enterprise revenue drivers."}],
+            documents=context_eng["documents"],
+            files=context_eng["files"],
+            links=context_eng["links"],
+            finalized_prompt=f"What drove enterprise revenue growth? ({uuid.uuid4()})",
+            use_rag=True,
+            chunks=await storage.get_attachment_chunks(conv_id),
+        )
+        return {"ok": bool(packaged), "latency": time.perf_counter() - started, "error": "package_context returned nothing"}
+
+    return await drive(op, args.iterations, args.concurrency)
+
+
+SCENARIOS = {
+    "council": scenario_council,
+    "sse": scenario_sse,
+    "context": scenario_context,
+}
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], max_regression: float) -> List[str]:
+    """Regressions beyond max_regression (fraction) in p95 latency or throughput."""
+    problems = []
+    base_p95, p95 = baseline["latency"]["p95"], report["latency"]["p95"]
+    if base_p95 and p95 and p95 > base_p95 * (1 + max_regression):
+        problems.append(f"p95 latency {p95:.3f}s vs baseline {base_p95:.3f}s")
+    base_tp, tp = baseline["throughput_per_s"], report["throughput_per_s"]
+    if base_tp and tp < base_tp * (1 - max_regression):
+        problems.append(f"throughput {tp:.3f}/s vs baseline {base_tp:.3f}/s")
+    base_calls, calls = baseline.get("upstream_calls_per_op"), report.get("upstream_calls_per_op")
+    if base_calls and calls and calls > base_calls * (1 + max_regression):
+        problems.append(f"upstream calls/op {calls:.2f} vs baseline {base_calls:.2f}")
+    return problems
+
+
+def print_report(report: Dict[str, Any]):
+    def fmt(v: Optional[float]) -> str:
+        return f"{v:.3f}s" if v is not None else "-"
+
+    print(f"\nScenario: {report['scenario']}  (iterations={report['iterations']}, concurrency={report['concurrency']})")
+    print(f"  completed:        {report['completed']}  errors: {report['errors']}")
+    print(f"  wall time:        {report['wall_seconds']:.2f}s")
+    print(f"  throughput:       {report['throughput_per_s']:.3f} ops/s")
+    lat = report["latency"]
+    print(f"  latency:          p50 {fmt(lat['p50'])}  p95 {fmt(lat['p95'])}  p99 {fmt(lat['p99'])}  max {fmt(lat['max'])}")
+    if report.get("ttfb"):
+        t = report["ttfb"]
+        print(f"  first token:      p50 {fmt(t['p50'])}  p95 {fmt(t['p95'])}  p99 {fmt(t['p99'])}")
+    print(f"  upstream calls:   {report['upstream_calls']} ({report['upstream_calls_per_op']:.2f} per op, {report['upstream_failures']} failed)")
+    print(f"  memory peak:      {report['memory_peak_mb']} MB")
+    for sample in report["error_samples"]:
+        print(f"  error: {sample}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Offline LLM Council benchmarks against a mock OpenRouter server")
+    parser.add_argument("scenario", choices=sorted(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=2)
+    parser.add_argument("--attachments", type=int, default=5, help="context scenario: attachments per run")
+    parser.add_argument("--attachment-kb", type=int, default=64, help="context scenario: approx KB per attachment")
+    parser.add_argument("--cache", action="store_true", help="leave the council result cache enabled")
+    parser.add_argument("--pipeline", action="store_true", help="enable pipelined Stage 2 (COUNCIL_PIPELINE_ENABLED)")
+    parser.add_argument("--json", metavar="PATH", help="write the report as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="compare against an earlier --json report; exit 1 on regression")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed regression vs baseline (fraction, default 0.2)")
+    parser.add_argument("--verbose", action="store_true", help="show backend logs")
+    add_mock_arguments(parser)
+    args = parser.parse_args()
+
+    mock_port = _free_port()
+    mock = start_mock_server(args, mock_port)
+    workdir = tempfile.mkdtemp(prefix="llm-council-bench-")
+    try:
+        configure_backend_env(args, mock_port, workdir)
+        stats_url = f"http://127.0.0.1:{mock_port}"
+        httpx.post(f"{stats_url}/reset")
+
+        quiet = open(os.devnull, "w") if not args.verbose else None
+        with contextlib.redirect_stderr(quiet) if quiet else contextlib.nullcontext():
+            result = asyncio.run(SCENARIOS[args.scenario](args))
+
+        upstream = httpx.get(f"{stats_url}/stats").json()
+        ops = max(1, result["completed"] + result["errors"])
+        report = {
+            "scenario": args.scenario,
+            "iterations": args.iterations,
+            "concurrency": args.concurrency,
+            **result,
+            "upstream_calls": upstream.get("calls", 0),
+            "upstream_failures": upstream.get("failures", 0),
+            "upstream_calls_per_op": upstream.get("calls", 0) / ops,
+            "memory_peak_mb": _max_rss_mb(),
+            "settings": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        }
+    finally:
+        mock.terminate()
+        mock.wait(timeout=10)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f), args.max_regression)
+        if problems:
+            print("\nREGRESSION vs baseline:")
+            for p in problems:
+                print(f"  - {p}")
+            return 1
+        print("\nNo regression vs baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
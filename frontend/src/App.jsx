@@ -7,6 +7,40 @@ import StepView from './components/StepView';
 import { api } from './api';
 import './App.css';
 
+/**
+ * Apply a streamed token delta (stage1_delta / stage3_delta) to the conversation's
+ * last council message. Returns new objects instead of mutating prev, so the updater
+ * stays pure when React runs it twice (StrictMode).
+ */
+function applyStreamDelta(prev, eventType, delta) {
+  const messages = [...(prev.council_deliberation?.messages || [])];
+  const lastMsg = messages[messages.length - 1];
+  if (!lastMsg) {
+    return prev;
+  }
+  if (eventType === 'stage1_delta') {
+    // Append streamed tokens to this model's partial Stage 1 response
+    const partial = [...(lastMsg.stage1 || [])];
+    const idx = partial.findIndex((r) => r.model === delta.model);
+    if (idx >= 0) {
+      partial[idx] = { ...partial[idx], response: partial[idx].response + delta.text };
+    } else {
+      partial.push({ model: delta.model, response: delta.text });
+    }
+    messages[messages.length - 1] = { ...lastMsg, stage1: partial };
+  } else {
+    const previous = lastMsg.stage3?.response || '';
+    messages[messages.length - 1] = { ...lastMsg, stage3: { model: delta.model, response: previous + delta.text } };
+  }
+  return {
+    ...prev,
+    council_deliberation: {
+      ...prev.council_deliberation,
+      messages,
+    },
+  };
+}
+
 function App() {
   const [conversations, setConversations] = useState([]);
   const [currentConversationId, setCurrentConversationId] = useState(null);
@@ -260,11 +294,31 @@ function App() {
     }
   };
 
+  // Uploaded files and links are ingested in the background: poll until done, then refresh
+  const refreshWhenIngested = async (conversationId, attachmentId) => {
+    if (attachmentId == null) return;
+    try {
+      let status;
+      do {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        status = await api.getAttachmentStatus(conversationId, attachmentId);
+      } while (status.status === 'pending');
+      if (status.status === 'failed') {
+        console.error(`Failed to process ${status.name}:`, status.error);
+      }
+      const updated = await api.getConversation(conversationId);
+      setCurrentConversation((current) => (current?.id === conversationId ? updated : current));
+    } catch (error) {
+      console.error('Failed to check attachment status:', error);
+    }
+  };
+
   const handleUploadFile = async (file) => {
     if (!currentConversationId) return;
     try {
       const result = await api.uploadFile(currentConversationId, file);
       setCurrentConversation(result.conversation);
+      refreshWhenIngested(currentConversationId, result.attachment_id);
     } catch (error) {
       console.error('Failed to upload file:', error);
       throw error; // Re-throw so component can handle it
@@ -276,6 +330,7 @@ function App() {
     try {
       const result = await api.addLink(currentConversationId, url);
       setCurrentConversation(result.conversation);
+      refreshWhenIngested(currentConversationId, result.attachment_id);
     } catch (error) {
       console.error('Failed to add link:', error);
       throw error; // Re-throw so component can handle it
@@ -393,6 +448,15 @@ function App() {
             });
             break;
 
+          case 'stage1_delta':
+          case 'stage3_delta':
+            setCurrentConversation((prev) => applyStreamDelta(prev, eventType, event.data));
+            break;
+
+          case 'stage2_delta':
+            // Rankings are shown once parsed (stage2_complete)
+            break;
+
           case 'stage1_complete':
             setCurrentConversation((prev) => {
               const messages = [...(prev.council_deliberation?.messages || [])];
@@ -579,6 +643,15 @@ function App() {
             });
             break;
 
+          case 'stage1_delta':
+          case 'stage3_delta':
+            setCurrentConversation((prev) => applyStreamDelta(prev, eventType, event.data));
+            break;
+
+          case 'stage2_delta':
+            // Rankings are shown once parsed (stage2_complete)
+            break;
+
           case 'stage1_complete':
             setCurrentConversation((prev) => {
               const messages = [...(prev.council_deliberation?.messages || [])];
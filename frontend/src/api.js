@@ -331,7 +331,9 @@ export const api = {
       }
     );
     if (!response.ok) {
-      throw new Error('Failed to upload file');
+      // 413 (too large) / 415 (unsupported type) explain themselves in `detail`
+      const error = await response.json().catch(() => null);
+      throw new Error(error?.detail || 'Failed to upload file');
     }
     return response.json();
   },
@@ -353,6 +355,19 @@ export const api = {
     return response.json();
   },
 
+  /**
+   * Ingestion status of an uploaded file or link ("pending", "ready" or "failed").
+   */
+  async getAttachmentStatus(conversationId, attachmentId) {
+    const response = await fetch(
+      `${API_BASE}/api/conversations/${conversationId}/attachments/${attachmentId}`
+    );
+    if (!response.ok) {
+      throw new Error('Failed to get attachment status');
+    }
+    return response.json();
+  },
+
   async getContextRefinementOpening(conversationId, priorContextSummary = '') {
     const response = await fetch(
       `${API_BASE}/api/conversations/${conversationId}/context-engineering/refinement-opening`,